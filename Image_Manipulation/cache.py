@@ -0,0 +1,181 @@
+"""Content-addressed cache of image operation results.
+
+A result is keyed by the content hash of the input array plus the operation
+name and its parameters. Chains are keyed Merkle-style: a stage's key is
+derived from the previous stage's key, so only the source image is ever
+hashed, and changing one stage's parameters (say a morphology kernel) misses
+for that stage and everything after it while the stages before it hit.
+
+    cache = ImageCache(max_bytes=256 * 2**20, spill_dir=".image_cache")
+    result = cache.run([{"op": "grayscale"}, {"op": "threshold"}, {"op": "contours"}], image)
+    denoised = cache.apply("bilateral", bilateral, noisy, d=7)
+
+Results live in an in-memory LRU bounded by max_bytes. With spill_dir,
+evicted results are written there as <key>.npy and loaded back on a later
+hit instead of being recomputed. Cached arrays are read-only; copy one
+before modifying it.
+
+Run as a script for a demo on test_image_2.png:
+    python -m Image_Manipulation.cache
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from Image_Manipulation.pipeline import Contours, build_operations
+
+
+def array_key(array: np.ndarray) -> str:
+    """Hash of an array's shape, dtype and contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{array.shape}|{array.dtype.str}|".encode())
+    digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return digest.hexdigest()
+
+
+def op_key(input_key: str, name: str, params: dict) -> str:
+    """Key of the result of operation name(params) on the input with input_key."""
+    canonical = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{input_key}|{name}|{canonical}".encode(), digest_size=16).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, max_bytes: int = 512 * 2**20, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _spill_path(self, key: str) -> Path:
+        return self.spill_dir / f"{key}.npy"
+
+    def get(self, key: str) -> np.ndarray | None:
+        array = self._entries.get(key)
+        if array is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+        if self.spill_dir and self._spill_path(key).exists():
+            array = np.load(self._spill_path(key))
+            self.disk_hits += 1
+            self._insert(key, array, spill=False)
+            return array
+        self.misses += 1
+        return None
+
+    def put(self, key: str, array: np.ndarray) -> np.ndarray:
+        """Store a result; the cache keeps the array itself (made read-only)."""
+        if key in self._entries:
+            return self._entries[key]
+        self._insert(key, array, spill=True)
+        return array
+
+    def _insert(self, key: str, array: np.ndarray, spill: bool):
+        array.setflags(write=False)
+        if array.nbytes > self.max_bytes:
+            # Too big to keep in memory; still worth keeping on disk
+            if spill and self.spill_dir:
+                np.save(self._spill_path(key), array)
+            return
+        self._entries[key] = array
+        self.bytes += array.nbytes
+        while self.bytes > self.max_bytes:
+            old_key, old = self._entries.popitem(last=False)
+            self.bytes -= old.nbytes
+            if self.spill_dir and not self._spill_path(old_key).exists():
+                np.save(self._spill_path(old_key), old)
+
+    def clear(self, disk: bool = False):
+        self._entries.clear()
+        self.bytes = 0
+        if disk and self.spill_dir:
+            for path in self.spill_dir.glob("*.npy"):
+                path.unlink()
+
+    def apply(self, name: str, fn, image: np.ndarray, *, input_key: str | None = None, **params) -> np.ndarray:
+        """fn(image, **params), cached under (image content, name, params)."""
+        key = op_key(input_key or array_key(image), name, params)
+        result = self.get(key)
+        if result is None:
+            result = self.put(key, fn(image, **params))
+        return result
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or bool(self.spill_dir and self._spill_path(key).exists())
+
+    def run(self, spec: list[dict], image: np.ndarray, trace: list | None = None) -> np.ndarray:
+        """Run a pipeline.py operation chain, reusing cached stage results.
+
+        Resumes from the deepest stage that is cached, so the stages before
+        it are not loaded at all. If trace is a list, ("skip" | "hit" |
+        "miss", stage, seconds) is appended for every stage.
+        """
+        operations = build_operations(spec)
+        keys, shapes = [], []
+        key, shape = array_key(image), image.shape
+        for step, (name, operation) in zip(spec, operations):
+            if isinstance(operation, Contours):
+                # contours draws onto the source, which is the root of every key
+                operation.source_shape = image.shape
+            shape = operation.output_shape(shape)
+            key = op_key(key, name, {k: v for k, v in step.items() if k != "op"})
+            keys.append(key)
+            shapes.append(shape)
+
+        resume = next((i for i in reversed(range(len(keys))) if keys[i] in self), -1)
+        frame = image
+        for stage, (name, operation) in enumerate(operations):
+            start = time.perf_counter()
+            if stage < resume:
+                status = "skip"
+            elif stage == resume:
+                status = "hit"
+                frame = self.get(keys[stage])
+            else:
+                status = "miss"
+                self.misses += 1
+                # A fresh buffer per result: the cache keeps it
+                result = np.empty(shapes[stage], dtype=image.dtype)
+                operation.apply(frame, result, image)
+                frame = self.put(keys[stage], result)
+            if trace is not None:
+                trace.append((status, f"{stage}:{name}", time.perf_counter() - start))
+        return frame
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "bytes": self.bytes, "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import cv2
+
+    image = cv2.imread(str(Path(__file__).resolve().parent / "test_image_2.png"))
+    base = [{"op": "denoise", "backend": "bilateral"}, {"op": "grayscale"}, {"op": "threshold"}, {"op": "contours"}]
+    with tempfile.TemporaryDirectory() as spill:
+        # A budget of a few stages, so the early ones get spilled
+        cache = ImageCache(max_bytes=16 * 2**20, spill_dir=spill)
+        for label, spec in (
+            ("cold", base + [{"op": "morphology", "operation": "erode"}]),
+            ("warm", base + [{"op": "morphology", "operation": "erode"}]),
+            ("new kernel", base + [{"op": "morphology", "operation": "erode", "ksize": [7, 7]}]),
+            # Evicted from memory by now: comes back from the spill dir
+            ("first only", base[:1]),
+        ):
+            trace = []
+            cache.run(spec, image, trace)
+            print(f"{label:>10}: {sum(s for _, _, s in trace) * 1000:7.1f}ms  " + "  ".join(f"{stage} {status}" for status, stage, _ in trace))
+        print(cache.stats())
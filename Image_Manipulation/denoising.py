@@ -0,0 +1,197 @@
+"""Denoising backends and a quality/speed benchmark.
+
+Usage:
+    python -m Image_Manipulation.denoising [IMAGE] [--min-psnr 28] [--backends tv_bregman,nl_means] [--json out.json]
+
+Every backend in BACKENDS takes a uint8 image (BGR or gray) and returns a
+denoised uint8 image of the same shape:
+- tv_bregman: skimage total-variation (Bregman), as testing.py uses it
+- nl_means: cv2 fastNlMeansDenoisingColored (or the gray variant), as in
+  Denoising.ipynb
+- bilateral: cv2 bilateralFilter
+- wavelet: soft-thresholded PyWavelets decomposition (VisuShrink threshold
+  from the noise level estimated on the finest diagonal details)
+- downscaled: another backend run at 1/factor resolution and scaled back
+
+The benchmark adds gaussian noise the way Denoising.ipynb does
+(skimage.util.random_noise on the [0, 1] image) and reports MSE, PSNR against
+the clean image and ms per megapixel for each backend, then picks the
+fastest backend whose PSNR reaches --min-psnr.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pywt
+import skimage.restoration
+import skimage.util
+
+DEFAULT_IMAGE = Path(__file__).resolve().parent / "test_image_2.png"
+
+
+def calculate_mse(img1: np.ndarray, img2: np.ndarray) -> float:
+    # float difference: uint8 subtraction wraps around
+    return float(np.mean((img1.astype(np.float64) - img2.astype(np.float64)) ** 2))
+
+
+def calculate_psnr(img1: np.ndarray, img2: np.ndarray, data_range: float = 255.0) -> float:
+    mse = calculate_mse(img1, img2)
+    if mse == 0:
+        return float("inf")
+    return float(20 * np.log10(data_range / np.sqrt(mse)))
+
+
+def add_gaussian_noise(image: np.ndarray, mean: float = 0.0, var: float = 0.01, seed: int | None = 0) -> np.ndarray:
+    noisy = skimage.util.random_noise(image / 255.0, mode="gaussian", mean=mean, var=var, rng=seed) * 255.0
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def _to_uint8(image: np.ndarray) -> np.ndarray:
+    """[0, 1] float result of a skimage-style backend as uint8."""
+    np.multiply(image, 255.0, out=image)
+    np.clip(image, 0, 255, out=image)
+    return image.astype(np.uint8)
+
+
+def tv_bregman(image: np.ndarray, weight: float = 5.0, max_num_iter: int = 100, eps: float = 0.001) -> np.ndarray:
+    channel_axis = -1 if image.ndim == 3 else None
+    denoised = skimage.restoration.denoise_tv_bregman(image, weight=weight, max_num_iter=max_num_iter, eps=eps, channel_axis=channel_axis)
+    return _to_uint8(denoised)
+
+
+def nl_means(image: np.ndarray, h: float = 10, h_color: float = 10, template_window: int = 7, search_window: int = 21) -> np.ndarray:
+    if image.ndim == 3:
+        return cv2.fastNlMeansDenoisingColored(image, None, h, h_color, template_window, search_window)
+    return cv2.fastNlMeansDenoising(image, None, h, template_window, search_window)
+
+
+def bilateral(image: np.ndarray, d: int = 9, sigma_color: float = 75, sigma_space: float = 75) -> np.ndarray:
+    return cv2.bilateralFilter(image, d, sigma_color, sigma_space)
+
+
+def wavelet(image: np.ndarray, wavelet_name: str = "db2", levels: int = 3, scale: float = 1.0) -> np.ndarray:
+    """Soft-threshold the detail coefficients of every channel.
+
+    The noise sigma comes from the median absolute finest diagonal detail
+    (/0.6745); the threshold is scale * sigma * sqrt(2 ln n).
+    """
+    channels = image.reshape(*image.shape[:2], -1).astype(np.float32)
+    out = np.empty_like(channels)
+    threshold_factor = scale * np.sqrt(2 * np.log(channels[..., 0].size))
+    for c in range(channels.shape[2]):
+        coeffs = pywt.wavedec2(channels[..., c], wavelet_name, level=levels)
+        sigma = np.median(np.abs(coeffs[-1][2])) / 0.6745
+        threshold = sigma * threshold_factor
+        coeffs[1:] = [tuple(pywt.threshold(d, threshold, mode="soft") for d in detail) for detail in coeffs[1:]]
+        # waverec2 pads odd sizes by one pixel
+        out[..., c] = pywt.waverec2(coeffs, wavelet_name)[: image.shape[0], : image.shape[1]]
+    np.clip(out, 0, 255, out=out)
+    return out.astype(np.uint8).reshape(image.shape)
+
+
+def downscaled(image: np.ndarray, inner: str = "nl_means", factor: float = 2.0, **params) -> np.ndarray:
+    """Run the inner backend on the image downscaled by factor, then scale
+    back up.
+
+    Noise averages out in the INTER_AREA downscale, so the inner backend can
+    run with a lighter setting on a quarter of the pixels; fine detail is lost.
+    """
+    height, width = image.shape[:2]
+    small = cv2.resize(image, (max(1, round(width / factor)), max(1, round(height / factor))), interpolation=cv2.INTER_AREA)
+    denoised = BACKENDS[inner](small, **params)
+    return cv2.resize(denoised, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+BACKENDS = {
+    "tv_bregman": tv_bregman,
+    "nl_means": nl_means,
+    "bilateral": bilateral,
+    "wavelet": wavelet,
+    "downscaled": downscaled,
+}
+
+# Backend settings the benchmark runs; a name maps to (backend, params)
+BENCHMARK_CONFIGS = {
+    "tv_bregman": ("tv_bregman", {}),
+    "nl_means": ("nl_means", {}),
+    "bilateral": ("bilateral", {}),
+    "wavelet": ("wavelet", {}),
+    "downscaled_nl_means": ("downscaled", {"inner": "nl_means", "h": 6, "h_color": 6}),
+    "downscaled_tv_bregman": ("downscaled", {"inner": "tv_bregman"}),
+}
+
+
+def denoise(image: np.ndarray, backend: str, **params) -> np.ndarray:
+    """Denoise image with the named backend; raises ValueError for unknown ones."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown denoising backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend](image, **params)
+
+
+def benchmark(image: np.ndarray, configs: dict | None = None, repeat: int = 3, mean: float = 0.0, var: float = 0.01, seed: int = 0) -> list[dict]:
+    """Quality and speed of every config on a noisy copy of image.
+
+    Returns one dict per config (plus "noisy", the untreated input) with
+    mse/psnr against the clean image and the best ms per megapixel.
+    """
+    configs = configs or BENCHMARK_CONFIGS
+    noisy = add_gaussian_noise(image, mean=mean, var=var, seed=seed)
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    results = [{"name": "noisy", "mse": calculate_mse(image, noisy), "psnr": calculate_psnr(image, noisy), "ms_per_mpx": 0.0}]
+    for name, (backend, params) in configs.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            denoised = denoise(noisy, backend, **params)
+            best = min(best, time.perf_counter() - start)
+        results.append({
+            "name": name,
+            "mse": calculate_mse(image, denoised),
+            "psnr": calculate_psnr(image, denoised),
+            "ms_per_mpx": best * 1000 / megapixels,
+        })
+    return results
+
+
+def choose(results: list[dict], min_psnr: float) -> dict | None:
+    """The fastest benchmarked backend with psnr >= min_psnr, if any."""
+    passing = [r for r in results if r["name"] != "noisy" and r["psnr"] >= min_psnr]
+    return min(passing, key=lambda r: r["ms_per_mpx"]) if passing else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image", nargs="?", default=str(DEFAULT_IMAGE))
+    parser.add_argument("--backends", default=None, help=f"Comma-separated subset of {', '.join(BENCHMARK_CONFIGS)}")
+    parser.add_argument("--min-psnr", type=float, default=28.0, help="Quality floor in dB")
+    parser.add_argument("--var", type=float, default=0.01, help="Variance of the gaussian noise on the [0, 1] image")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        parser.error(f"could not read {args.image}")
+    configs = BENCHMARK_CONFIGS
+    if args.backends:
+        unknown = set(args.backends.split(",")) - set(BENCHMARK_CONFIGS)
+        if unknown:
+            parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+        configs = {name: BENCHMARK_CONFIGS[name] for name in args.backends.split(",")}
+
+    results = benchmark(image, configs, repeat=args.repeat, var=args.var)
+    print(f"{args.image}: {image.shape[1]}x{image.shape[0]}, gaussian noise var={args.var}")
+    for r in results:
+        print(f"  {r['name']:>22}: PSNR {r['psnr']:6.2f} dB  MSE {r['mse']:8.2f}  {r['ms_per_mpx']:9.1f} ms/Mpx")
+    chosen = choose(results, args.min_psnr)
+    print(f"fastest with PSNR >= {args.min_psnr}: {chosen['name'] if chosen else 'none'}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"results": results, "min_psnr": args.min_psnr, "chosen": chosen and chosen["name"]}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
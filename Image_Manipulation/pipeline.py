@@ -0,0 +1,417 @@
+"""Batch image processing: a declarative chain of the operations from
+Image_Manipulation/testing.py applied to a directory of images.
+
+Usage:
+    python -m Image_Manipulation.pipeline IMAGES_DIR --out OUT_DIR --ops ops.json [--workers 4]
+
+The chain is a list of {"op": name, **params} dicts (a JSON file or string):
+
+    [{"op": "grayscale"},
+     {"op": "threshold", "method": "triangle"},
+     {"op": "contours", "thickness": 2},
+     {"op": "resize", "size": [640, 640]}]
+
+Operations (see OPERATIONS): grayscale, threshold, contours, denoise_tv
+(skimage TV-Bregman), denoise (any denoising.py backend), morphology, resize,
+warp (perspective). Images stay in
+OpenCV's BGR order throughout; nothing is converted to RGB for display.
+
+Each worker process compiles the chain once. Every stage writes into an
+output buffer preallocated for the input shape (cv2 dst= arguments) and
+reused for every image of that shape, so a stage costs no allocation after
+the first image; the decoded frame is read in place by the stages that need
+it (contours draws onto it). Results are written before the next image
+reuses the buffers.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
+
+_THRESHOLD_METHODS = {
+    "triangle": cv2.THRESH_BINARY | cv2.THRESH_TRIANGLE,
+    "otsu": cv2.THRESH_BINARY | cv2.THRESH_OTSU,
+    "binary": cv2.THRESH_BINARY,
+}
+_MORPH_OPS = {
+    "erode": cv2.MORPH_ERODE,
+    "dilate": cv2.MORPH_DILATE,
+    "open": cv2.MORPH_OPEN,
+    "close": cv2.MORPH_CLOSE,
+    "tophat": cv2.MORPH_TOPHAT,
+    "blackhat": cv2.MORPH_BLACKHAT,
+    "gradient": cv2.MORPH_GRADIENT,
+}
+_MORPH_SHAPES = {"rect": cv2.MORPH_RECT, "cross": cv2.MORPH_CROSS, "ellipse": cv2.MORPH_ELLIPSE}
+_INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "area": cv2.INTER_AREA,
+    "lanczos": cv2.INTER_LANCZOS4,
+}
+# Rows of BT.601 luma weights for B, G, R (cv2.COLOR_BGR2GRAY)
+_GRAY_3CH = np.tile(np.float32([0.114, 0.587, 0.299]), (3, 1))
+
+
+def _choice(options: dict, value: str, what: str):
+    if value not in options:
+        raise ValueError(f"unknown {what} {value!r}; expected one of {', '.join(options)}")
+    return options[value]
+
+
+class Operation:
+    """One stage: output_shape() validates the input and sizes the buffer,
+    apply() fills dst from src (source is the decoded image).
+
+    halo() is how many pixels around a tile the stage reads to produce the
+    tile's pixels, None when it needs the whole image (see tiled.py).
+    """
+
+    def output_shape(self, shape: tuple) -> tuple:
+        return shape
+
+    def halo(self) -> int | None:
+        return 0
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, source: np.ndarray) -> None:
+        raise NotImplementedError
+
+
+class Grayscale(Operation):
+    def __init__(self, keep_channels: bool = False):
+        # keep_channels: gray replicated into 3 channels, like testing.py's gray_image
+        self.keep_channels = keep_channels
+
+    def output_shape(self, shape):
+        if len(shape) != 3:
+            raise ValueError("grayscale needs a color image")
+        return shape if self.keep_channels else shape[:2]
+
+    def apply(self, src, dst, source):
+        if self.keep_channels:
+            # BGR -> gray -> BGR in one pass, without an intermediate gray image
+            cv2.transform(src, _GRAY_3CH, dst=dst)
+        else:
+            cv2.cvtColor(src, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+class Threshold(Operation):
+    def __init__(self, method: str = "triangle", thresh: float = 128, maxval: float = 255):
+        self.type = _choice(_THRESHOLD_METHODS, method, "threshold method")
+        self.thresh = thresh
+        self.maxval = maxval
+
+    def output_shape(self, shape):
+        if len(shape) != 2:
+            raise ValueError("threshold needs a single-channel image; add a grayscale stage first")
+        return shape
+
+    def halo(self):
+        # Triangle and Otsu pick the threshold from the whole image's histogram
+        return 0 if self.type == cv2.THRESH_BINARY else None
+
+    def apply(self, src, dst, source):
+        cv2.threshold(src, self.thresh, self.maxval, self.type, dst=dst)
+
+
+class Contours(Operation):
+    """Contours of a binary image drawn onto the decoded image."""
+
+    def __init__(self, color=(255, 255, 255), thickness: int = 2, mode: str = "tree"):
+        self.color = tuple(color)
+        self.thickness = thickness
+        self.mode = _choice({"tree": cv2.RETR_TREE, "external": cv2.RETR_EXTERNAL, "list": cv2.RETR_LIST}, mode, "contour mode")
+        self.source_shape = None
+
+    def output_shape(self, shape):
+        if len(shape) != 2:
+            raise ValueError("contours needs a binary image; add a threshold stage first")
+        if self.source_shape is not None and shape != self.source_shape[:2]:
+            raise ValueError("contours must come before stages that change the image size")
+        return self.source_shape
+
+    def halo(self):
+        return None
+
+    def apply(self, src, dst, source):
+        contours, _ = cv2.findContours(src, self.mode, cv2.CHAIN_APPROX_SIMPLE)
+        np.copyto(dst, source)
+        cv2.drawContours(dst, contours, -1, self.color, self.thickness)
+
+
+class DenoiseTV(Operation):
+    """skimage TV-Bregman denoising (float result scaled back to uint8).
+
+    skimage allocates the float result itself; it is scaled in place and cast
+    into the stage buffer.
+    """
+
+    def __init__(self, weight: float = 5.0, max_num_iter: int = 100, eps: float = 0.001, isotropic: bool = True, halo: int = 64):
+        self.params = {"weight": weight, "max_num_iter": max_num_iter, "eps": eps, "isotropic": isotropic}
+        # TV denoising is global in principle; its influence fades within a
+        # few dozen pixels, so tiles match the whole-image result closely
+        self._halo = halo
+
+    def halo(self):
+        return self._halo
+
+    def apply(self, src, dst, source):
+        import skimage.restoration
+
+        channel_axis = -1 if src.ndim == 3 else None
+        denoised = skimage.restoration.denoise_tv_bregman(src, channel_axis=channel_axis, **self.params)
+        np.multiply(denoised, 255.0, out=denoised)
+        np.clip(denoised, 0, 255, out=denoised)
+        np.copyto(dst, denoised, casting="unsafe")
+
+
+class Denoise(Operation):
+    """Any backend of denoising.py, e.g. {"op": "denoise", "backend": "bilateral", "d": 7}."""
+
+    def __init__(self, backend: str = "bilateral", halo: int | None = None, **params):
+        from Image_Manipulation.denoising import BACKENDS
+
+        _choice(BACKENDS, backend, "denoising backend")
+        self.backend = backend
+        self.params = params
+        self._halo = halo if halo is not None else self._default_halo()
+
+    def _default_halo(self) -> int | None:
+        if self.backend == "nl_means":
+            return self.params.get("search_window", 21) // 2 + self.params.get("template_window", 7) // 2
+        if self.backend == "bilateral":
+            d = self.params.get("d", 9)
+            return d // 2 if d > 0 else round(self.params.get("sigma_space", 75) * 1.5)
+        if self.backend == "tv_bregman":
+            return 64
+        # wavelet thresholds and downscaling depend on the whole image
+        return None
+
+    def halo(self):
+        return self._halo
+
+    def apply(self, src, dst, source):
+        from Image_Manipulation.denoising import denoise
+
+        np.copyto(dst, denoise(src, self.backend, **self.params))
+
+
+class Morphology(Operation):
+    def __init__(self, operation: str = "erode", shape: str = "ellipse", ksize=(5, 5), iterations: int = 1):
+        self.operation = _choice(_MORPH_OPS, operation, "morphology operation")
+        self.kernel = cv2.getStructuringElement(_choice(_MORPH_SHAPES, shape, "kernel shape"), tuple(ksize))
+        self.iterations = iterations
+        # open/close/tophat/blackhat erode and dilate in sequence
+        self.passes = 2 if self.operation in (cv2.MORPH_OPEN, cv2.MORPH_CLOSE, cv2.MORPH_TOPHAT, cv2.MORPH_BLACKHAT) else 1
+
+    def halo(self):
+        return max(self.kernel.shape) // 2 * self.iterations * self.passes
+
+    def apply(self, src, dst, source):
+        cv2.morphologyEx(src, self.operation, self.kernel, dst=dst, iterations=self.iterations)
+
+
+class Resize(Operation):
+    def __init__(self, size=(128, 128), interpolation: str = "area"):
+        self.size = tuple(size)  # (width, height)
+        self.interpolation = _choice(_INTERPOLATIONS, interpolation, "interpolation")
+
+    def output_shape(self, shape):
+        return (self.size[1], self.size[0], *shape[2:])
+
+    def halo(self):
+        return None
+
+    def apply(self, src, dst, source):
+        cv2.resize(src, self.size, dst=dst, interpolation=self.interpolation)
+
+
+class Warp(Operation):
+    """Perspective warp mapping the src points onto the dst points."""
+
+    def __init__(self, src_points=((0, 0), (1000, 0), (0, 350), (1000, 500)), dst_points=((0, 0), (1000, 0), (0, 500), (1000, 500)), size=(1000, 500), interpolation: str = "linear"):
+        self.matrix = cv2.getPerspectiveTransform(np.float32(src_points), np.float32(dst_points))
+        self.size = tuple(size)  # (width, height)
+        self.interpolation = _choice(_INTERPOLATIONS, interpolation, "interpolation")
+
+    def output_shape(self, shape):
+        return (self.size[1], self.size[0], *shape[2:])
+
+    def halo(self):
+        # Moves pixels; tiled.py tiles it over the output instead
+        return None
+
+    def apply(self, src, dst, source):
+        cv2.warpPerspective(src, self.matrix, self.size, dst=dst, flags=self.interpolation)
+
+
+OPERATIONS = {
+    "grayscale": Grayscale,
+    "threshold": Threshold,
+    "contours": Contours,
+    "denoise_tv": DenoiseTV,
+    "denoise": Denoise,
+    "morphology": Morphology,
+    "resize": Resize,
+    "warp": Warp,
+}
+
+
+def build_operations(spec: list[dict]) -> list[tuple[str, Operation]]:
+    """(name, Operation) for every {"op": name, **params} entry of spec.
+
+    Raises ValueError for unknown operations or parameters.
+    """
+    operations = []
+    for i, step in enumerate(spec):
+        params = dict(step)
+        name = params.pop("op", None)
+        if name not in OPERATIONS:
+            raise ValueError(f"step {i}: unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        try:
+            operations.append((name, OPERATIONS[name](**params)))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"step {i} ({name}): {e}") from None
+    return operations
+
+
+class Pipeline:
+    """A compiled operation chain with output buffers reused across images."""
+
+    def __init__(self, spec: list[dict]):
+        self.operations = build_operations(spec)
+        self._buffers: dict[tuple, list[np.ndarray]] = {}
+        self.stage_names = [f"{i}:{name}" for i, (name, _) in enumerate(self.operations)]
+        # Seconds spent in every stage by the last run()
+        self.last_seconds = [0.0] * len(self.operations)
+
+    def _buffers_for(self, image: np.ndarray) -> list[np.ndarray]:
+        key = (image.shape, image.dtype.str)
+        if key not in self._buffers:
+            buffers = []
+            shape = image.shape
+            for i, (name, operation) in enumerate(self.operations):
+                if isinstance(operation, Contours):
+                    operation.source_shape = image.shape
+                try:
+                    shape = operation.output_shape(shape)
+                except ValueError as e:
+                    raise ValueError(f"step {i} ({name}): {e}") from None
+                buffers.append(np.empty(shape, dtype=image.dtype))
+            self._buffers[key] = buffers
+        return self._buffers[key]
+
+    def run(self, image: np.ndarray) -> np.ndarray:
+        """Apply the chain to a decoded uint8 image.
+
+        The result is one of the pipeline's buffers and is overwritten by the
+        next run() on an image of the same shape.
+        """
+        frame = image
+        for stage, ((_, operation), dst) in enumerate(zip(self.operations, self._buffers_for(image))):
+            start = time.perf_counter()
+            operation.apply(frame, dst, image)
+            self.last_seconds[stage] = time.perf_counter() - start
+            frame = dst
+        return frame
+
+
+def list_images(directory) -> list[Path]:
+    return sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+# Per-process pipeline, built by the pool initializer
+_pipeline: Pipeline | None = None
+_out_dir: Path | None = None
+
+
+def _init_worker(spec: list[dict], out_dir: str | None):
+    global _pipeline, _out_dir
+    # One process per core already; keep OpenCV from oversubscribing
+    cv2.setNumThreads(1)
+    _pipeline = Pipeline(spec)
+    _out_dir = Path(out_dir) if out_dir else None
+
+
+def _process(path: str) -> tuple[str, str | None, list[float]]:
+    """Run the worker's pipeline on one file; returns (name, error, stage seconds)."""
+    name = Path(path).name
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return name, "could not decode", []
+    try:
+        result = _pipeline.run(image)
+    except ValueError as e:
+        return name, str(e), []
+    if _out_dir is not None:
+        cv2.imwrite(str(_out_dir / f"{Path(path).stem}.png"), result)
+    return name, None, _pipeline.last_seconds
+
+
+def process_directory(spec: list[dict], images_dir, out_dir=None, workers: int | None = None) -> dict:
+    """Apply spec to every image of images_dir through a process pool.
+
+    Results go to out_dir as PNG (not written when out_dir is None). Returns
+    counts, failures, wall time, images/sec and the time spent in every
+    stage summed over the workers.
+    """
+    stage_names = Pipeline(spec).stage_names  # fails fast on a bad spec, before starting workers
+    stage_seconds = dict.fromkeys(stage_names, 0.0)
+    paths = [str(p) for p in list_images(images_dir)]
+    if out_dir is not None:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    failures = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec, str(out_dir) if out_dir else None)) as pool:
+        chunksize = max(1, len(paths) // (workers * 4))
+        for name, error, seconds in pool.map(_process, paths, chunksize=chunksize):
+            if error:
+                failures[name] = error
+            for stage, value in zip(stage_names, seconds):
+                stage_seconds[stage] += value
+    elapsed = time.perf_counter() - start
+    done = len(paths) - len(failures)
+    return {
+        "images": len(paths),
+        "processed": done,
+        "failures": failures,
+        "workers": workers,
+        "seconds": elapsed,
+        "images_per_sec": done / elapsed if elapsed > 0 else 0.0,
+        "stage_seconds": stage_seconds,
+    }
+
+
+def load_spec(ops: str) -> list[dict]:
+    """Operation list from a JSON file path or a JSON string."""
+    path = Path(ops)
+    return json.loads(path.read_text(encoding="utf-8") if path.is_file() else ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images_dir")
+    parser.add_argument("--ops", required=True, help="JSON file or JSON string with the operation list")
+    parser.add_argument("--out", default=None, help="Output directory; results are not written without it")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    stats = process_directory(load_spec(args.ops), args.images_dir, args.out, args.workers)
+    print(f"{stats['processed']}/{stats['images']} images in {stats['seconds']:.2f}s with {stats['workers']} workers: {stats['images_per_sec']:.1f} images/s")
+    for stage, seconds in stats["stage_seconds"].items():
+        print(f"  {stage:>14}: {seconds:.2f}s")
+    for name, error in stats["failures"].items():
+        print(f"  failed {name}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Batched skin segmentation with the HSV and YCrCb rules of
+Цветовые_пространства.ipynb.
+
+Usage:
+    python -m Image_Manipulation.segmentation [IMAGE ...] [--batch 16] [--repeat 3]
+
+The notebook converts every image to HSV and to YCrCb, thresholds each with
+inRange, opens both masks, ANDs them into the global mask (median blur and
+a 4x4 opening) and cuts the skin out with bitwise_and. SkinSegmenter does
+the same on a batch stacked as one (N, H, W, 3) uint8 array:
+- both colour-space rules are precomputed for all 2^24 BGR colours into one
+  16 MiB lookup table (bit 0: HSV rule, bit 1: YCrCb rule), so the two
+  conversions and inRange calls become a single gather over the batch;
+- the pixels are indexed by viewing a BGRA copy as uint32 (B | G << 8 |
+  R << 16 once the alpha byte is masked off), without building the index
+  arithmetically;
+- masks, the global mask and the cut-out images go into buffers allocated
+  once per batch shape and are combined with in-place bitwise operations;
+  only the neighbourhood operations (opening, median blur) run per image,
+  on views of the batch so image borders behave as in the notebook.
+Results equal the per-image notebook path exactly; the script checks that
+and reports megapixels/s of both.
+"""
+import argparse
+import functools
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Skin thresholds of the notebook
+HSV_RANGE = ((0, 15, 0), (17, 170, 255))
+YCRCB_RANGE = ((0, 135, 85), (255, 180, 135))
+
+HSV_BIT = 1
+YCRCB_BIT = 2
+
+_OPEN_3 = np.ones((3, 3), np.uint8)
+_OPEN_4 = np.ones((4, 4), np.uint8)
+
+
+@functools.cache
+def build_lut(hsv_range=HSV_RANGE, ycrcb_range=YCRCB_RANGE) -> np.ndarray:
+    """uint8[2^24] of rule bits for every colour, indexed by B | G << 8 | R << 16."""
+    colors = np.arange(2**24, dtype=np.uint32).view(np.uint8).reshape(4096, 4096, 4)[..., :3]
+    colors = np.ascontiguousarray(colors)  # B, G, R bytes of every index
+    lut = cv2.inRange(cv2.cvtColor(colors, cv2.COLOR_BGR2HSV), *hsv_range)
+    lut &= HSV_BIT
+    ycrcb = cv2.inRange(cv2.cvtColor(colors, cv2.COLOR_BGR2YCrCb), *ycrcb_range)
+    ycrcb &= YCRCB_BIT
+    lut |= ycrcb
+    return lut.reshape(-1)
+
+
+def segment_image(image: np.ndarray) -> dict[str, np.ndarray]:
+    """The notebook's per-image path: masks and cut-outs of one BGR image."""
+    hsv_mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), *HSV_RANGE)
+    hsv_mask = cv2.morphologyEx(hsv_mask, cv2.MORPH_OPEN, _OPEN_3)
+    ycrcb_mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb), *YCRCB_RANGE)
+    ycrcb_mask = cv2.morphologyEx(ycrcb_mask, cv2.MORPH_OPEN, _OPEN_3)
+    global_mask = cv2.bitwise_and(ycrcb_mask, hsv_mask)
+    global_mask = cv2.medianBlur(global_mask, 3)
+    global_mask = cv2.morphologyEx(global_mask, cv2.MORPH_OPEN, _OPEN_4)
+    return {
+        "hsv_mask": hsv_mask,
+        "ycrcb_mask": ycrcb_mask,
+        "global_mask": global_mask,
+        "hsv_result": cv2.bitwise_and(image, image, mask=hsv_mask),
+        "ycrcb_result": cv2.bitwise_and(image, image, mask=ycrcb_mask),
+        "global_result": cv2.bitwise_and(image, image, mask=global_mask),
+    }
+
+
+class SkinSegmenter:
+    """Segments (N, H, W, 3) uint8 BGR batches into reused output buffers.
+
+    The arrays returned by segment() are overwritten by the next call with a
+    batch of the same shape.
+    """
+
+    def __init__(self, hsv_range=HSV_RANGE, ycrcb_range=YCRCB_RANGE):
+        self.lut = build_lut(tuple(map(tuple, hsv_range)), tuple(map(tuple, ycrcb_range)))
+        # Rule bits -> 0/255 mask of one rule, for cv2.LUT
+        self._bit_tables = {bit: np.where(np.arange(256) & bit, 255, 0).astype(np.uint8) for bit in (HSV_BIT, YCRCB_BIT)}
+        self._shape = None
+
+    def _allocate(self, shape: tuple):
+        n, h, w = shape[:3]
+        self._bgra = np.empty((n * h, w, 4), np.uint8)
+        # np.take converts any other index type to intp in a temporary copy
+        self._index = np.empty((n * h, w), np.intp)
+        self._bits = np.empty((n * h, w), np.uint8)
+        self._raw = np.empty((n * h, w), np.uint8)
+        self.outputs = {name: np.empty((n, h, w), np.uint8) for name in ("hsv_mask", "ycrcb_mask", "global_mask")}
+        self.outputs.update({name: np.empty(shape, np.uint8) for name in ("hsv_result", "ycrcb_result", "global_result")})
+        self._shape = shape
+
+    def segment(self, batch: np.ndarray) -> dict[str, np.ndarray]:
+        if batch.dtype != np.uint8 or batch.ndim != 4 or batch.shape[3] != 3:
+            raise ValueError(f"expected an (N, H, W, 3) uint8 batch, got {batch.shape} {batch.dtype}")
+        if batch.shape != self._shape:
+            self._allocate(batch.shape)
+        n, h, w = batch.shape[:3]
+        out = self.outputs
+        # Pointwise steps run on the batch as one tall (N * H, W) image
+        flat = batch.reshape(n * h, w, 3)
+        masks = {name: out[name].reshape(n * h, w) for name in ("hsv_mask", "ycrcb_mask", "global_mask")}
+
+        # Rule bits of every pixel: BGRA bytes read as uint32, alpha masked off
+        cv2.cvtColor(flat, cv2.COLOR_BGR2BGRA, dst=self._bgra)
+        np.bitwise_and(self._bgra.view(np.uint32)[..., 0], 0x00FFFFFF, out=self._index, casting="unsafe")
+        np.take(self.lut, self._index, out=self._bits, mode="clip")
+
+        for name, bit in (("hsv_mask", HSV_BIT), ("ycrcb_mask", YCRCB_BIT)):
+            cv2.LUT(self._bits, self._bit_tables[bit], dst=self._raw)
+            for i in range(n):
+                cv2.morphologyEx(self._raw[i * h : (i + 1) * h], cv2.MORPH_OPEN, _OPEN_3, dst=out[name][i])
+        cv2.bitwise_and(masks["hsv_mask"], masks["ycrcb_mask"], dst=self._raw)
+        for i in range(n):
+            rows = slice(i * h, (i + 1) * h)
+            cv2.medianBlur(self._raw[rows], 3, dst=self._bits[rows])
+            cv2.morphologyEx(self._bits[rows], cv2.MORPH_OPEN, _OPEN_4, dst=out["global_mask"][i])
+
+        for name in ("hsv", "ycrcb", "global"):
+            cv2.bitwise_and(flat, flat, mask=masks[f"{name}_mask"], dst=out[f"{name}_result"].reshape(n * h, w, 3))
+        return out
+
+
+def load_batch(paths, size: tuple[int, int] | None = None) -> np.ndarray:
+    """Read images into one (N, H, W, 3) array, resized to size (w, h) if given
+    (the first image's size otherwise)."""
+    images = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths]
+    if size is None:
+        size = (images[0].shape[1], images[0].shape[0])
+    batch = np.empty((len(images), size[1], size[0], 3), np.uint8)
+    for i, image in enumerate(images):
+        if image.shape[:2] == (size[1], size[0]):
+            batch[i] = image
+        else:
+            cv2.resize(image, size, dst=batch[i], interpolation=cv2.INTER_AREA)
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*", default=[str(Path(__file__).resolve().parent / "test_image_2.png")])
+    parser.add_argument("--batch", type=int, default=16, help="Batch size (images are repeated to fill it)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = (args.images * args.batch)[: max(args.batch, len(args.images))]
+    batch = load_batch(paths)
+    megapixels = batch.shape[0] * batch.shape[1] * batch.shape[2] / 1e6
+
+    start = time.perf_counter()
+    segmenter = SkinSegmenter()
+    print(f"lookup table: {time.perf_counter() - start:.2f}s (once per process)")
+
+    timings = {}
+    for name, run in (
+        ("per-image", lambda: [segment_image(image) for image in batch]),
+        ("batched", lambda: segmenter.segment(batch)),
+    ):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"  {name:>9}: {megapixels / best:7.1f} Mpx/s ({best * 1000:.0f}ms for {batch.shape[0]} images of {batch.shape[2]}x{batch.shape[1]})")
+
+    batched = segmenter.segment(batch)
+    mismatched = [
+        key for i, image in enumerate(batch) for key, value in segment_image(image).items() if not np.array_equal(value, batched[key][i])
+    ]
+    print("outputs equal the per-image path" if not mismatched else f"MISMATCH in {sorted(set(mismatched))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Tiled, memory-mapped execution of pipeline.py operation chains for images
+too large to process as one array.
+
+Usage:
+    python -m Image_Manipulation.tiled IMAGE --ops ops.json --out result.npy [--tile 1024] [--workers 4] [--png result.png]
+    python -m Image_Manipulation.tiled IMAGE --ops ops.json --check [--tolerance 1]
+
+The input is opened as a memory-mapped array: .npy files directly, TIFFs
+decoded strip by strip (or tile by tile) with tifffile into a .npy in the
+spill directory. Other formats can only be decoded whole with cv2.imread, so
+inputs over MAX_DECODE_PIXELS are rejected; convert them to a tiled TIFF
+first (e.g. vips tiffsave --tile). The chain is split into passes:
+- consecutive local operations (grayscale, binary threshold, morphology,
+  denoise_tv) run as one pass over tiles of the input, each read with a halo
+  of the summed halo() of its operations and cropped back to the tile;
+- warp runs as its own pass over tiles of the output, each warping only the
+  source region its corners map back to.
+Tiles are spread over a process pool; workers read the pass input and write
+their disjoint part of the output through memory maps, so no process holds
+more than a tile. Operations that need the whole image (triangle/Otsu
+threshold, contours, resize) are rejected.
+
+With --check the result is compared with pipeline.Pipeline on the whole
+image: morphology and pointwise operations match exactly, denoise_tv within
+a small difference that shrinks as its halo grows.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from numpy.lib.format import open_memmap
+from PIL import Image
+
+from Image_Manipulation.pipeline import Pipeline, Warp, build_operations, load_spec
+
+DEFAULT_TILE = 1024
+# Source pixels around a warp tile's footprint: the Lanczos kernel reach
+_WARP_MARGIN = 4
+# Largest image decoded whole (non-TIFF inputs): 384 MiB as 8-bit BGR
+MAX_DECODE_PIXELS = 1 << 27
+# Rows of a spilled TIFF converted to BGR at a time
+_BAND_BYTES = 64 << 20
+
+
+def open_image(path, spill_dir, max_decode_pixels: int = MAX_DECODE_PIXELS) -> np.ndarray:
+    """Read-only memory map of an image, as 8-bit BGR like cv2.imread decodes it.
+
+    .npy files are mapped as they are and TIFFs are spilled to .npy without
+    holding the whole image. Other formats are decoded whole, so ones over
+    max_decode_pixels raise ValueError.
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode="r")
+    target = Path(spill_dir) / f"{path.stem}.npy"
+    if path.suffix.lower() in (".tif", ".tiff"):
+        _spill_tiff(path, target)
+        return np.load(target, mmap_mode="r")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            # Reads the header only
+            with Image.open(path) as header:
+                width, height = header.size
+    except Image.DecompressionBombError:
+        width = height = max_decode_pixels
+    except OSError as e:
+        raise ValueError(f"could not decode {path}: {e}") from e
+    if width * height > max_decode_pixels:
+        raise ValueError(
+            f"{path.name} is too large to decode whole ({width}x{height} pixels, at most {max_decode_pixels}); "
+            "convert it to a tiled TIFF or .npy first"
+        )
+    image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"could not decode {path}")
+    spilled = open_memmap(target, mode="w+", dtype=image.dtype, shape=image.shape)
+    spilled[...] = image
+    spilled.flush()
+    del image, spilled
+    return np.load(target, mmap_mode="r")
+
+
+def _spill_tiff(path: Path, target: Path) -> None:
+    """Decode the first page of a TIFF into target as 8-bit BGR, a band of rows at a time."""
+    import tifffile
+
+    native_path = target.with_suffix(".native.npy")
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        photometric = {tifffile.PHOTOMETRIC.MINISBLACK: "YX", tifffile.PHOTOMETRIC.RGB: "YXS"}.get(page.photometric)
+        if page.axes != photometric or page.dtype not in (np.uint8, np.uint16) or page.shape[2:] not in ((), (3,), (4,)):
+            raise ValueError(
+                f"unsupported TIFF {path.name}: {page.photometric.name} {page.axes} {page.dtype}; "
+                "expected 8 or 16-bit gray, RGB or RGBA with interleaved samples"
+            )
+        # cv2.imread composites unassociated alpha over black
+        premultiply = page.extrasamples[:1] == (tifffile.EXTRASAMPLE.UNASSALPHA,)
+        # tifffile decodes strip by strip (or tile by tile) into the memory map
+        native = open_memmap(native_path, mode="w+", dtype=page.dtype, shape=page.shape)
+        page.asarray(out=native)
+    try:
+        height, width = native.shape[:2]
+        spilled = open_memmap(target, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        rows = max(1, _BAND_BYTES // native[0].nbytes)
+        for y in range(0, height, rows):
+            band = np.asarray(native[y : y + rows])
+            if band.dtype == np.uint16:
+                # As cv2.imread: the high byte of gray samples, colour rounded to 8 bits
+                band = (band >> 8 if band.ndim == 2 else (band.astype(np.uint32) + 128) // 257).astype(np.uint8)
+            if premultiply:
+                band = ((band[..., :3].astype(np.uint16) * band[..., 3:] + 127) // 255).astype(np.uint8)
+            if band.ndim == 2:
+                band = cv2.cvtColor(band, cv2.COLOR_GRAY2BGR)
+            else:
+                band = cv2.cvtColor(band, cv2.COLOR_RGB2BGR if band.shape[2] == 3 else cv2.COLOR_RGBA2BGR)
+            spilled[y : y + rows] = band
+        spilled.flush()
+        del spilled
+    finally:
+        del native
+        native_path.unlink()
+
+
+def plan_passes(spec: list[dict]) -> list[tuple[str, list[dict]]]:
+    """Split a chain into ("local", steps) and ("warp", [step]) passes.
+
+    Raises ValueError for operations that cannot be tiled.
+    """
+    passes = []
+    for step, (name, operation) in zip(spec, build_operations(spec)):
+        if isinstance(operation, Warp):
+            passes.append(("warp", [step]))
+        elif operation.halo() is None:
+            raise ValueError(f"{name} needs the whole image and cannot run tiled")
+        elif passes and passes[-1][0] == "local":
+            passes[-1][1].append(step)
+        else:
+            passes.append(("local", [step]))
+    return passes
+
+
+def _tiles(height: int, width: int, tile: int) -> list[tuple[int, int, int, int]]:
+    return [(y, min(y + tile, height), x, min(x + tile, width)) for y in range(0, height, tile) for x in range(0, width, tile)]
+
+
+def _translation(dx: float, dy: float) -> np.ndarray:
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=np.float64)
+
+
+# Per-process state of the pass being run, set by the pool initializer
+_kind = None
+_pipeline: Pipeline | None = None
+_warp: Warp | None = None
+_halo = 0
+_src: np.ndarray | None = None
+_out: np.ndarray | None = None
+
+
+def _init_worker(kind: str, steps: list[dict], src_path: str, out_path: str):
+    global _kind, _pipeline, _warp, _halo, _src, _out
+    cv2.setNumThreads(1)
+    _kind = kind
+    _pipeline = Pipeline(steps)
+    if kind == "warp":
+        _warp = _pipeline.operations[0][1]
+    _halo = sum(operation.halo() or 0 for _, operation in _pipeline.operations)
+    _src = np.load(src_path, mmap_mode="r")
+    _out = np.load(out_path, mmap_mode="r+")
+
+
+def _local_tile(y0: int, y1: int, x0: int, x1: int):
+    height, width = _src.shape[:2]
+    # The halo is clipped at the image edges, where the operations see the
+    # same border as on the whole image
+    hy0, hy1 = max(0, y0 - _halo), min(height, y1 + _halo)
+    hx0, hx1 = max(0, x0 - _halo), min(width, x1 + _halo)
+    region = np.ascontiguousarray(_src[hy0:hy1, hx0:hx1])
+    result = _pipeline.run(region)
+    _out[y0:y1, x0:x1] = result[y0 - hy0 : y1 - hy0, x0 - hx0 : x1 - hx0]
+
+
+def _warp_tile(y0: int, y1: int, x0: int, x1: int):
+    height, width = _src.shape[:2]
+    corners = np.float64([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]])
+    homogeneous = corners @ np.linalg.inv(_warp.matrix).T
+    if (homogeneous[:, 2] > 0).all():
+        back = homogeneous[:, :2] / homogeneous[:, 2:]
+        sx0 = max(0, int(np.floor(back[:, 0].min())) - _WARP_MARGIN)
+        sy0 = max(0, int(np.floor(back[:, 1].min())) - _WARP_MARGIN)
+        sx1 = min(width, int(np.ceil(back[:, 0].max())) + _WARP_MARGIN + 1)
+        sy1 = min(height, int(np.ceil(back[:, 1].max())) + _WARP_MARGIN + 1)
+    else:
+        # The tile crosses the horizon of the transform; read everything
+        sx0, sy0, sx1, sy1 = 0, 0, width, height
+    if sx0 >= sx1 or sy0 >= sy1:
+        return  # maps outside the source: stays at the zero border value
+    region = np.ascontiguousarray(_src[sy0:sy1, sx0:sx1])
+    matrix = _translation(-x0, -y0) @ _warp.matrix @ _translation(sx0, sy0)
+    _out[y0:y1, x0:x1] = cv2.warpPerspective(region, matrix, (x1 - x0, y1 - y0), flags=_warp.interpolation)
+
+
+def _run_tile(tile: tuple[int, int, int, int]):
+    if _kind == "warp":
+        _warp_tile(*tile)
+    else:
+        _local_tile(*tile)
+
+
+def _output_shape(steps: list[dict], shape: tuple) -> tuple:
+    pipeline = Pipeline(steps)
+    for _, operation in pipeline.operations:
+        shape = operation.output_shape(shape)
+    return shape
+
+
+def process_tiled(spec: list[dict], src: np.ndarray, out_path, tile: int = DEFAULT_TILE, workers: int | None = None, spill_dir=None) -> np.ndarray:
+    """Run spec over src (a memory-mapped .npy array) tile by tile.
+
+    Intermediate passes are spilled to .npy files in spill_dir (a temporary
+    directory by default) and removed afterwards. Returns the result as a
+    read-only memory map of out_path.
+    """
+    passes = plan_passes(spec)
+    workers = workers or os.cpu_count() or 1
+    own_spill = spill_dir is None
+    spill_dir = Path(tempfile.mkdtemp(prefix="tiled-") if own_spill else spill_dir)
+    try:
+        src_path = src.filename
+        for i, (kind, steps) in enumerate(passes):
+            last = i == len(passes) - 1
+            dst_path = str(out_path) if last else str(spill_dir / f"pass-{i}.npy")
+            shape = _output_shape(steps, src.shape)
+            # Zero-filled: the warp border value for tiles that map outside
+            open_memmap(dst_path, mode="w+", dtype=src.dtype, shape=shape).flush()
+            tiles = _tiles(shape[0], shape[1], tile)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kind, steps, src_path, dst_path)) as pool:
+                for _ in pool.map(_run_tile, tiles, chunksize=max(1, len(tiles) // (workers * 4))):
+                    pass
+            if i > 0:
+                os.unlink(src_path)
+            src = np.load(dst_path, mmap_mode="r")
+            src_path = dst_path
+        return src
+    finally:
+        if own_spill:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def compare_with_whole(spec: list[dict], tiled: np.ndarray, image: np.ndarray) -> dict:
+    """Differences between a tiled result and Pipeline.run on the whole image."""
+    whole = Pipeline(spec).run(np.ascontiguousarray(image))
+    diff = np.abs(whole.astype(np.int16) - np.asarray(tiled).astype(np.int16))
+    return {"max_abs_diff": int(diff.max()), "mean_abs_diff": float(diff.mean()), "differing_fraction": float(np.count_nonzero(diff) / diff.size)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image")
+    parser.add_argument("--ops", required=True, help="JSON file or JSON string with the operation list")
+    parser.add_argument("--out", default=None, help="Result .npy (a temporary file when omitted)")
+    parser.add_argument("--png", default=None, help="Also write the result as an image")
+    parser.add_argument("--tile", type=int, default=DEFAULT_TILE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--spill-dir", default=None)
+    parser.add_argument("--check", action="store_true", help="Compare with whole-image processing")
+    parser.add_argument("--tolerance", type=int, default=1, help="Largest accepted per-pixel difference for --check")
+    args = parser.parse_args()
+
+    spec = load_spec(args.ops)
+    try:
+        plan_passes(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    with tempfile.TemporaryDirectory(prefix="tiled-") as tmp:
+        spill_dir = args.spill_dir or tmp
+        src = open_image(args.image, spill_dir)
+        out = args.out or str(Path(tmp) / "result.npy")
+        start = time.perf_counter()
+        result = process_tiled(spec, src, out, args.tile, args.workers, spill_dir)
+        elapsed = time.perf_counter() - start
+        print(f"{src.shape} -> {result.shape} in {elapsed:.2f}s ({src.shape[0] * src.shape[1] / elapsed / 1e6:.1f} Mpx/s)")
+        if args.png:
+            cv2.imwrite(args.png, result)
+        if args.check:
+            stats = compare_with_whole(spec, result, src)
+            print(f"vs whole image: max diff {stats['max_abs_diff']}, mean diff {stats['mean_abs_diff']:.4f}, {stats['differing_fraction']:.2%} of values differ")
+            if stats["max_abs_diff"] > args.tolerance:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
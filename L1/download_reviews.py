@@ -1,14 +1,25 @@
+import argparse
+
 import scrapy
 import scrapy.crawler
 import scrapy.utils.project
 import spds.spiders.rev
 
-def crawl():
+def crawl(product_url: str | None = None, concurrent_requests: int | None = None):
 
-    process = scrapy.crawler.CrawlerProcess(scrapy.utils.project.get_project_settings())
+    settings = scrapy.utils.project.get_project_settings()
+    if concurrent_requests:
+        # Share of the server-wide concurrency budget assigned to this crawl
+        settings.set("CONCURRENT_REQUESTS", concurrent_requests, priority="cmdline")
+        settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", concurrent_requests, priority="cmdline")
+    process = scrapy.crawler.CrawlerProcess(settings)
     
-    process.crawl(spds.spiders.rev.review_spider)
+    process.crawl(spds.spiders.rev.review_spider, product_url=product_url)
     process.start()
     
 if __name__ == "__main__":
-    crawl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download otzovik reviews of one product")
+    parser.add_argument("product_url", nargs="?", default=None, help="Product review listing URL (defaults to the spider's base_url)")
+    parser.add_argument("--concurrent-requests", type=int, default=None)
+    args = parser.parse_args()
+    crawl(args.product_url, args.concurrent_requests)
@@ -0,0 +1,71 @@
+"""MinHash signature throughput and duplicate recall on a synthetic corpus.
+
+Usage: python L2/bench_minhash.py [--reviews 20000] [--dup-rate 0.1]
+
+A share of the synthetic reviews is reposted with a few words edited, as
+templated otzovik reviews are. The script reports signature throughput, the
+time of a full update_duplicates() run and how many reposts were clustered
+with their original.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from L2.minhash import signatures, update_duplicates
+from L2.organize_dataset import REVIEW_COLUMNS, init_database, review_to_row
+from L2.synthetic_corpus import generate_reviews
+
+
+def _repost(review: dict, rng: random.Random, link: str) -> dict:
+    words = review["review_descr"].split()
+    for _ in range(max(1, len(words) // 50)):
+        words[rng.randrange(len(words))] = rng.choice(["очень", "товар", "ужасно", "отлично"])
+    return {**review, "review_descr": " ".join(words), "link": link}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--dup-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    reviews = list(generate_reviews(args.reviews))
+    reposts = {}
+    for i in rng.sample(range(len(reviews)), int(len(reviews) * args.dup_rate)):
+        reposts[len(reviews) + len(reposts)] = i
+    reviews += [_repost(reviews[i], rng, f"https://otzovik.com/repost_{j}.html") for j, i in reposts.items()]
+
+    texts = [r["review_descr"] for r in reviews]
+    megabytes = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    start = time.perf_counter()
+    signatures(texts)
+    elapsed = time.perf_counter() - start
+    print(f"signatures: {len(texts)} reviews in {elapsed:.2f}s = {len(texts) / elapsed:.0f} reviews/s, {megabytes / elapsed:.1f} MB/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = init_database(str(Path(tmp) / "reviews.db"))
+        conn.executemany(
+            f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) VALUES ({', '.join('?' for _ in REVIEW_COLUMNS)})",
+            [review_to_row(r) for r in reviews],
+        )
+        start = time.perf_counter()
+        update_duplicates(conn)
+        elapsed = time.perf_counter() - start
+        print(f"update_duplicates: {len(reviews)} reviews in {elapsed:.2f}s = {len(reviews) / elapsed:.0f} reviews/s")
+
+        cluster = dict(conn.execute("SELECT id, dup_cluster FROM reviews"))
+        # ids are 1-based insertion order
+        found = sum(1 for j, i in reposts.items() if cluster[j + 1] is not None and cluster[j + 1] == cluster[i + 1])
+        clustered = sum(1 for c in cluster.values() if c is not None)
+        print(f"reposts clustered with their original: {found}/{len(reposts)}; reviews in clusters: {clustered}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare load time and peak RSS of the SQLite and Parquet reviews loaders.
+
+Usage: python L2/bench_parquet.py L2/reviews.db [--parquet-dir DIR] [--columns stars,likes]
+
+Every loader runs in a fresh interpreter so that ru_maxrss reflects only that
+loader. The Parquet export is created next to the DB when it does not exist.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_CHILD = r"""
+import json, resource, sqlite3, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+import polars, duckdb
+from L2.parquet_export import load_reviews
+
+kind, db_path, parquet_dir, columns = {args!r}
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if kind == "read_sql_query":
+    con = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM reviews", con)
+    if columns:
+        df = df[columns]
+    con.close()
+elif kind == "polars":
+    df = load_reviews(parquet_dir, columns=columns or None)
+else:
+    df = load_reviews(parquet_dir, columns=columns or None, engine="duckdb")
+elapsed = time.perf_counter() - start
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"loader": kind, "rows": len(df), "seconds": elapsed, "peak_rss_delta_mb": (rss_after - rss_before) / 1024}}))
+"""
+
+
+def run_loader(kind, db_path, parquet_dir, columns):
+    code = _CHILD.format(root=str(ROOT), args=(kind, str(db_path), str(parquet_dir), columns))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", help="Organized reviews SQLite DB")
+    parser.add_argument("--parquet-dir", default=None)
+    parser.add_argument("--columns", default="", help="Comma separated columns to load (all when empty)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from L2.parquet_export import export_parquet_from_db
+
+    db_path = Path(args.db).resolve()
+    parquet_dir = Path(args.parquet_dir) if args.parquet_dir else db_path.with_suffix(".parquet")
+    if not parquet_dir.exists():
+        export_parquet_from_db(db_path, parquet_dir)
+    columns = [c for c in args.columns.split(",") if c]
+
+    results = []
+    for kind in ("read_sql_query", "polars", "duckdb"):
+        runs = [run_loader(kind, db_path, parquet_dir, columns) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        results.append(best)
+        print(f"{kind:>15}: {best['rows']} rows in {best['seconds'] * 1000:.1f} ms, peak RSS +{best['peak_rss_delta_mb']:.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Cached, typed loader of the reviews table for the marimo notebooks.
+
+Usage (in a notebook cell):
+    from L2.dataset import load_reviews
+    df = load_reviews("L2/reviews.db", columns=["stars"])
+
+marimo re-runs the loading cell on every reactive change, and every run used
+to read the whole table, text columns included, through read_sql_query.
+load_reviews keeps the loaded columns in a process-level cache, valid while
+the DB file (and its -wal file) keep their mtime and size, and reads only
+the requested columns that are not cached yet:
+- from the Arrow IPC (Feather) snapshot next to the DB (reviews.feather),
+  memory-mapped so only the requested columns are read;
+- from SQLite when the snapshot is missing, stale or lacks a column. These
+  columns are then added to the snapshot, stamped with the DB state they
+  were read from; a new snapshot also gets every non-text column, so later
+  loads without the review texts come from the snapshot.
+Frames come typed: `stars` as an ordered categorical, `recommendation` as a
+categorical of bools, `date_posted` as datetime64 and nullable integers for
+the integer columns with nulls.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+STARS_DTYPE = pd.CategoricalDtype([1, 2, 3, 4, 5], ordered=True)
+RECOMMENDATION_DTYPE = pd.CategoricalDtype([False, True])
+INT_COLUMNS = ("year_usage", "likes", "comments", "title_tokens", "review_descr_tokens", "dup_cluster")
+# Columns a new snapshot leaves out unless they are requested
+TEXT_COLUMNS = ("title", "review_plus", "review_minus", "review_descr")
+
+_STAMP_KEY = b"scraper_labs.db_stamp"
+
+# resolved DB path -> (stamp, {column: Series})
+_cache: dict[str, tuple[str, dict[str, pd.Series]]] = {}
+
+
+def db_stamp(db_path) -> str:
+    """mtime and size of the DB and of its -wal file, if any."""
+    parts = []
+    for path in (Path(db_path), Path(f"{db_path}-wal")):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+    return "/".join(parts)
+
+
+def snapshot_path(db_path) -> Path:
+    return Path(db_path).with_suffix(".feather")
+
+
+def table_columns(db_path) -> list[str]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[1] for row in conn.execute("PRAGMA table_info(reviews)")]
+    finally:
+        conn.close()
+
+
+def convert_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the loader's dtypes to the columns of a raw reviews frame."""
+    if "stars" in df:
+        df["stars"] = df["stars"].astype(STARS_DTYPE)
+    if "recommendation" in df:
+        df["recommendation"] = df["recommendation"].astype("boolean").astype(RECOMMENDATION_DTYPE)
+    if "date_posted" in df:
+        df["date_posted"] = pd.to_datetime(df["date_posted"], format="%Y-%m-%d")
+    for column in INT_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("Int64")
+    return df
+
+
+def read_db(db_path, columns: list[str]) -> pd.DataFrame:
+    conn = sqlite3.connect(db_path)
+    try:
+        select = ", ".join(f'"{c}"' for c in columns)
+        return convert_types(pd.read_sql_query(f"SELECT {select} FROM reviews ORDER BY id", conn))
+    finally:
+        conn.close()
+
+
+def snapshot_columns(db_path, stamp: str) -> list[str] | None:
+    """Columns of the snapshot, or None when it is missing or stale."""
+    try:
+        with pa.memory_map(str(snapshot_path(db_path))) as source:
+            schema = ipc.open_file(source).schema
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    if (schema.metadata or {}).get(_STAMP_KEY) != stamp.encode():
+        return None
+    return schema.names
+
+
+def read_snapshot(db_path, columns: list[str], stamp: str) -> pd.DataFrame | None:
+    """Columns of the snapshot, or None when it is missing, stale or lacks one of them."""
+    names = snapshot_columns(db_path, stamp)
+    if names is None or not set(columns) <= set(names):
+        return None
+    return feather.read_table(snapshot_path(db_path), columns=columns, memory_map=True).to_pandas()
+
+
+def write_snapshot(db_path, df: pd.DataFrame, stamp: str) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _STAMP_KEY: stamp.encode()})
+    path = snapshot_path(db_path)
+    partial = path.with_suffix(".feather.partial")
+    feather.write_feather(table, partial)
+    os.replace(partial, path)
+
+
+def extend_snapshot(db_path, columns: list[str], stamp: str) -> pd.DataFrame:
+    """Read columns from SQLite and add them to the snapshot.
+
+    A missing or stale snapshot is replaced by one with these columns and
+    every non-text column of the table.
+    """
+    names = snapshot_columns(db_path, stamp)
+    if names is None:
+        names = []
+        columns = [c for c in table_columns(db_path) if c in columns or c not in TEXT_COLUMNS]
+    loaded = read_db(db_path, [c for c in columns if c not in names])
+    df = loaded
+    if names:
+        df = pd.concat([feather.read_table(snapshot_path(db_path), memory_map=True).to_pandas(), loaded], axis=1)
+    write_snapshot(db_path, df, stamp)
+    return df
+
+
+def load_reviews(db_path="L2/reviews.db", columns: list[str] | None = None, snapshot: bool = True) -> pd.DataFrame:
+    """The reviews table (or the given columns of it) as a typed DataFrame.
+
+    The returned frame is the caller's own: pandas copy-on-write keeps
+    modifications out of the cache.
+    """
+    key = str(Path(db_path).resolve())
+    stamp = db_stamp(db_path)
+    cached_stamp, cached = _cache.get(key, (None, {}))
+    if cached_stamp != stamp:
+        cached = {}
+        _cache[key] = (stamp, cached)
+
+    wanted = list(columns) if columns else table_columns(db_path)
+    missing = [c for c in wanted if c not in cached]
+    if missing:
+        loaded = read_snapshot(db_path, missing, stamp) if snapshot else None
+        if loaded is None and snapshot:
+            loaded = extend_snapshot(db_path, missing, stamp)
+        elif loaded is None:
+            loaded = read_db(db_path, missing)
+        cached.update(loaded.items())
+    return pd.DataFrame({c: cached[c] for c in wanted})
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -6,15 +6,16 @@ app = marimo.App(width="medium")
 
 @app.cell
 def _():
-    import pandas as pd
-    import sqlite3 as sqll
-    return pd, sqll
+    import sys
+    sys.path.append('./')
+    from L2.dataset import load_reviews
+    return (load_reviews,)
 
 
 @app.cell
-def _(pd, sqll):
-    con = sqll.connect("L2/reviews.db")
-    df = pd.read_sql_query("SELECT * FROM reviews", con)
+def _(load_reviews):
+    # Cached per process and snapshotted next to the DB; reads only stars
+    df = load_reviews("L2/reviews.db", columns=["stars"])
     df
     return (df,)
 
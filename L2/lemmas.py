@@ -0,0 +1,88 @@
+"""Russian lemmatization shared by the chart server and the TF-IDF index.
+
+lemmatize() lowercases and tokenizes like L2/tokens.py, lemmatizes with
+natasha and drops stopwords, punctuation, numbers and words of two characters
+or less. natasha and the NLTK stopword list are loaded on first use; without
+them the plain tokens and a built-in stopword set are used.
+"""
+import re
+import string
+
+from L2.tokens import TOKEN_PATTERN
+
+_RU_STOP = {
+    # minimal RU stopword set; not exhaustive
+    "и","в","во","не","что","он","на","я","с","со","как","а","то","все","она","так","его","но","да","ты","к","у","же","вы","за","бы","по","только","ее","мне","было","вот","от","меня","еще","нет","о","из","ему","теперь","когда","даже","ну","вдруг","ли","если","уже","или","ни","быть","был","него","до","вас","нибудь","опять","уж","вам","ведь","там","потом","себя","ничего","ей","может","они","тут","где","есть","надо","ней","для","мы","тебя","их","чем","была","сам","чтоб","без","будто","чего","раз","тоже","себе","под","будет","ж","тогда","кто","этот","того","потому","этого","какой","совсем","ним","здесь","этом","один","почти","мой","тем","чтобы","нее","кажется","сейчас","были","куда","зачем","всех","никогда","можно","при","наконец","два","об","другой","хоть","после","над","больше","тот","через","эти","нас","про","всего","них","какая","много","разве","три","эту","моя","впрочем","хорошо","свою","этой","перед","иногда","лучше","чуть","том","нельзя","такой","им","более","всегда","конечно","всю","между"
+}
+_PUNCT = set(string.punctuation).union({"«","»","—","–","...","``","''","`","'","„","“","”"})
+
+# Lazy NLP components
+_nlp_loaded = False
+_segmenter = None
+_morph_vocab = None
+_morph_tagger = None
+_ru_stopwords = None
+
+
+def _ensure_nlp():
+    global _nlp_loaded, _segmenter, _morph_vocab, _morph_tagger, _ru_stopwords
+    if _nlp_loaded:
+        return
+    try:
+        import natasha as nlp
+        _segmenter = nlp.Segmenter()
+        _morph_vocab = nlp.MorphVocab()
+        emb = nlp.NewsEmbedding()
+        _morph_tagger = nlp.NewsMorphTagger(emb)
+    except Exception as e:
+        print(f"[lemmas] natasha load failed: {e}")
+        _segmenter = _morph_vocab = _morph_tagger = None
+    # Stopwords via NLTK with fallback
+    try:
+        import nltk
+        from nltk.corpus import stopwords
+        try:
+            _ru_stopwords = set(stopwords.words('russian'))
+        except LookupError:
+            nltk.download('stopwords', quiet=True)
+            _ru_stopwords = set(stopwords.words('russian'))
+    except Exception as e:
+        print(f"[lemmas] nltk stopwords failed: {e}")
+        _ru_stopwords = set(_RU_STOP)
+    _nlp_loaded = True
+
+
+def lemmatize(text: str) -> list[str]:
+    """Lemmatize Russian text using natasha, filter stopwords/punct/numbers.
+    Falls back to simple regex tokenization if natasha unavailable.
+    """
+    if not text:
+        return []
+    _ensure_nlp()
+    tokens = re.findall(TOKEN_PATTERN, text.lower(), flags=re.UNICODE)
+    if _segmenter is not None and _morph_tagger is not None and _morph_vocab is not None:
+        try:
+            import natasha as nlp
+            doc = nlp.Doc(" ".join(tokens))
+            doc.segment(_segmenter)
+            doc.tag_morph(_morph_tagger)
+            for t in list(getattr(doc, 'tokens', []) or []):
+                t.lemmatize(_morph_vocab)
+            lemmas = [t.lemma for t in list(getattr(doc, 'tokens', []) or [])]
+        except Exception as e:
+            print(f"[lemmas] natasha processing failed, fallback: {e}")
+            lemmas = tokens
+    else:
+        lemmas = tokens
+    # Filters
+    sw = _ru_stopwords or _RU_STOP
+    result = []
+    for lemma in lemmas:
+        if not lemma or lemma in sw:
+            continue
+        if lemma.isdigit() or len(lemma) <= 2:
+            continue
+        if lemma in _PUNCT:
+            continue
+        result.append(lemma)
+    return result
@@ -0,0 +1,216 @@
+"""Near-duplicate review detection with MinHash and LSH banding.
+
+Every review_descr is reduced to the set of its word 3-gram shingles and
+summarised by a NUM_PERM-value MinHash signature. Signatures are cut into
+BANDS bands; reviews sharing any band bucket become candidates and are
+confirmed when their estimated Jaccard similarity reaches THRESHOLD. Only
+candidates are compared, so a run costs roughly linear time in the number of
+new reviews instead of comparing all pairs.
+
+State lives in the reviews DB:
+- review_minhash(id, sig): signature per review (NULL if too short to shingle)
+- review_lsh(bucket, id): one row per band, indexed by bucket
+- reviews.dup_cluster: smallest id of the review's duplicate cluster, NULL for
+  reviews without duplicates
+update_duplicates() processes reviews that have no signature yet, so it
+works both for fresh DBs and after incremental organize runs.
+"""
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+THRESHOLD = 0.8
+
+_rng = np.random.default_rng(20240917)
+# Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits; a must be odd
+_A = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_WORD_RE = re.compile(r"[\w\-]+", flags=re.UNICODE)
+_token_hashes: dict[str, int] = {}
+
+
+def _token_hash(token: str) -> int:
+    h = _token_hashes.get(token)
+    if h is None:
+        h = zlib.crc32(token.encode("utf-8"))
+        if len(_token_hashes) < 1 << 20:
+            _token_hashes[token] = h
+    return h
+
+
+def batch_shingles(texts) -> tuple[np.ndarray, np.ndarray]:
+    """32-bit hashes of the word SHINGLE_SIZE-grams of all texts, with the
+    index of the text each shingle belongs to (ascending).
+
+    Tokens of the whole batch are hashed into one array and combined with a
+    vectorized rolling hash; shingles spanning two texts are dropped.
+    """
+    token_hashes, lengths = [], []
+    for text in texts:
+        tokens = _WORD_RE.findall(text.lower()) if text else []
+        token_hashes.extend(map(_token_hash, tokens))
+        lengths.append(len(tokens))
+    tokens = np.array(token_hashes, dtype=np.uint64)
+    n = len(tokens) - SHINGLE_SIZE + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    mixed = np.zeros(n, dtype=np.uint64)
+    for k in range(SHINGLE_SIZE):
+        # polynomial rolling combination, kept to 32 bits
+        mixed = (mixed * np.uint64(1000003) + tokens[k:k + n]) & np.uint64(0xFFFFFFFF)
+    doc = np.repeat(np.arange(len(lengths)), lengths)
+    valid = doc[:n] == doc[SHINGLE_SIZE - 1:]
+    return mixed[valid], doc[:n][valid]
+
+
+def signatures(texts, batch_size: int = 512) -> list:
+    """MinHash signatures (uint32[NUM_PERM]) of texts, None where a text has
+    fewer than SHINGLE_SIZE words. Each batch is hashed in one vectorized
+    pass: all shingles are permuted together and reduced per text with
+    np.minimum.reduceat (repeated shingles do not change a minimum, so they
+    need no deduplication).
+    """
+    result = []
+    texts = list(texts)
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        shingles, doc = batch_shingles(batch)
+        sigs = [None] * len(batch)
+        if len(shingles):
+            docs, offsets = np.unique(doc, return_index=True)
+            permuted = ((_A[:, None] * shingles[None, :] + _B[:, None]) >> np.uint64(32)).astype(np.uint32)
+            mins = np.minimum.reduceat(permuted, offsets, axis=1).T
+            for d, sig in zip(docs, mins):
+                sigs[d] = np.ascontiguousarray(sig)
+        result.extend(sigs)
+    return result
+
+
+def band_buckets(sig: np.ndarray) -> list[int]:
+    """One signed 64-bit bucket key per band (band index mixed in)."""
+    keys = []
+    for band in range(BANDS):
+        digest = zlib.crc32(sig[band * ROWS:(band + 1) * ROWS].tobytes(), band)
+        keys.append((band << 32) | digest)
+    return keys
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity estimated from two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def init_minhash_tables(conn):
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(reviews)")}
+    if "dup_cluster" not in columns:
+        cur.execute("ALTER TABLE reviews ADD COLUMN dup_cluster INTEGER")
+    cur.execute("CREATE TABLE IF NOT EXISTS review_minhash (id INTEGER PRIMARY KEY, sig BLOB)")
+    cur.execute("CREATE TABLE IF NOT EXISTS review_lsh (bucket INTEGER NOT NULL, id INTEGER NOT NULL)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_review_lsh_bucket ON review_lsh (bucket)")
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(x, x) != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        self.parent.setdefault(a, a)
+        self.parent.setdefault(b, b)
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # smallest id stays the root so it becomes the cluster id
+            if ra < rb:
+                self.parent[rb] = ra
+            else:
+                self.parent[ra] = rb
+
+
+def update_duplicates(conn, batch_size: int = 5000) -> int:
+    """Sign reviews without a signature and merge them into duplicate clusters.
+
+    Returns the number of reviews signed.
+    """
+    # Collect ids up front: the loop below writes to review_minhash
+    todo = [rid for (rid,) in conn.execute(
+        """
+        SELECT r.id FROM reviews AS r
+        LEFT JOIN review_minhash AS m ON m.id = r.id
+        WHERE m.id IS NULL ORDER BY r.id
+        """
+    )]
+    signed = 0
+    for start in range(0, len(todo), batch_size):
+        ids = todo[start:start + batch_size]
+        rows = conn.execute(
+            "SELECT id, review_descr FROM reviews WHERE id BETWEEN ? AND ? ORDER BY id", (ids[0], ids[-1])
+        ).fetchall()
+        wanted = set(ids)
+        rows = [row for row in rows if row[0] in wanted]
+        signed += len(rows)
+        sigs = signatures([text for _, text in rows])
+        conn.executemany(
+            "INSERT INTO review_minhash (id, sig) VALUES (?, ?)",
+            [(rid, sig.tobytes() if sig is not None else None) for (rid, _), sig in zip(rows, sigs)],
+        )
+
+        uf = _UnionFind()
+        batch_sigs = {}
+        lsh_rows = []
+        for (rid, _), sig in zip(rows, sigs):
+            if sig is None:
+                continue
+            batch_sigs[rid] = sig
+            lsh_rows.extend((bucket, rid) for bucket in band_buckets(sig))
+        # Inserting first lets reviews in the same batch find each other
+        conn.executemany("INSERT INTO review_lsh (bucket, id) VALUES (?, ?)", lsh_rows)
+
+        for rid, sig in batch_sigs.items():
+            buckets = band_buckets(sig)
+            candidates = {
+                cid for (cid,) in conn.execute(
+                    f"SELECT DISTINCT id FROM review_lsh WHERE bucket IN ({', '.join('?' for _ in buckets)}) AND id != ?",
+                    (*buckets, rid),
+                )
+            }
+            for cid in candidates:
+                other = batch_sigs.get(cid)
+                if other is None:
+                    blob = conn.execute("SELECT sig FROM review_minhash WHERE id = ?", (cid,)).fetchone()[0]
+                    other = np.frombuffer(blob, dtype=np.uint32)
+                if similarity(sig, other) >= THRESHOLD:
+                    uf.union(rid, cid)
+
+        if not uf.parent:
+            continue
+        # Fold existing cluster ids into the union-find, then write clusters back
+        members = list(uf.parent)
+        existing = dict(conn.execute(
+            f"SELECT id, dup_cluster FROM reviews WHERE id IN ({', '.join('?' for _ in members)}) AND dup_cluster IS NOT NULL",
+            members,
+        ).fetchall())
+        for rid, cluster in existing.items():
+            uf.union(rid, cluster)
+        groups = {}
+        for rid in list(uf.parent):
+            groups.setdefault(uf.find(rid), set()).add(rid)
+        for root, group in groups.items():
+            old_clusters = {existing[r] for r in group if r in existing} - {root}
+            for old in old_clusters:
+                conn.execute("UPDATE reviews SET dup_cluster = ? WHERE dup_cluster = ?", (root, old))
+            conn.executemany("UPDATE reviews SET dup_cluster = ? WHERE id = ?", [(root, r) for r in group | {root}])
+    return signed
@@ -1,9 +1,23 @@
 import json
 import sqlite3
 import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 from datetime import datetime
 
+_L2_DIR = Path(__file__).resolve().parent
+# Run from L2 (python organize_dataset.py) the L2 package is not importable yet
+if str(_L2_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(_L2_DIR.parent))
+
+from L2.lemmas import lemmatize
+from L2.minhash import init_minhash_tables, update_duplicates
+from L2.sketches import NUMERIC_COLUMNS as SKETCH_NUMERIC_COLUMNS, TEXT_COLUMNS as SKETCH_TEXT_COLUMNS, CorpusSketches, sketch_path
+from L2.tfidf import SHARD_ROWS as TFIDF_SHARD_ROWS, TEXT_COLUMNS as TFIDF_TEXT_COLUMNS, TfidfIndex, index_dir as tfidf_index_dir
+from L2.tokens import update_token_counts
+
 
 def convert_year(year_str):
     """Convert year string to integer or None if empty."""
@@ -72,55 +86,290 @@ def init_database(db_path):
         price TEXT,
         date_posted DATE NOT NULL,
         likes INTEGER NOT NULL,
-        comments INTEGER NOT NULL
+        comments INTEGER NOT NULL,
+        title_tokens INTEGER,
+        review_descr_tokens INTEGER
+    )
+    """)
+
+    # DBs organized before token counts were stored lack these columns
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(reviews)")}
+    for column in ("title_tokens", "review_descr_tokens"):
+        if column not in columns:
+            cur.execute(f"ALTER TABLE reviews ADD COLUMN {column} INTEGER")
+
+    # Per-day aggregates for time-series charts, maintained by update_rollups
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS reviews_daily (
+        day DATE PRIMARY KEY,
+        reviews INTEGER NOT NULL,
+        stars_sum INTEGER NOT NULL,
+        recommended INTEGER NOT NULL
     )
     """)
 
+    init_search_index(conn)
+    init_browse_indexes(conn)
+    init_minhash_tables(conn)
+
     conn.commit()
     return conn
 
-def organize(dataset_path: str | Path = "../L1/intermediate_dataset", db_path: str | Path = "reviews.db"):
+
+# Columns returned by review listings (everything but the long texts)
+BROWSE_COLUMNS = ("id", "link", "title", "stars", "recommendation", "date_posted", "likes", "comments", "year_usage")
+# Sort orders supported by review listings, each backed by a covering index
+BROWSE_SORT_COLUMNS = ("date_posted", "likes", "comments", "stars")
+
+
+def init_browse_indexes(conn):
+    """Create one covering index per listing sort order.
+
+    Each index is ordered by (sort column, id), matching the listing's ORDER
+    BY and keyset cursor, and carries every other listing column, so a
+    filtered page is answered from the index alone without touching the table.
+    """
+    for sort_col in BROWSE_SORT_COLUMNS:
+        rest = [c for c in BROWSE_COLUMNS if c not in ("id", sort_col)]
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_reviews_browse_{sort_col} ON reviews ({sort_col}, id, {', '.join(rest)})"
+        )
+
+
+# Text columns indexed by the reviews_fts_<n> shards, in index column order
+FTS_COLUMNS = ("title", "review_descr", "review_plus", "review_minus")
+# Shard n indexes ids n * FTS_SHARD_ROWS + 1 to (n + 1) * FTS_SHARD_ROWS
+FTS_SHARD_ROWS = 50_000
+
+
+def fts_shards(conn) -> list[int]:
+    """Numbers of the existing full-text shards, ascending."""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'reviews_fts_[0-9]*' "
+        "AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+    )
+    return sorted(int(name.rsplit("_", 1)[1]) for (name,) in rows)
+
+
+def _create_fts_shard(conn, shard: int) -> None:
+    name = f"reviews_fts_{shard}"
+    lo, hi = shard * FTS_SHARD_ROWS + 1, (shard + 1) * FTS_SHARD_ROWS
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    conn.execute(f"""
+    CREATE VIRTUAL TABLE {name} USING fts5(
+        {cols},
+        content='reviews', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    # Titles weigh twice as much as the body texts in bm25 ranking
+    conn.execute(f"INSERT INTO {name} ({name}, rank) VALUES ('rank', 'bm25(2.0, 1.0, 1.0, 1.0)')")
+    # Rows are added by update_search_index; edits and deletes follow by trigger
+    conn.execute(f"""
+    CREATE TRIGGER {name}_ad AFTER DELETE ON reviews WHEN old.id BETWEEN {lo} AND {hi} BEGIN
+        INSERT INTO {name} ({name}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER {name}_au AFTER UPDATE OF {cols} ON reviews WHEN old.id BETWEEN {lo} AND {hi} BEGIN
+        INSERT INTO {name} ({name}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        INSERT INTO {name} (rowid, {cols}) VALUES (new.id, {new_cols});
+    END
+    """)
+
+
+def init_search_index(conn):
+    """Create the full-text index over the review texts.
+
+    The index is split by id range into FTS5 shards (reviews_fts_<n>, see
+    FTS_SHARD_ROWS), so a search ranks matches of one shard at a time:
+    FTS5's bm25 reads every match of a query term once per query, and that
+    read grows with the table (see Server/reviews.py). Shards are
+    external-content tables; update_search_index adds new reviews to them.
+    unicode61 with remove_diacritics folds case and ё/е for Cyrillic; Russian
+    inflection is handled at query time by stemming terms into prefix queries.
+    Returns False when SQLite lacks FTS5.
+    """
+    cur = conn.cursor()
+    if cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'reviews_fts'").fetchone():
+        # Single-table index of older DBs, replaced by shards
+        for trigger in ("ai", "ad", "au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS reviews_fts_{trigger}")
+        cur.execute("DROP TABLE reviews_fts")
+    elif fts_shards(conn):
+        return True
+    try:
+        _create_fts_shard(conn, 0)
+    except sqlite3.OperationalError as e:
+        print(f"[organize] full-text index unavailable: {e}")
+        return False
+    # Index rows of DBs organized before the shards existed
+    update_search_index(conn)
+    return True
+
+
+def update_search_index(conn, since_id=0):
+    """Add reviews with id > since_id to their full-text shards."""
+    top = conn.execute("SELECT MAX(id) FROM reviews").fetchone()[0]
+    existing = fts_shards(conn)
+    if top is None or top <= since_id or not existing:
+        return
+    cols = ", ".join(FTS_COLUMNS)
+    for shard in range(since_id // FTS_SHARD_ROWS, (top - 1) // FTS_SHARD_ROWS + 1):
+        if shard not in existing:
+            _create_fts_shard(conn, shard)
+        conn.execute(
+            f"INSERT INTO reviews_fts_{shard} (rowid, {cols}) SELECT id, {cols} FROM reviews WHERE id > ? AND id BETWEEN ? AND ?",
+            (since_id, shard * FTS_SHARD_ROWS + 1, (shard + 1) * FTS_SHARD_ROWS),
+        )
+
+
+def update_rollups(conn, since_id=0):
+    """Add reviews with id > since_id to the reviews_daily rollup."""
+    conn.execute(
+        """
+        INSERT INTO reviews_daily (day, reviews, stars_sum, recommended)
+        SELECT date_posted, COUNT(*), SUM(stars), SUM(recommendation)
+        FROM reviews WHERE id > ? GROUP BY date_posted
+        ON CONFLICT(day) DO UPDATE SET
+            reviews = reviews + excluded.reviews,
+            stars_sum = stars_sum + excluded.stars_sum,
+            recommended = recommended + excluded.recommended
+        """,
+        (since_id,),
+    )
+
+def update_text_summaries(db_path, conn, batch_rows=TFIDF_SHARD_ROWS):
+    """Add new reviews to the sketches and the TF-IDF index, lemmatizing each review once.
+
+    Each gets the reviews past its own last id, so one that is behind (or was
+    removed) catches up from the same batches.
+    """
+    sketches = CorpusSketches(sketch_path(db_path))
+    index = TfidfIndex(tfidf_index_dir(db_path))
+    text_columns = tuple(dict.fromkeys(SKETCH_TEXT_COLUMNS + TFIDF_TEXT_COLUMNS))
+    available = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+    columns = ("id", *text_columns, *(c for c in SKETCH_NUMERIC_COLUMNS if c in available))
+    with sketches.updating(), index.updating():
+        cur = conn.execute(
+            f"SELECT {', '.join(columns)} FROM reviews WHERE id > ? ORDER BY id",
+            (min(sketches.last_id, index.last_id),),
+        )
+        added = 0
+        while True:
+            rows = [dict(zip(columns, row)) for row in cur.fetchmany(batch_rows)]
+            if not rows:
+                break
+            lemmas = [{column: lemmatize(row[column]) for column in text_columns} for row in rows]
+            new = [i for i, row in enumerate(rows) if row["id"] > sketches.last_id]
+            if new:
+                sketches.add([rows[i] for i in new], [lemmas[i] for i in new])
+            new = [i for i, row in enumerate(rows) if row["id"] > index.last_id]
+            if new:
+                index.add_shard([rows[i]["id"] for i in new], [lemmas[i] for i in new])
+            added += len(rows)
+    if added:
+        print(f"[organize] lemmatized {added} reviews for the sketches and the TF-IDF index")
+
+
+REVIEW_COLUMNS = (
+    "link", "title", "stars", "review_plus", "review_minus", "review_descr",
+    "year_usage", "recommendation", "time_usage", "price", "date_posted", "likes", "comments",
+)
+
+
+def review_to_row(review):
+    """Convert a scraped review dict into a tuple ordered as REVIEW_COLUMNS."""
+    return (
+        review["link"],
+        review["title"],
+        int(review["stars"]),
+        convert_null(review["review_plus"]),
+        convert_null(review["review_minus"]),
+        convert_null(review["review_descr"]),
+        convert_year(review["year_usage"]),
+        convert_bool(review["recommendation"]),
+        convert_null(review["time_usage"]),
+        convert_null(review["price"]),
+        parse_date(review["date_posted"]),
+        int(review["likes"]),
+        int(review["comments"]),
+    )
+
+
+def organize(
+    dataset_path: str | Path = _L2_DIR.parent / "L1" / "intermediate_dataset",
+    db_path: str | Path = _L2_DIR / "reviews.db",
+    parquet_dir: str | Path | None = None,
+    write_sqlite: bool = True,
+    incremental: bool = False,
+):
+    """Build the reviews dataset from the intermediate JSON files.
+
+    Writes the SQLite DB at db_path and, when parquet_dir is given, a
+    partitioned Parquet export (see L2/parquet_export.py). With
+    write_sqlite=False only the Parquet export is produced.
+    With incremental=True an existing DB is kept and only reviews whose link
+    is not in it yet are added; derived tables are updated for those rows.
+    The defaults are the repo's L1/intermediate_dataset and L2/reviews.db,
+    whatever the working directory.
+    """
     dataset_path = Path(dataset_path)
+
+    # Read and process JSON files
+    data = read_json_files(dataset_path)
+    rows = [review_to_row(review) for review in data]
+
+    tmp_dir = None
+    if not write_sqlite:
+        # Parquet only: build the DB (with every derived column) in a scratch dir
+        tmp_dir = tempfile.mkdtemp(prefix="organize_")
+        db_path = os.path.join(tmp_dir, "reviews.db")
+        incremental = False
+
     db_path = str(db_path)
-    if os.path.exists(db_path):
+    if os.path.exists(db_path) and not incremental:
         os.remove(db_path)
+        # Review ids restart with the new DB, so its TF-IDF index and sketches are stale
+        shutil.rmtree(tfidf_index_dir(db_path), ignore_errors=True)
+        sketch_path(db_path).unlink(missing_ok=True)
 
     # Initialize database
     conn = init_database(db_path)
     cur = conn.cursor()
-
-    # Read and process JSON files
-    data = read_json_files(dataset_path)
+    # AUTOINCREMENT ids only grow, so rows added by this run have id > last_id
+    last_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0]
 
     # Insert data into database
-    for review in data:
-        cur.execute(
-            """
-            INSERT INTO reviews (
-                link, title, stars, review_plus, review_minus, review_descr,
-                year_usage, recommendation, time_usage, price, date_posted, likes, comments
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                review["link"],
-                review["title"],
-                int(review["stars"]),
-                convert_null(review["review_plus"]),
-                convert_null(review["review_minus"]),
-                convert_null(review["review_descr"]),
-                convert_year(review["year_usage"]),
-                convert_bool(review["recommendation"]),
-                convert_null(review["time_usage"]),
-                convert_null(review["price"]),
-                parse_date(review["date_posted"]),
-                int(review["likes"]),
-                int(review["comments"]),
-            ),
-        )
+    cur.executemany(
+        f"""
+        INSERT OR IGNORE INTO reviews ({", ".join(REVIEW_COLUMNS)})
+        VALUES ({", ".join("?" for _ in REVIEW_COLUMNS)})
+        """,
+        rows,
+    )
+    update_rollups(conn, last_id)
+    update_search_index(conn, last_id)
+    update_token_counts(conn, last_id)
+    update_duplicates(conn)
 
     conn.commit()
+    if write_sqlite:
+        # Summarize and index the reviews added by this run (id > last done id),
+        # so chart requests only read the sketches and the TF-IDF index
+        update_text_summaries(db_path, conn)
     conn.close()
 
+    try:
+        if parquet_dir is not None:
+            from L2.parquet_export import export_parquet_from_db
+
+            export_parquet_from_db(db_path, parquet_dir)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
 if __name__ == "__main__":
     organize()
\ No newline at end of file
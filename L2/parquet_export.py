@@ -0,0 +1,101 @@
+"""Columnar Parquet export of the reviews dataset.
+
+The dataset is written hive-partitioned by the year of `date_posted` and by
+`stars` (<dir>/year=2023/stars=5/...parquet), so loaders can skip whole
+partitions and read only the columns they need instead of materializing
+every text column through sqlite3.
+"""
+import shutil
+import sqlite3
+from pathlib import Path
+
+import polars as pl
+
+REVIEW_SCHEMA = {
+    "id": pl.Int64,
+    "link": pl.String,
+    "title": pl.String,
+    "stars": pl.Int64,
+    "review_plus": pl.String,
+    "review_minus": pl.String,
+    "review_descr": pl.String,
+    "year_usage": pl.Int64,
+    "recommendation": pl.Boolean,
+    "time_usage": pl.String,
+    "price": pl.String,
+    "date_posted": pl.String,
+    "likes": pl.Int64,
+    "comments": pl.Int64,
+    "title_tokens": pl.Int64,
+    "review_descr_tokens": pl.Int64,
+    "dup_cluster": pl.Int64,
+}
+
+PARTITION_BY = ("year", "stars")
+
+
+def reviews_frame_from_db(db_path) -> pl.DataFrame:
+    """Read the reviews table of an organized SQLite DB into a polars frame."""
+    conn = sqlite3.connect(str(db_path))
+    try:
+        cur = conn.execute(f"SELECT {', '.join(REVIEW_SCHEMA)} FROM reviews")
+        return pl.DataFrame(cur.fetchall(), schema=REVIEW_SCHEMA, orient="row")
+    finally:
+        conn.close()
+
+
+def export_parquet(df: pl.DataFrame, out_dir, partition_by=PARTITION_BY) -> Path:
+    """Write reviews as a partitioned Parquet dataset, replacing out_dir."""
+    out_dir = Path(out_dir)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    df = df.with_columns(pl.col("date_posted").str.to_date("%Y-%m-%d"))
+    df = df.with_columns(pl.col("date_posted").dt.year().alias("year"))
+    df.write_parquet(out_dir, partition_by=list(partition_by), mkdir=True)
+    return out_dir
+
+
+def export_parquet_from_db(db_path, out_dir, partition_by=PARTITION_BY) -> Path:
+    """Export an existing reviews DB to Parquet."""
+    return export_parquet(reviews_frame_from_db(db_path), out_dir, partition_by)
+
+
+def scan_reviews(parquet_dir) -> pl.LazyFrame:
+    return pl.scan_parquet(Path(parquet_dir) / "**" / "*.parquet", hive_partitioning=True)
+
+
+def load_reviews(parquet_dir, columns=None, filters=None, engine="polars", to_pandas=False):
+    """Load reviews from a Parquet export reading only what is needed.
+
+    columns: list of columns to read (all when None).
+    filters: {column: value or list of values}, pushed down to the scan so
+        that partitions on `year`/`stars` are pruned without being opened.
+    engine: "polars" or "duckdb".
+    Returns a polars DataFrame, or a pandas one when to_pandas is set.
+    """
+    filters = filters or {}
+    if engine == "duckdb":
+        import duckdb
+
+        pattern = str(Path(parquet_dir) / "**" / "*.parquet")
+        select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+        clauses, params = [], []
+        for col, value in filters.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f'"{col}" IN ({", ".join("?" for _ in values)})')
+            params.extend(values)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rel = duckdb.execute(
+            f"SELECT {select} FROM read_parquet(?, hive_partitioning = true){where}",
+            [pattern, *params],
+        )
+        return rel.df() if to_pandas else rel.pl()
+
+    lf = scan_reviews(parquet_dir)
+    for col, value in filters.items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        lf = lf.filter(pl.col(col).is_in(values))
+    if columns:
+        lf = lf.select(columns)
+    df = lf.collect()
+    return df.to_pandas() if to_pandas else df
@@ -0,0 +1,277 @@
+"""Streaming sketches of the review corpus for approximate charts.
+
+Exact word frequencies lemmatize every review on each request, and exact
+histograms scan the whole table. The sketches summarize the corpus once, in
+a few hundred KB, and are updated with only the reviews added since (like
+the TF-IDF index, by review id), so approximate charts cost the same
+whatever the corpus size:
+
+- FrequentItems: top lemmas of review_descr and title. The mergeable form
+  of Misra-Gries (the dual of Space-Saving): a batch of counts is added,
+  then every counter is lowered by the (capacity + 1)-th largest so that at
+  most capacity remain. A term's true count lies in [count, count + error],
+  with error <= total / (capacity + 1).
+- KLL: distributions of the numeric columns and token counts. Items are
+  kept in levels of compactors; an overflowing level is sorted and every
+  other item (random offset) moves up a level with twice the weight. The
+  rank of any value is off by at most KLL.eps * n with 99% probability.
+
+Layout: one JSON file next to the DB (see sketch_path), replaced atomically,
+holding the last summarized id and every sketch. Updates hold an flock on
+reviews.sketches.lock, so uvicorn workers and organize runs summarize the
+new reviews one at a time, each starting from the file the last one saved.
+
+Build or refresh the sketches ahead of time (and compare them with the
+exact values) with:
+    python -m L2.sketches --db reviews.db
+"""
+import fcntl
+import heapq
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from L2.lemmas import lemmatize
+
+TEXT_COLUMNS = ("review_descr", "title")
+NUMERIC_COLUMNS = ("stars", "likes", "comments", "year_usage", "review_descr_tokens", "title_tokens")
+TOP_CAPACITY = 2000
+KLL_K = 200
+BATCH_ROWS = 5000
+
+_update_lock = threading.Lock()
+
+
+def sketch_path(db_path) -> Path:
+    """reviews.db -> reviews.sketches.json"""
+    return Path(db_path).with_suffix(".sketches.json")
+
+
+class FrequentItems:
+    def __init__(self, capacity: int = TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        # Total decrement so far: the most any count is below the true one
+        self.error = 0
+        self.total = 0
+
+    def update(self, batch: Counter) -> None:
+        counts = self.counts
+        for item, weight in batch.items():
+            counts[item] = counts.get(item, 0) + weight
+        self.total += sum(batch.values())
+        if len(counts) > self.capacity:
+            cut = heapq.nlargest(self.capacity + 1, counts.values())[-1]
+            self.counts = {item: count - cut for item, count in counts.items() if count > cut}
+            self.error += cut
+
+    def top(self, n: int) -> list[tuple[str, int]]:
+        """The n largest (item, lower-bound count) pairs."""
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+    def to_json(self) -> dict:
+        return {"capacity": self.capacity, "counts": self.counts, "error": self.error, "total": self.total}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FrequentItems":
+        sketch = cls(data["capacity"])
+        sketch.counts, sketch.error, sketch.total = data["counts"], data["error"], data["total"]
+        return sketch
+
+
+class KLL:
+    def __init__(self, k: int = KLL_K, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: list[list] = [[]]
+        self.min = self.max = None
+        self._rng = random.Random(seed)
+
+    @property
+    def eps(self) -> float:
+        """Normalized rank error of a bin count (two ranks), 99% confidence."""
+        # Empirical constants of the Apache DataSketches KLL sketch (PMF)
+        return 2.446 / self.k**0.9433
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def update(self, values: list) -> None:
+        if not values:
+            return
+        self.n += len(values)
+        low, high = min(values), max(values)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0].extend(values)
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # An odd item out stays behind
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[self._rng.getrandbits(1) :: 2])
+            self.levels[level] = keep
+            # A new top level lowers the capacity of every level below it
+            level = 0
+
+    def distribution(self) -> tuple[list, list[int]]:
+        """Distinct retained values and their estimated counts, ascending.
+
+        When compaction dropped the exact minimum (maximum), the weight of the
+        lowest (highest) retained value, which stands for the smallest
+        (largest) items, moves to it, so bins span the real value range
+        without an empty bar at either end.
+        """
+        weights = Counter()
+        for level, items in enumerate(self.levels):
+            for value in items:
+                weights[value] += 1 << level
+        values = sorted(weights)
+        if values and values[0] != self.min:
+            weights[self.min] = weights.pop(values[0])
+            values[0] = self.min
+        if len(values) > 1 and values[-1] != self.max:
+            weights[self.max] = weights.pop(values[-1])
+            values[-1] = self.max
+        return values, [weights[v] for v in values]
+
+    def to_json(self) -> dict:
+        return {"k": self.k, "n": self.n, "levels": self.levels, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "KLL":
+        sketch = cls(data["k"])
+        sketch.n, sketch.levels, sketch.min, sketch.max = data["n"], data["levels"], data["min"], data["max"]
+        return sketch
+
+
+class CorpusSketches:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._load()
+
+    def _load(self):
+        self.last_id = 0
+        self.terms = {column: FrequentItems() for column in TEXT_COLUMNS}
+        self.numeric = {column: KLL() for column in NUMERIC_COLUMNS}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.last_id = data["last_id"]
+            self.terms = {column: FrequentItems.from_json(s) for column, s in data["terms"].items()}
+            self.numeric = {column: KLL.from_json(s) for column, s in data["numeric"].items()}
+
+    @contextmanager
+    def updating(self):
+        """Hold the update locks on the freshly reloaded sketches; save them on exit if they grew."""
+        # The thread lock orders this process's requests, the flock the other workers
+        with _update_lock, open(self.path.with_suffix(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another request may have updated the sketches since they were opened
+            self._load()
+            last_id = self.last_id
+            yield self
+            if self.last_id != last_id:
+                self._save()
+
+    def add(self, rows: list[dict], lemmas: list[dict]) -> None:
+        """Summarize reviews (column -> value dicts, by id) given the lemmas of their text columns."""
+        for column in TEXT_COLUMNS:
+            self.terms[column].update(Counter(lemma for review in lemmas for lemma in review[column]))
+        for column in NUMERIC_COLUMNS:
+            self.numeric[column].update([row[column] for row in rows if row.get(column) is not None])
+        self.last_id = rows[-1]["id"]
+
+    def update(self, conn, batch_rows: int = BATCH_ROWS) -> int:
+        """Summarize reviews added since the last update. Returns how many."""
+        with self.updating():
+            available = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+            columns = ("id", *TEXT_COLUMNS, *(c for c in NUMERIC_COLUMNS if c in available))
+            cur = conn.execute(f"SELECT {', '.join(columns)} FROM reviews WHERE id > ? ORDER BY id", (self.last_id,))
+            added = 0
+            while True:
+                rows = [dict(zip(columns, row)) for row in cur.fetchmany(batch_rows)]
+                if not rows:
+                    break
+                self.add(rows, [{column: lemmatize(row[column]) for column in TEXT_COLUMNS} for row in rows])
+                added += len(rows)
+            if added:
+                print(f"[sketches] summarized {added} reviews up to id {self.last_id}")
+            return added
+
+    def _save(self):
+        data = {
+            "last_id": self.last_id,
+            "terms": {column: s.to_json() for column, s in self.terms.items()},
+            "numeric": {column: s.to_json() for column, s in self.numeric.items()},
+        }
+        fd, tmp = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def open_sketches(db_path, conn=None) -> CorpusSketches:
+    """Open the sketches of db_path, summarizing reviews added since their last update."""
+    sketches = CorpusSketches(sketch_path(db_path))
+    if conn is not None:
+        sketches.update(conn)
+    return sketches
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+    import time
+
+    parser = argparse.ArgumentParser(description="Build or update the sketches of a reviews DB and check them")
+    parser.add_argument("--db", default="reviews.db")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    started = time.perf_counter()
+    sketches = open_sketches(args.db, conn)
+    print(f"sketches up to date in {time.perf_counter() - started:.2f}s, {sketch_path(args.db).stat().st_size / 1024:.0f} KiB")
+
+    for column, sketch in sketches.numeric.items():
+        if not sketch.n:
+            continue
+        exact = dict(conn.execute(f"SELECT {column}, COUNT(*) FROM reviews WHERE {column} IS NOT NULL GROUP BY {column}").fetchall())
+        values, counts = sketch.distribution()
+        # Worst rank error over the retained values
+        worst = seen_exact = seen_approx = 0
+        for value in sorted(set(exact) | set(values)):
+            seen_exact += exact.get(value, 0)
+            seen_approx += counts[values.index(value)] if value in values else 0
+            worst = max(worst, abs(seen_exact - seen_approx))
+        print(f"{column:>20}: n={sketch.n}, max rank error {worst} ({worst / sketch.n:.2%}), bound {sketch.eps:.2%}")
+
+    for column, sketch in sketches.terms.items():
+        exact = Counter()
+        for (text,) in conn.execute(f"SELECT {column} FROM reviews WHERE {column} IS NOT NULL"):
+            exact.update(lemmatize(text))
+        top = sketch.top(args.top)
+        missed = len({t for t, _ in exact.most_common(args.top)} - {t for t, _ in top})
+        worst = max((exact[t] - c for t, c in top), default=0)
+        print(f"{column:>20}: top {args.top} terms, {missed} missed, max undercount {worst}, bound {sketch.error} of {sketch.total}")
+    conn.close()
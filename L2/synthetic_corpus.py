@@ -0,0 +1,127 @@
+"""Synthetic review corpora for benchmarks.
+
+Reviews are generated in the intermediate JSON format written by the spider
+(string fields, Russian dates such as "12 мая 2021"), so they go through the
+same conversion as real data before landing in the schema of init_database.
+
+Generate corpora from the command line (fully offline):
+    python -m L2.synthetic_corpus --reviews 100000 --db reviews.db --json-dir intermediate
+"""
+import json
+import random
+from pathlib import Path
+
+from L2.organize_dataset import REVIEW_COLUMNS, init_database, review_to_row, update_rollups, update_search_index
+from L2.minhash import update_duplicates
+from L2.tokens import update_token_counts
+
+_WORDS = (
+    "магазин заказ доставка товар качество размер цена продавец пункт выдачи "
+    "курьер возврат деньги приложение сайт покупка упаковка срок отзыв платье "
+    "куртка обувь кроссовки брак подделка скидка акция карта оплата поддержка "
+    "оператор сотрудник очередь примерка хороший плохой быстрый долгий дешевый "
+    "дорогой удобный ужасный отличный нормальный вежливый грубый новый старый "
+    "пришел получил заказала вернули обманули рекомендую советую доволен "
+    "недовольна очень всегда никогда снова опять вообще просто действительно "
+    "который этот свой весь один такой другой можно нужно было будет"
+).split()
+
+_MONTHS = ("января", "февраля", "марта", "апреля", "мая", "июня",
+           "июля", "августа", "сентября", "октября", "ноября", "декабря")
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    # Zipf-like word choice gives a realistic long-tailed vocabulary
+    words = rng.choices(_WORDS, weights=[1 / (i + 1) for i in range(len(_WORDS))], k=n_words)
+    sentences, i = [], 0
+    while i < len(words):
+        step = rng.randint(5, 15)
+        sentence = " ".join(words[i:i + step])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        i += step
+    return " ".join(sentences)
+
+
+def generate_review(rng: random.Random) -> dict:
+    """One review dict shaped like the spider's JSON output."""
+    stars = rng.choices([1, 2, 3, 4, 5], weights=[30, 8, 10, 17, 35])[0]
+    # otzovik descriptions are a few hundred words with a long tail
+    descr_words = max(5, int(rng.lognormvariate(5.0, 0.7)))
+    return {
+        "title": _text(rng, rng.randint(2, 8)).rstrip("."),
+        "stars": str(stars),
+        "review_plus": _text(rng, rng.randint(1, 12)) if rng.random() < 0.9 else "",
+        "review_minus": _text(rng, rng.randint(1, 12)) if rng.random() < 0.9 else "",
+        "review_descr": _text(rng, descr_words),
+        "year_usage": str(rng.randint(2015, 2025)) if rng.random() < 0.6 else "",
+        "recommendation": "ДА" if stars >= 4 or rng.random() < 0.1 else "НЕТ",
+        "time_usage": rng.choice(["", "несколько месяцев", "1 год", "более 3 лет"]),
+        "price": rng.choice(["", "500 руб.", "1500 руб.", "бесплатно"]),
+        "date_posted": f"{rng.randint(1, 28)} {rng.choice(_MONTHS)} {rng.randint(2015, 2025)}",
+        "likes": str(int(rng.paretovariate(1.5)) - 1),
+        "comments": str(int(rng.paretovariate(2.0)) - 1),
+    }
+
+
+def generate_reviews(n: int, seed: int = 0):
+    """Yield n reviews with their otzovik links, deterministically for a seed."""
+    rng = random.Random(seed)
+    for i in range(n):
+        review = generate_review(rng)
+        review["link"] = f"https://otzovik.com/review_{seed}_{i}.html"
+        yield review
+
+
+def write_db(db_path, n: int, seed: int = 0, batch_size: int = 10000) -> Path:
+    """Create (or replace) a reviews DB with n synthetic reviews."""
+    db_path = Path(db_path)
+    if db_path.exists():
+        db_path.unlink()
+    conn = init_database(str(db_path))
+    insert = (
+        f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in REVIEW_COLUMNS)})"
+    )
+    batch = []
+    for review in generate_reviews(n, seed):
+        batch.append(review_to_row(review))
+        if len(batch) >= batch_size:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+    update_rollups(conn)
+    update_search_index(conn)
+    update_token_counts(conn)
+    update_duplicates(conn)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def write_json_dir(directory, n: int, seed: int = 0) -> Path:
+    """Write n synthetic reviews as the spider's <review_id>.json files."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for review in generate_reviews(n, seed):
+        # organize derives the link from the file name, the spider does not store it
+        review_id = review.pop("link").rsplit("/", 1)[1].removesuffix(".html")
+        (directory / f"{review_id}.json").write_text(json.dumps(review, ensure_ascii=False, indent=2), encoding="utf-8")
+    return directory
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic review corpus")
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default=None, help="Write a reviews DB here")
+    parser.add_argument("--json-dir", default=None, help="Write intermediate JSON files into this directory")
+    args = parser.parse_args()
+    if args.db is None and args.json_dir is None:
+        parser.error("give --db and/or --json-dir")
+    if args.db is not None:
+        print(f"wrote {write_db(args.db, args.reviews, args.seed)}")
+    if args.json_dir is not None:
+        print(f"wrote {args.reviews} reviews into {write_json_dir(args.json_dir, args.reviews, args.seed)}")
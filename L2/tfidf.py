@@ -0,0 +1,265 @@
+"""Incremental TF-IDF index over the lemmatized review corpus.
+
+Every review (title, pros, cons and description) is lemmatized once with
+L2/lemmas.py and stored as a row of raw term counts in a sparse CSR shard.
+Later runs only process reviews with a larger id than the last indexed one
+and append a new shard, growing the vocabulary and the document frequencies
+as they go. Queries never refit anything: they memory-map the shards, sum the
+rows of the selected reviews one shard at a time and weight the sum with
+scikit-learn's TfidfTransformer using the persisted document frequencies, so
+memory stays bounded by one shard plus the vocabulary.
+
+Index layout (a directory next to the DB, see index_dir):
+- meta.json: last indexed id, number of documents, vocabulary size, shards
+- vocab.txt: one term per line, line number = column
+- df-<n_docs>.npy: document frequency per column
+- shard-<first id>/: ids.npy, data.npy, indices.npy, indptr.npy (CSR counts)
+meta.json is replaced last, so an interrupted update leaves the previous
+state readable and its leftovers are removed by the next update. Updates
+hold an flock on reviews.tfidf.lock (next to the directory), so only one
+process at a time writes shards or removes leftovers.
+
+Build or refresh an index ahead of time with:
+    python L2/tfidf.py --db reviews.db
+"""
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfTransformer
+
+from L2.lemmas import lemmatize
+
+TEXT_COLUMNS = ("title", "review_plus", "review_minus", "review_descr")
+SHARD_ROWS = 20000
+# Terms seen in fewer reviews are typos and names rather than topics
+MIN_DF = 3
+
+_update_lock = threading.Lock()
+
+
+def index_dir(db_path) -> Path:
+    """reviews.db -> reviews.tfidf"""
+    return Path(db_path).with_suffix(".tfidf")
+
+
+def _write_atomic(path: Path, write):
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        write(Path(tmp))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class TfidfIndex:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._load()
+
+    def _load(self):
+        self.last_id = 0
+        self.n_docs = 0
+        self.shards: list[str] = []
+        self.vocab: list[str] = []
+        self.df = np.zeros(0, dtype=np.int64)
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            self.last_id = meta["last_id"]
+            self.n_docs = meta["n_docs"]
+            self.shards = meta["shards"]
+            with open(self.path / "vocab.txt", encoding="utf-8") as f:
+                self.vocab = [line.rstrip("\n") for _, line in zip(range(meta["vocab_size"]), f)]
+            if self.n_docs:
+                self.df = np.load(self.path / f"df-{self.n_docs}.npy")
+        self._columns = {term: i for i, term in enumerate(self.vocab)}
+
+    @contextmanager
+    def updating(self):
+        """Hold the update locks on the freshly reloaded index."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        # The thread lock orders this process's requests, the flock the other workers
+        with _update_lock, open(self.path.with_suffix(".tfidf.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another request may have updated the index since it was opened
+            self._load()
+            self._remove_leftovers()
+            yield self
+
+    def update(self, conn, shard_rows: int = SHARD_ROWS) -> int:
+        """Index reviews added since the last update. Returns how many."""
+        with self.updating():
+            cur = conn.execute(
+                f"SELECT id, {', '.join(TEXT_COLUMNS)} FROM reviews WHERE id > ? ORDER BY id",
+                (self.last_id,),
+            )
+            added = 0
+            while True:
+                rows = cur.fetchmany(shard_rows)
+                if not rows:
+                    break
+                self.add_shard([row[0] for row in rows], [dict(zip(TEXT_COLUMNS, map(lemmatize, row[1:]))) for row in rows])
+                added += len(rows)
+            if added:
+                print(f"[tfidf] indexed {added} reviews, {self.n_docs} total, {len(self.vocab)} terms")
+            return added
+
+    def add_shard(self, ids: list[int], lemmas: list[dict]) -> None:
+        """Append a shard of reviews (by id) given the lemmas of their text columns."""
+        ids = np.asarray(ids, dtype=np.int64)
+        indptr = [0]
+        indices, data = [], []
+        for review in lemmas:
+            counts = Counter()
+            for field in TEXT_COLUMNS:
+                for lemma in review[field]:
+                    column = self._columns.get(lemma)
+                    if column is None:
+                        column = self._columns[lemma] = len(self.vocab)
+                        self.vocab.append(lemma)
+                    counts[column] += 1
+            for column in sorted(counts):
+                indices.append(column)
+                data.append(counts[column])
+            indptr.append(len(indices))
+        indices = np.asarray(indices, dtype=np.int32)
+
+        name = f"shard-{int(ids[0])}"
+        shard = self.path / name
+        shard.mkdir()
+        np.save(shard / "ids.npy", ids)
+        np.save(shard / "data.npy", np.asarray(data, dtype=np.int32))
+        np.save(shard / "indices.npy", indices)
+        np.save(shard / "indptr.npy", np.asarray(indptr, dtype=np.int32))
+
+        df = np.zeros(len(self.vocab), dtype=np.int64)
+        df[:len(self.df)] = self.df
+        # each column appears at most once per row
+        df += np.bincount(indices, minlength=len(self.vocab))
+        old_df = self.path / f"df-{self.n_docs}.npy"
+        self.df = df
+        self.n_docs += len(ids)
+        self.last_id = int(ids[-1])
+        self.shards.append(name)
+
+        np.save(self.path / f"df-{self.n_docs}.npy", df)
+        _write_atomic(self.path / "vocab.txt", lambda p: p.write_text("".join(f"{t}\n" for t in self.vocab), encoding="utf-8"))
+        meta = {"last_id": self.last_id, "n_docs": self.n_docs, "vocab_size": len(self.vocab), "shards": self.shards}
+        _write_atomic(self.path / "meta.json", lambda p: p.write_text(json.dumps(meta), encoding="utf-8"))
+        old_df.unlink(missing_ok=True)
+
+    def _remove_leftovers(self):
+        keep = set(self.shards) | {"meta.json", "vocab.txt", f"df-{self.n_docs}.npy"}
+        for entry in self.path.iterdir():
+            if entry.name not in keep:
+                if entry.is_dir():
+                    shutil.rmtree(entry)
+                else:
+                    entry.unlink()
+
+    def _iter_shards(self):
+        n_terms = len(self.vocab)
+        for name in self.shards:
+            shard = self.path / name
+            ids = np.load(shard / "ids.npy", mmap_mode="r")
+            # Older shards have fewer columns; their indices stay valid
+            counts = sparse.csr_matrix(
+                (
+                    np.load(shard / "data.npy", mmap_mode="r"),
+                    np.load(shard / "indices.npy", mmap_mode="r"),
+                    np.load(shard / "indptr.npy", mmap_mode="r"),
+                ),
+                shape=(len(ids), n_terms),
+                copy=False,
+            )
+            yield ids, counts
+
+    def group_counts(self, ids=None) -> np.ndarray:
+        """Summed term counts of the reviews with the given ids (all if None)."""
+        total = np.zeros(len(self.vocab), dtype=np.int64)
+        wanted = None if ids is None else np.unique(np.asarray(ids, dtype=np.int64))
+        for shard_ids, counts in self._iter_shards():
+            if wanted is None:
+                total += np.bincount(counts.indices, weights=counts.data, minlength=len(total)).astype(np.int64)
+                continue
+            rows = np.nonzero(np.isin(shard_ids, wanted, assume_unique=True))[0]
+            if len(rows):
+                total += np.asarray(counts[rows].sum(axis=0)).ravel()
+        return total
+
+    def idf(self) -> np.ndarray:
+        """Smoothed idf, the same formula TfidfTransformer fits."""
+        return np.log((1 + self.n_docs) / (1 + self.df)) + 1
+
+    def distinctive_terms(self, ids=None, top_n: int = 30) -> list[tuple[str, float]]:
+        """Highest TF-IDF terms of the selected reviews taken as one document."""
+        counts = self.group_counts(ids)
+        counts[self.df < MIN_DF] = 0
+        if not counts.any():
+            return []
+        transformer = TfidfTransformer(sublinear_tf=True)
+        transformer.idf_ = self.idf()
+        weights = transformer.transform(sparse.csr_matrix(counts.reshape(1, -1))).toarray().ravel()
+        top = np.argsort(-weights, kind="stable")[:top_n]
+        return [(self.vocab[i], float(weights[i])) for i in top if weights[i] > 0]
+
+
+def select_ids(conn, stars=None, date_from=None, date_to=None):
+    """Ids of reviews matching the filters, None when there are no filters."""
+    clauses, params = [], []
+    if stars:
+        clauses.append(f"stars IN ({', '.join('?' for _ in stars)})")
+        params += list(stars)
+    if date_from:
+        clauses.append("date_posted >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("date_posted <= ?")
+        params.append(date_to)
+    if not clauses:
+        return None
+    cur = conn.execute(f"SELECT id FROM reviews WHERE {' AND '.join(clauses)}", params)
+    return np.fromiter((rid for (rid,) in cur), dtype=np.int64)
+
+
+def open_index(db_path, conn=None) -> TfidfIndex:
+    """Open the index of db_path, indexing reviews added since its last update."""
+    index = TfidfIndex(index_dir(db_path))
+    if conn is not None:
+        index.update(conn)
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+    import time
+
+    parser = argparse.ArgumentParser(description="Build or update the TF-IDF index of a reviews DB")
+    parser.add_argument("--db", default="reviews.db")
+    parser.add_argument("--stars", type=int, nargs="*", help="print distinctive terms of these ratings")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    started = time.perf_counter()
+    index = open_index(args.db, conn)
+    print(f"index up to date in {time.perf_counter() - started:.2f}s: {index.n_docs} reviews, {len(index.vocab)} terms")
+    if args.stars is not None:
+        started = time.perf_counter()
+        terms = index.distinctive_terms(select_ids(conn, stars=args.stars), args.top)
+        print(f"query {time.perf_counter() - started:.3f}s")
+        for term, weight in terms:
+            print(f"{weight:.4f} {term}")
+    conn.close()
@@ -0,0 +1,115 @@
+"""Review tokenization shared by organize and the chart server.
+
+tokenize() is the reference rule: NFC-normalized, lowercased [\\w-]+ runs
+longer than two characters that are not all decimal digits. count_tokens()
+applies the same rule to a whole column at once with polars string
+expressions, which is what organize uses to store per-review token counts.
+
+The Rust regex \\w and \\d that polars uses differ from Python's (combining
+marks, superscript digits), so count_tokens() spells the classes out as
+[\\p{L}\\p{N}_-] and \\p{Nd}, which match Python's \\w and str.isdecimal().
+NFC normalization keeps decomposed letters such as и + breve in one word;
+combining marks with no composed form split words in both.
+
+Run as a script to check count_tokens against tokenize:
+    python L2/tokens.py [--db reviews.db]
+tests/test_tokens.py runs the same comparison under pytest.
+"""
+import re
+import unicodedata
+
+import polars as pl
+
+TOKEN_PATTERN = r"[\w\-]+"
+_TOKEN_RE = re.compile(TOKEN_PATTERN, flags=re.UNICODE)
+# TOKEN_PATTERN with Python's \w spelled out for the Rust regex engine
+VECTOR_TOKEN_PATTERN = r"[\p{L}\p{N}_\-]+"
+
+# Text columns whose token counts are stored as <column>_tokens
+TOKEN_COUNT_COLUMNS = ("title", "review_descr")
+
+
+def tokenize(text: str) -> list[str]:
+    if not text:
+        return []
+    tokens = _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())
+    # simple filter: drop short tokens
+    return [t for t in tokens if len(t) > 2 and not t.isdecimal()]
+
+
+def count_tokens(texts) -> list:
+    """Number of tokenize() tokens of every text; None stays None."""
+    token = pl.element()
+    counts = (
+        pl.Series(texts, dtype=pl.String)
+        .str.normalize("NFC")
+        .str.to_lowercase()
+        .str.extract_all(VECTOR_TOKEN_PATTERN)
+        .list.eval(token.filter((token.str.len_chars() > 2) & ~token.str.contains(r"^\p{Nd}+$")))
+        .list.len()
+    )
+    return counts.to_list()
+
+
+def update_token_counts(conn, since_id=0, batch_size=50000):
+    """Store token counts for reviews with id > since_id or without counts yet."""
+    cur = conn.execute(
+        f"""
+        SELECT id, {", ".join(TOKEN_COUNT_COLUMNS)} FROM reviews
+        WHERE id > ? OR {" OR ".join(f"{c}_tokens IS NULL AND {c} IS NOT NULL" for c in TOKEN_COUNT_COLUMNS)}
+        """,
+        (since_id,),
+    )
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        counts = [count_tokens([row[i + 1] for row in rows]) for i in range(len(TOKEN_COUNT_COLUMNS))]
+        conn.executemany(
+            f"UPDATE reviews SET {', '.join(f'{c}_tokens = ?' for c in TOKEN_COUNT_COLUMNS)} WHERE id = ?",
+            [(*values, review_id) for review_id, *values in zip(ids, *counts)],
+        )
+
+
+def _check(texts) -> int:
+    mismatches = 0
+    for text, n in zip(texts, count_tokens(texts)):
+        expected = None if text is None else len(tokenize(text))
+        if n != expected:
+            mismatches += 1
+            print(f"mismatch: {n} != {expected} for {text[:80]!r}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    parser = argparse.ArgumentParser(description="Check vectorized token counts against tokenize()")
+    parser.add_argument("--db", default=None, help="Also check the counts stored in this reviews DB")
+    args = parser.parse_args()
+
+    from L2.synthetic_corpus import generate_reviews
+
+    texts = [None, "", "123 45 ab", "Привет, мир! ab_c-d тест2 ЁЛКА ёлка", "—-- 2024-й год", "x\ny\tzzz"]
+    for review in generate_reviews(2000):
+        texts += [review["title"], review["review_descr"]]
+    failed = _check(texts)
+
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        for column in TOKEN_COUNT_COLUMNS:
+            for text, stored in conn.execute(f"SELECT {column}, {column}_tokens FROM reviews"):
+                expected = None if text is None else len(tokenize(text))
+                if stored != expected:
+                    failed += 1
+                    print(f"{column}: stored {stored} != {expected} for {text[:80]!r}")
+        conn.close()
+
+    print("ok" if not failed else f"{failed} mismatches")
+    sys.exit(1 if failed else 0)
@@ -7,18 +7,22 @@ app = marimo.App(width="medium")
 @app.cell
 def _():
     import marimo as mo
-    import pandas as pd
-    import sqlite3 as sqll
+    import sys
+    sys.path.append('./')
+    from L2.dataset import load_reviews
     import natasha as nlp
     import numpy as np
     import plotly.express as px
-    return mo, nlp, pd, px, sqll
+    return load_reviews, mo, nlp, px
 
 
 @app.cell
-def _(pd, sqll):
-    con = sqll.connect("L2/reviews.db")
-    df = pd.read_sql_query("SELECT * FROM reviews", con)
+def _(load_reviews):
+    # Only the columns the cells below use, without the review texts
+    df = load_reviews(
+        "L2/reviews.db",
+        columns=["title", "stars", "year_usage", "likes", "comments", "review_descr_tokens"],
+    )
     df
     return (df,)
 
@@ -33,9 +37,10 @@ def _(mo):
 def _(df):
     df_f = df
 
-    df_f["review_descr_token_count"] = df_f["review_descr"].apply(
-        lambda x: len(x.split())
-    )
+    # Token counts are computed once by organize (L2/tokens.py)
+    df_f["review_descr_token_count"] = df_f["review_descr_tokens"]
+    # The outlier cell takes quantiles of stars, which a categorical lacks
+    df_f["stars"] = df_f["stars"].astype(int)
 
     df_f
     return (df_f,)
@@ -122,21 +127,22 @@ def filter_and_sort_custom(df, col, min_v, max_v):
 
 
 @app.cell
-def _(df_f):
+def _():
     def using_biterator():
         import sys
         sys.path.append('./')
         import L4.iter as biter
         lcounts = []
-        bter = biter.bi_directional_iterator(df_f["review_descr_token_count"])
-        while True:
-            try:
-                lcounts.append(next(bter))
-                lcounts.append(bter.prev())
-                next(bter)
-                lcounts.append(next(bter))
-            except:
-                break
+        # Pages through the table instead of indexing the materialized column
+        with biter.bi_directional_cursor("L2/reviews.db", "reviews", "review_descr_tokens") as bter:
+            while True:
+                try:
+                    lcounts.append(next(bter))
+                    lcounts.append(bter.prev())
+                    next(bter)
+                    lcounts.append(next(bter))
+                except StopIteration:
+                    break
         return lcounts
     using_biterator()
     return
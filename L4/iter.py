@@ -1,15 +1,21 @@
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
 class bi_directional_iterator:
     def __init__(self, indexable):
         self.inner = indexable
         self.index = 0
-        
+
     def next(self):
         if self.index >= len(self.inner):
             raise StopIteration
         else:
             self.index += 1
             return self.inner[self.index - 1]
-    
+
     def prev(self):
         if self.index <= 0:
             raise StopIteration
@@ -23,8 +29,212 @@ class bi_directional_iterator:
     def __next__(self):
         return self.next()
 
+
+class bi_directional_cursor:
+    """bi_directional_iterator over the rows of a SQLite table, paged lazily.
+
+    Rows are read in windows of `window` rows ordered by `key` (a unique,
+    non-null column, the rowid alias `id` by default) with keyset queries
+    (key > last key / key < first key), so a window costs the same anywhere
+    in the table. At most keep_behind windows are kept behind the current
+    one and one ahead; the next window is prefetched on a background thread
+    once the cursor is halfway through the last loaded one. Memory stays at
+    a few windows however far the cursor walks in either direction.
+
+    next()/prev() follow bi_directional_iterator: the position lies between
+    rows, next() returns the row after it and prev() the row before it, and
+    both raise StopIteration at the ends. Rows are tuples of `columns`, or
+    the bare value for a single column. seek(key) moves the position before
+    the first row with a key >= key.
+    """
+
+    __slots__ = (
+        "_conn", "_lock", "_select", "_where", "_params", "_key", "_single",
+        "window", "keep_behind", "_windows", "_current", "_offset",
+        "_executor", "_pending", "_pending_after",
+    )
+
+    def __init__(self, database, table: str, columns="*", key: str = "id", where: str | None = None, params=(), window: int = 1000, keep_behind: int = 2):
+        if isinstance(columns, str) and columns != "*":
+            columns = [columns]
+        # The prefetch thread shares the connection; queries are serialized
+        self._conn = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.Lock()
+        column_sql = "*" if columns == "*" else ", ".join(f'"{c}"' for c in columns)
+        self._select = f'SELECT "{key}", {column_sql} FROM "{table}"'
+        self._where = f"({where}) AND " if where else ""
+        self._params = tuple(params)
+        self._key = key
+        self._single = columns != "*" and len(columns) == 1
+        self.window = window
+        self.keep_behind = keep_behind
+        # Loaded windows in key order, each a non-empty list of (key, row)
+        self._windows = deque()
+        self._current = 0
+        self._offset = 0
+        self._executor = None
+        self._pending = None
+        self._pending_after = None
+
+    # --- fetching ---
+    def _fetch(self, op: str | None, bound, descending: bool = False) -> list:
+        condition = f'WHERE {self._where}"{self._key}" {op} ?' if op else f"WHERE {self._where}1"
+        order = "DESC" if descending else "ASC"
+        sql = f'{self._select} {condition} ORDER BY "{self._key}" {order} LIMIT ?'
+        params = (*self._params, bound, self.window) if op else (*self._params, self.window)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if descending:
+            rows.reverse()
+        if self._single:
+            return [(row[0], row[1]) for row in rows]
+        return [(row[0], row[1:]) for row in rows]
+
+    def _fetch_after(self, key) -> list:
+        if self._pending is not None and self._pending_after == key:
+            rows = self._pending.result()
+        else:
+            rows = self._fetch(">", key)
+        self._pending = self._pending_after = None
+        return rows
+
+    def _prefetch(self):
+        last = self._windows[-1]
+        if self._pending is None and len(last) == self.window:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cursor-prefetch")
+            self._pending_after = last[-1][0]
+            self._pending = self._executor.submit(self._fetch, ">", self._pending_after)
+
+    # --- movement ---
+    def next(self):
+        if not self._windows:
+            first = self._fetch(None, None)
+            if not first:
+                raise StopIteration
+            self._windows.append(first)
+            self._current = self._offset = 0
+        if self._offset == len(self._windows[self._current]):
+            if self._current + 1 == len(self._windows):
+                rows = self._fetch_after(self._windows[-1][-1][0])
+                if not rows:
+                    raise StopIteration
+                self._windows.append(rows)
+            self._current += 1
+            self._offset = 0
+            while self._current > self.keep_behind:
+                self._windows.popleft()
+                self._current -= 1
+        window = self._windows[self._current]
+        row = window[self._offset][1]
+        self._offset += 1
+        if self._current + 1 == len(self._windows) and self._offset * 2 >= len(window):
+            self._prefetch()
+        return row
+
+    def prev(self):
+        if not self._windows:
+            raise StopIteration
+        if self._offset == 0:
+            if self._current == 0:
+                rows = self._fetch("<", self._windows[0][0][0], descending=True)
+                if not rows:
+                    raise StopIteration
+                self._windows.appendleft(rows)
+                self._current += 1
+            self._current -= 1
+            self._offset = len(self._windows[self._current])
+            # Keep one window ahead; the prefetch is for the old last window
+            while len(self._windows) - 1 - self._current > 1:
+                self._windows.pop()
+                self._pending = self._pending_after = None
+        self._offset -= 1
+        return self._windows[self._current][self._offset][1]
+
+    def seek(self, key):
+        """Position the cursor before the first row whose key is >= key."""
+        rows = self._fetch(">=", key)
+        self._windows.clear()
+        self._pending = self._pending_after = None
+        self._current = self._offset = 0
+        if rows:
+            self._windows.append(rows)
+        else:
+            # Past the end: only prev() can move, from the last row
+            last = self._fetch("<", key, descending=True)
+            if last:
+                self._windows.append(last)
+                self._offset = len(last)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _walk(bter) -> tuple[int, int]:
+    """The experiments walk (next, back, forward twice, until the end);
+    returns the count and sum of the values read."""
+    count = total = 0
+    while True:
+        try:
+            total += next(bter) + bter.prev()
+            next(bter)
+            total += next(bter)
+            count += 3
+        except StopIteration:
+            return count, total
+
+
 if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+    import time
+    import tracemalloc
+
     a = bi_directional_iterator(range(1,5))
     print(a.next())
     print(a.next())
-    print(a.prev())
\ No newline at end of file
+    print(a.prev())
+
+    # Cursor vs the materialized column on a throwaway table
+    rows = int(os.environ.get("CURSOR_DEMO_ROWS", 1_000_000))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = f"{tmp}/reviews.db"
+        conn = sqlite3.connect(db)
+        conn.execute("CREATE TABLE reviews (id INTEGER PRIMARY KEY, review_descr_tokens INTEGER)")
+        rng = random.Random(0)
+        conn.executemany("INSERT INTO reviews VALUES (?, ?)", ((i, rng.randint(10, 2000)) for i in range(1, rows + 1)))
+        conn.commit()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        column = [value for (value,) in conn.execute("SELECT review_descr_tokens FROM reviews ORDER BY id")]
+        expected = _walk(bi_directional_iterator(column))
+        print(f"list:   {time.perf_counter() - start:.2f}s, peak {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MiB")
+        del column
+        conn.close()
+
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with bi_directional_cursor(db, "reviews", "review_descr_tokens") as cursor:
+            walked = _walk(cursor)
+            cursor.seek(rows // 2)
+            middle = cursor.next()
+        print(f"cursor: {time.perf_counter() - start:.2f}s, peak {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MiB")
+        tracemalloc.stop()
+        print("same walk" if walked == expected else "WALKS DIFFER", f"seek({rows // 2}) -> {middle}")
@@ -0,0 +1,149 @@
+"""Compare the pandas notebook analyses with PR1/queries.py on larger CSVs.
+
+Usage: python -m PR1.bench_queries [--rows 5000,5000000,50000000] [--data-dir /tmp/car_data]
+
+car_data.csv is resampled (with replacement, fixed seed) into CSVs of the
+given row counts, written once into --data-dir. Every run happens in a fresh
+interpreter so ru_maxrss is that run's peak:
+- pandas: the notebook (read_csv, dropna, the filters, groupbys, sorts and
+  the .apply(np.log) column), only when the CSV is smaller than
+  --pandas-max-ratio times the available memory;
+- polars: queries.run_all, one streaming pass from the CSV to a temporary
+  parquet file with the log column, then the analyses over that file;
+- polars (analysed columns): the same with the null check limited to the
+  analysed columns.
+Wherever pandas runs, the polars results are checked against it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import polars as pl
+
+from PR1.queries import CSV_PATH
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_CHILD = r"""
+import json, resource, sys, tempfile, time
+sys.path.insert(0, {root!r})
+kind, csv_path = {args!r}
+start = time.perf_counter()
+if kind == "pandas":
+    import numpy as np
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    df_na = df.dropna()
+    df_f1 = df_na[df_na["Company"] == "Toyota"]
+    df_f1 = df_f1[df_f1["Model"] == "Camry"]
+    camry = df_f1["Annual Income"].mean()
+    top_models = df_na.groupby(["Company", "Model"]).agg({{"Price ($)": "mean"}}).sort_values(by="Price ($)", ascending=False).head(10)
+    body_style = df_na.groupby(["Body Style"]).agg({{"Price ($)": "mean"}})
+    top_income = df_na.sort_values(by="Annual Income", ascending=False).head(10)[["Annual Income", "Company", "Model", "Price ($)"]]
+    bottom_income = df_na.sort_values(by="Annual Income", ascending=True).head(10)[["Annual Income", "Company", "Model", "Price ($)"]]
+    df_f6 = df_na.copy()
+    df_f6["lg Annual Income"] = df_f6.copy()["Annual Income"].apply(lambda x: np.log(x))
+    summary = {{
+        "camry_mean_income": float(camry),
+        "top_models_by_price": sorted(top_models["Price ($)"].round(6).tolist()),
+        "price_by_body_style": body_style["Price ($)"].round(6).sort_index().tolist(),
+        "top_income": sorted(top_income["Annual Income"].tolist()),
+        "bottom_income": sorted(bottom_income["Annual Income"].tolist()),
+        "log_income_sum": round(float(df_f6["lg Annual Income"].sum()), 3),
+    }}
+else:
+    import polars as pl
+    from PR1.queries import ANALYSIS_COLUMNS, run_all
+    null_subset = ANALYSIS_COLUMNS if kind == "polars_columns" else None
+    with tempfile.TemporaryDirectory() as tmp:
+        frames = run_all(csv_path, null_subset, f"{{tmp}}/log.parquet")
+        log_income_sum = pl.scan_parquet(f"{{tmp}}/log.parquet").select(pl.col("lg Annual Income").sum()).collect().item()
+    summary = {{
+        "camry_mean_income": frames["camry_mean_income"].item(),
+        "top_models_by_price": sorted(frames["top_models_by_price"]["Price ($)"].round(6).to_list()),
+        "price_by_body_style": frames["price_by_body_style"]["Price ($)"].round(6).to_list(),
+        "top_income": sorted(frames["top_income"]["Annual Income"].to_list()),
+        "bottom_income": sorted(frames["bottom_income"]["Annual Income"].to_list()),
+        "log_income_sum": round(log_income_sum, 3),
+    }}
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"kind": kind, "seconds": elapsed, "peak_rss_mb": peak, "summary": summary}}))
+"""
+
+
+def make_csv(rows: int, data_dir: Path, seed: int = 0, chunk_rows: int = 1_000_000) -> Path:
+    """car_data.csv resampled to rows rows (the original file for its own size)."""
+    source = pl.read_csv(CSV_PATH)
+    if rows == len(source):
+        return CSV_PATH
+    path = data_dir / f"car_data_{rows}.csv"
+    if path.exists():
+        return path
+    data_dir.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    with open(partial, "wb") as f:
+        for i, start in enumerate(range(0, rows, chunk_rows)):
+            n = min(chunk_rows, rows - start)
+            chunk = source.sample(n, with_replacement=True, seed=seed + i)
+            chunk = chunk.with_columns(pl.int_range(start, start + n).alias(""))
+            chunk.write_csv(f, include_header=i == 0)
+    partial.rename(path)
+    return path
+
+
+def run(kind: str, csv_path: Path) -> dict:
+    code = _CHILD.format(root=str(ROOT), args=(kind, str(csv_path)))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"kind": kind, "error": (out.stderr.strip().splitlines() or [f"exit {out.returncode}"])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _available_bytes() -> int:
+    """MemAvailable: free memory plus the page cache the kernel can drop."""
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="5000,5000000,50000000")
+    parser.add_argument("--data-dir", default="/tmp/car_data")
+    parser.add_argument("--pandas-max-ratio", type=float, default=0.4, help="Skip pandas when the CSV is larger than this share of free memory")
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for rows in (int(r) for r in args.rows.split(",")):
+        csv_path = make_csv(rows, Path(args.data_dir))
+        size = csv_path.stat().st_size
+        print(f"== {rows} rows, {size / 2**20:.0f} MiB CSV")
+        results[rows] = {}
+        kinds = ["polars", "polars_columns"]
+        if size < args.pandas_max_ratio * _available_bytes():
+            kinds.insert(0, "pandas")
+        else:
+            print(f"  {'pandas':>15}: skipped, the CSV is {size / _available_bytes():.1f}x the free memory")
+        for kind in kinds:
+            result = results[rows][kind] = run(kind, csv_path)
+            if "error" in result:
+                print(f"  {kind:>15}: failed: {result['error']}")
+            else:
+                print(f"  {kind:>15}: {result['seconds']:8.2f}s  peak RSS {result['peak_rss_mb']:8.0f} MiB")
+        if "pandas" in results[rows] and "summary" in results[rows]["pandas"] and "summary" in results[rows]["polars"]:
+            same = results[rows]["pandas"]["summary"] == results[rows]["polars"]["summary"]
+            print(f"  polars results {'match' if same else 'DIFFER from'} pandas")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""The PR1/experiments.ipynb analyses of car_data.csv as polars lazy plans.
+
+Usage:
+    python -m PR1.queries [CSV] [--log-income-out car_data_log.parquet]
+
+The CSV is read once, by a streaming pass that drops the null rows, adds the
+notebook's log-income column and writes the result to parquet (the
+notebook's df_f6). Every other notebook step is a function from a LazyFrame
+to a small LazyFrame, run by the streaming engine over that parquet file,
+which reads only the columns the step uses:
+- dropna()                         -> scan(): drop_nulls over all columns
+- .apply(np.log) income column     -> with_log_income (vectorized .log()),
+                                      sink_log_income
+- Toyota Camry mean income         -> camry_mean_income (one combined predicate)
+- top 10 models by mean price      -> top_models_by_price (group_by + top_k)
+- mean price by body style         -> price_by_body_style
+- 10 richest / poorest buyers      -> top_income / bottom_income (top_k /
+                                      bottom_k instead of a full sort)
+
+The analyses are not collected together with pl.collect_all over the CSV:
+the shared scan + drop_nulls subplan is then cached in memory whole, which
+grows with the file. The notebook drops rows with a null in any column;
+scan(null_subset=...) restricts the check to the given columns (a different
+result when other columns have nulls).
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import polars as pl
+
+CSV_PATH = Path(__file__).resolve().parent / "car_data.csv"
+
+INCOME = "Annual Income"
+PRICE = "Price ($)"
+BUYER_COLUMNS = [INCOME, "Company", "Model", PRICE]
+# Columns the analyses read
+ANALYSIS_COLUMNS = [INCOME, PRICE, "Company", "Model", "Body Style"]
+
+
+def scan(path=CSV_PATH, null_subset: list[str] | None = None) -> pl.LazyFrame:
+    """car_data rows without nulls (pandas dropna()); null_subset limits the check."""
+    return pl.scan_csv(path).drop_nulls(null_subset)
+
+
+def camry_mean_income(lf: pl.LazyFrame) -> pl.LazyFrame:
+    return lf.filter((pl.col("Company") == "Toyota") & (pl.col("Model") == "Camry")).select(pl.col(INCOME).mean())
+
+
+def top_models_by_price(lf: pl.LazyFrame, n: int = 10) -> pl.LazyFrame:
+    return lf.group_by("Company", "Model").agg(pl.col(PRICE).mean()).top_k(n, by=PRICE)
+
+
+def price_by_body_style(lf: pl.LazyFrame) -> pl.LazyFrame:
+    return lf.group_by("Body Style").agg(pl.col(PRICE).mean()).sort("Body Style")
+
+
+def top_income(lf: pl.LazyFrame, n: int = 10) -> pl.LazyFrame:
+    return lf.select(BUYER_COLUMNS).top_k(n, by=INCOME)
+
+
+def bottom_income(lf: pl.LazyFrame, n: int = 10) -> pl.LazyFrame:
+    return lf.select(BUYER_COLUMNS).bottom_k(n, by=INCOME)
+
+
+def with_log_income(lf: pl.LazyFrame) -> pl.LazyFrame:
+    return lf.with_columns(pl.col(INCOME).log().alias("lg Annual Income"))
+
+
+ANALYSES = {
+    "camry_mean_income": camry_mean_income,
+    "top_models_by_price": top_models_by_price,
+    "price_by_body_style": price_by_body_style,
+    "top_income": top_income,
+    "bottom_income": bottom_income,
+}
+
+
+def sink_log_income(path, out, null_subset: list[str] | None = None) -> None:
+    """Write the cleaned data with the log-income column to a parquet file,
+    streaming, for inputs too large to return as a DataFrame."""
+    with_log_income(scan(path, null_subset)).sink_parquet(out)
+
+
+def run_all(path=CSV_PATH, null_subset: list[str] | None = None, log_income_out=None) -> dict[str, pl.DataFrame]:
+    """Run every analysis of ANALYSES over the cleaned data, which is written
+    to log_income_out (a temporary file if None) on the way."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out = log_income_out or Path(tmp) / "cleaned.parquet"
+        sink_log_income(path, out, null_subset)
+        cleaned = pl.scan_parquet(out)
+        return {name: analysis(cleaned).collect(engine="streaming") for name, analysis in ANALYSES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv", nargs="?", default=str(CSV_PATH))
+    parser.add_argument("--log-income-out", default=None, help="Also write the data with the log-income column here (parquet)")
+    parser.add_argument("--analysis-columns-only", action="store_true", help="Drop rows with nulls only in the analysed columns")
+    parser.add_argument("--explain", action="store_true", help="Print the optimized plan of the cleaning pass")
+    args = parser.parse_args()
+
+    null_subset = ANALYSIS_COLUMNS if args.analysis_columns_only else None
+    if args.explain:
+        print(with_log_income(scan(args.csv, null_subset)).explain(engine="streaming"))
+    with pl.Config(tbl_rows=20, tbl_cols=-1):
+        for name, frame in run_all(args.csv, null_subset, args.log_income_out).items():
+            print(f"== {name}\n{frame}")
+
+
+if __name__ == "__main__":
+    main()
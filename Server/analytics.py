@@ -0,0 +1,302 @@
+"""Analytical query engines behind the chart endpoints.
+
+Chart queries (numeric histograms, top-N values, token-count distributions and
+time series by date_posted) are pushed down into SQL instead of being
+aggregated row by row in Python. Two engines implement the same interface:
+
+- DuckDBEngine: vectorized; reads reviews.db through DuckDB's SQLite scanner,
+  or a Parquet export (L2/parquet_export.py) directly.
+- SqliteEngine: plain sqlite3, used when duckdb (or its sqlite extension) is
+  unavailable.
+
+open_engine() picks one according to ANALYTICS_ENGINE (auto|duckdb|sqlite).
+With dedupe=True every query sees one review per near-duplicate cluster
+(reviews.dup_cluster, see L2/minhash.py) instead of the whole table.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, Optional
+
+from L2.tokens import tokenize
+
+NUMERIC_COLUMNS = ("stars", "likes", "comments", "year_usage")
+TEXT_COLUMNS = ("review_descr", "title")
+TOP_COLUMNS = ("stars", "likes", "comments", "year_usage", "time_usage", "price", "recommendation")
+GRANULARITIES = ("day", "week", "month")
+# Keeps reviews without duplicates and the representative of each cluster
+DEDUPE_FILTER = "dup_cluster IS NULL OR dup_cluster = id"
+
+# Set once attaching through duckdb failed (e.g. the sqlite extension cannot
+# be downloaded), so that auto mode does not retry on every request.
+_duckdb_sqlite_failed: Optional[str] = None
+
+def _bin_labels(mn, width, mx, bins) -> list[str]:
+    edges = [mn + i * width for i in range(bins)] + [mx]
+    return [f"{round(edges[i],2)}–{round(edges[i+1],2)}" for i in range(bins)]
+
+
+class _Engine:
+    name = "base"
+
+    def __init__(self):
+        self.conn = None
+        # Whether the source has the reviews_daily rollup written by organize
+        self.has_rollup = False
+        # Columns of the reviews table/view
+        self.columns: set[str] = set()
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        return self.conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- queries shared by both engines ---
+    def numeric_histogram(self, column: str, bins: int) -> tuple[list[str], list[int]]:
+        """Equal-width histogram of a numeric column, labelled "lo–hi"."""
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Not a numeric column: {column}")
+        if bins < 1:
+            bins = 10
+        mn, mx, n = self._query(f"SELECT MIN({column}), MAX({column}), COUNT({column}) FROM reviews")[0]
+        if not n:
+            return [], []
+        if mn == mx:
+            return [str(mn)], [n]
+        width = (mx - mn) / bins
+        # Avoid zero width
+        width = width or 1
+        counts = [0] * bins
+        for idx, count in self._query(self._bin_sql(column), (mn, width, bins - 1)):
+            counts[int(idx)] += count
+        return _bin_labels(mn, width, mx, bins), counts
+
+    def top_values(self, column: str, n: int) -> tuple[list[str], list[int]]:
+        """Most common non-null values of a column."""
+        if column not in TOP_COLUMNS:
+            raise ValueError(f"Unsupported column: {column}")
+        rows = self._query(
+            f"SELECT {column}, COUNT(*) AS c FROM reviews WHERE {column} IS NOT NULL "
+            f"GROUP BY {column} ORDER BY c DESC, {column} LIMIT ?",
+            (max(1, n),),
+        )
+        return [str(v) for v, _ in rows], [c for _, c in rows]
+
+    def timeseries(self, granularity: str = "day", start: Optional[str] = None, end: Optional[str] = None) -> list[tuple]:
+        """Rows of (period_start, reviews, avg_stars, recommend_rate) ordered by period.
+
+        Reads the reviews_daily rollup when the source has one (a few hundred
+        rows), otherwise aggregates the reviews table.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        date_col = "day" if self.has_rollup else "date_posted"
+        clauses, params = [], []
+        if start:
+            clauses.append(f"{date_col} >= ?")
+            params.append(start)
+        if end:
+            clauses.append(f"{date_col} <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        period = self._period_sql(granularity, date_col)
+        if self.has_rollup:
+            select = (
+                "SUM(reviews), SUM(stars_sum) * 1.0 / SUM(reviews), SUM(recommended) * 1.0 / SUM(reviews) "
+                "FROM reviews_daily"
+            )
+        else:
+            select = "COUNT(*), AVG(stars), AVG(CAST(recommendation AS DOUBLE)) FROM reviews"
+        return self._query(
+            f"SELECT {period} AS period, {select} {where} GROUP BY period ORDER BY period",
+            tuple(params),
+        )
+
+    def iter_texts(self, text_field: str, batch_size: int = 5000) -> Iterator[str]:
+        if text_field not in TEXT_COLUMNS:
+            raise ValueError(f"Not a text column: {text_field}")
+        cur = self.conn.execute(f"SELECT {text_field} FROM reviews WHERE {text_field} IS NOT NULL")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for (txt,) in rows:
+                yield txt
+
+    def value_counts(self, column: str) -> tuple[list, list[int]]:
+        """Number of reviews per distinct non-null value of a numeric column, ascending."""
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Not a numeric column: {column}")
+        rows = self._query(
+            f"SELECT {column}, COUNT(*) FROM reviews WHERE {column} IS NOT NULL GROUP BY {column} ORDER BY {column}"
+        )
+        return [v for v, _ in rows], [c for _, c in rows]
+
+    def token_count_histogram(self, text_field: str) -> tuple[list[str], list[int]]:
+        """Number of reviews per token count of text_field, ascending."""
+        values, counts = self.token_count_distribution(text_field)
+        return [str(v) for v in values], counts
+
+    def token_count_distribution(self, text_field: str) -> tuple[list[int], list[int]]:
+        """Token counts of text_field and the number of reviews with each, ascending."""
+        if text_field not in TEXT_COLUMNS:
+            raise ValueError(f"Not a text column: {text_field}")
+        count_col = f"{text_field}_tokens"
+        if count_col in self.columns:
+            # Stored by organize (L2/tokens.py)
+            rows = self._query(
+                f"SELECT {count_col}, COUNT(*) FROM reviews WHERE {count_col} IS NOT NULL "
+                f"GROUP BY {count_col} ORDER BY {count_col}"
+            )
+        else:
+            rows = self._scan_token_counts(text_field)
+        return [k for k, _ in rows], [v for _, v in rows]
+
+    # --- engine specific SQL ---
+    def _bin_sql(self, column: str) -> str:
+        raise NotImplementedError
+
+    def _period_sql(self, granularity: str, column: str) -> str:
+        raise NotImplementedError
+
+    def _scan_token_counts(self, text_field: str) -> list[tuple[int, int]]:
+        raise NotImplementedError
+
+
+class SqliteEngine(_Engine):
+    name = "sqlite"
+
+    def __init__(self, db_path: Path, dedupe: bool = False):
+        super().__init__()
+        if not Path(db_path).exists():
+            raise FileNotFoundError(f"DB not found: {db_path}")
+        self.conn = sqlite3.connect(str(db_path))
+        self.has_rollup = bool(self._query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews_daily'"
+        ))
+        self.columns = {row[1] for row in self._query("PRAGMA table_info(reviews)")}
+        if dedupe:
+            if "dup_cluster" not in self.columns:
+                self.close()
+                raise ValueError("DB has no duplicate clusters; run /organize again")
+            # temp objects shadow main ones, so every query below reads the view
+            self.conn.execute(f"CREATE TEMP VIEW reviews AS SELECT * FROM main.reviews WHERE {DEDUPE_FILTER}")
+            # the rollup counts duplicates too
+            self.has_rollup = False
+
+    def _bin_sql(self, column: str) -> str:
+        # (v - mn) is never negative, so CAST truncation is floor
+        return (
+            f"SELECT MIN(CAST(({column} - ?1) / ?2 AS INTEGER), ?3) AS b, COUNT(*) "
+            f"FROM reviews WHERE {column} IS NOT NULL GROUP BY b"
+        )
+
+    def _period_sql(self, granularity: str, column: str) -> str:
+        if granularity == "week":
+            return f"date({column}, 'weekday 0', '-6 days')"
+        if granularity == "month":
+            return f"strftime('%Y-%m-01', {column})"
+        return f"date({column})"
+
+    def _scan_token_counts(self, text_field: str) -> list[tuple[int, int]]:
+        # sqlite has no regex support; tokenize in Python
+        counts = Counter(len(tokenize(txt)) for txt in self.iter_texts(text_field))
+        return sorted(counts.items())
+
+
+class DuckDBEngine(_Engine):
+    name = "duckdb"
+
+    def __init__(self, db_path: Optional[Path] = None, parquet_dir: Optional[Path] = None, dedupe: bool = False):
+        super().__init__()
+        import duckdb
+
+        self.conn = duckdb.connect()
+        try:
+            if parquet_dir is not None:
+                if not Path(parquet_dir).exists():
+                    raise FileNotFoundError(f"Parquet dataset not found: {parquet_dir}")
+                pattern = str(Path(parquet_dir) / "**" / "*.parquet").replace("'", "''")
+                source = f"read_parquet('{pattern}', hive_partitioning = true)"
+            else:
+                if not Path(db_path).exists():
+                    raise FileNotFoundError(f"DB not found: {db_path}")
+                # Needs the sqlite extension (autoloaded from the extension repository)
+                self.conn.execute(f"ATTACH '{str(db_path).replace(chr(39), chr(39) * 2)}' AS src (TYPE sqlite, READ_ONLY)")
+                source = "src.reviews"
+                if not dedupe and self._query(
+                    "SELECT 1 FROM duckdb_tables() WHERE database_name = 'src' AND table_name = 'reviews_daily'"
+                ):
+                    self.conn.execute("CREATE VIEW reviews_daily AS SELECT * FROM src.reviews_daily")
+                    self.has_rollup = True
+            self.conn.execute(f"CREATE VIEW reviews AS SELECT * FROM {source}")
+            self.columns = {row[0] for row in self._query("DESCRIBE reviews")}
+            if dedupe:
+                if "dup_cluster" not in self.columns:
+                    raise ValueError("Source has no duplicate clusters; run /organize again")
+                self.conn.execute(f"CREATE OR REPLACE VIEW reviews AS SELECT * FROM {source} WHERE {DEDUPE_FILTER}")
+        except Exception:
+            self.close()
+            raise
+
+    def _bin_sql(self, column: str) -> str:
+        return (
+            f"SELECT least(CAST(floor(({column} - $1) / $2) AS INTEGER), $3) AS b, COUNT(*) "
+            f"FROM reviews WHERE {column} IS NOT NULL GROUP BY b"
+        )
+
+    def _period_sql(self, granularity: str, column: str) -> str:
+        return f"strftime(date_trunc('{granularity}', CAST({column} AS DATE)), '%Y-%m-%d')"
+
+    def _scan_token_counts(self, text_field: str) -> list[tuple[int, int]]:
+        # Same rules as tokenize(): NFC-normalized [\w-]+ tokens longer than 2 chars that are not all digits
+        return self._query(
+            rf"""
+            SELECT n, COUNT(*) FROM (
+                SELECT len(list_filter(
+                    regexp_extract_all(lower(nfc_normalize({text_field})), '[\pL\pN_\-]+'),
+                    t -> length(t) > 2 AND NOT regexp_full_match(t, '\p{{Nd}}+')
+                )) AS n
+                FROM reviews WHERE {text_field} IS NOT NULL
+            ) GROUP BY n ORDER BY n
+            """
+        )
+
+
+def open_engine(db_path: Optional[Path] = None, parquet_dir: Optional[Path] = None, engine: Optional[str] = None, dedupe: bool = False) -> _Engine:
+    """Open the analytics engine for a reviews DB or Parquet export.
+
+    engine: "duckdb", "sqlite" or "auto" (default: ANALYTICS_ENGINE env, then
+    auto). In auto mode duckdb is used when it is importable and can attach
+    the source, otherwise the sqlite3 engine is returned.
+    """
+    global _duckdb_sqlite_failed
+    engine = (engine or os.environ.get("ANALYTICS_ENGINE") or "auto").lower()
+    if engine not in ("auto", "duckdb", "sqlite"):
+        raise ValueError(f"Unknown analytics engine: {engine}")
+    if parquet_dir is not None and engine == "sqlite":
+        raise ValueError("The sqlite engine cannot read a Parquet export")
+    if engine == "duckdb" or parquet_dir is not None or (engine == "auto" and _duckdb_sqlite_failed is None):
+        try:
+            return DuckDBEngine(db_path=db_path, parquet_dir=parquet_dir, dedupe=dedupe)
+        except (FileNotFoundError, ValueError):
+            raise
+        except Exception as e:
+            if engine == "duckdb" or parquet_dir is not None:
+                raise RuntimeError(f"duckdb engine unavailable: {e}") from e
+            _duckdb_sqlite_failed = str(e)
+            print(f"[server] duckdb engine unavailable, falling back to sqlite3: {e}")
+    return SqliteEngine(db_path, dedupe=dedupe)
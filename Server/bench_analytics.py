@@ -0,0 +1,81 @@
+"""Benchmark the chart query engines on synthetic corpora.
+
+Usage: python Server/bench_analytics.py [--sizes 10000,100000,1000000] [--workdir DIR]
+
+For every corpus size a synthetic reviews DB (and its Parquet export) is
+generated once and every chart query is timed on the sqlite3 engine, on
+duckdb attached to the DB and on duckdb over Parquet. Engines that cannot be
+opened (e.g. the duckdb sqlite extension is not installed) are reported and
+skipped.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from L2.parquet_export import export_parquet_from_db
+from L2.synthetic_corpus import write_db
+from Server.analytics import NUMERIC_COLUMNS, open_engine
+
+QUERIES = {
+    **{f"histogram:{c}": (lambda e, c=c: e.numeric_histogram(c, 20)) for c in NUMERIC_COLUMNS},
+    "token_count:review_descr": lambda e: e.token_count_histogram("review_descr"),
+    "top_values:year_usage": lambda e: e.top_values("year_usage", 30),
+    "timeseries:week": lambda e: e.timeseries("week"),
+}
+
+
+def bench_engine(label, open_fn, repeat):
+    try:
+        engine = open_fn()
+    except Exception as e:
+        print(f"  {label:>16}: unavailable ({str(e).splitlines()[0]})")
+        return None
+    timings = {}
+    with engine:
+        for name, query in QUERIES.items():
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query(engine)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+    total = sum(timings.values())
+    print(f"  {label:>16}: " + ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in timings.items()) + f" | total {total * 1000:.1f}ms")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--workdir", default=None, help="Keep generated corpora here (temporary dir by default)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bench_analytics_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        db_path = workdir / f"reviews_{size}.db"
+        parquet_dir = workdir / f"reviews_{size}.parquet"
+        if not db_path.exists():
+            write_db(db_path, size)
+        if not parquet_dir.exists():
+            export_parquet_from_db(db_path, parquet_dir)
+        print(f"{size} reviews:")
+        results[size] = {
+            "sqlite": bench_engine("sqlite", lambda: open_engine(db_path, engine="sqlite"), args.repeat),
+            "duckdb_sqlite": bench_engine("duckdb(sqlite)", lambda: open_engine(db_path, engine="duckdb"), args.repeat),
+            "duckdb_parquet": bench_engine("duckdb(parquet)", lambda: open_engine(parquet_dir=parquet_dir, engine="duckdb"), args.repeat),
+        }
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
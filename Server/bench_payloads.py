@@ -0,0 +1,77 @@
+"""Benchmark chart payload encodings: size and serialization time.
+
+Usage: python Server/bench_payloads.py [--sizes 30,1000,20000] [--repeat 20]
+
+For bar charts with the given numbers of labels every encoding in
+Server/payloads.py is timed and measured, raw and gzip-compressed (as the
+app's GZipMiddleware sends it). "figure (go.Figure)" is the previous plotly
+path: building a go.Figure, to_plotly_json() and FastAPI's jsonable_encoder.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import plotly.graph_objects as go
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from Server.payloads import chart_response, figure_json, msgpack
+
+
+def _old_figure(labels, values):
+    fig = go.Figure(data=[go.Bar(x=labels, y=values)], layout=go.Layout(title="Bench", xaxis_title="", yaxis_title="Count"))
+    payload = jsonable_encoder({"figure": fig.to_plotly_json(), "kind": "bench"})
+    return JSONResponse(payload).body
+
+
+def _encodings(labels, values):
+    data = {"labels": labels, "values": values, "kind": "bench"}
+    encodings = {
+        "figure (go.Figure)": lambda: _old_figure(labels, values),
+        "figure (template)": lambda: chart_response({"figure": figure_json("bar", labels, values, "Bench", y_title="Count"), "kind": "bench"}, "json").body,
+        "json": lambda: chart_response(data, "json").body,
+        "arrow": lambda: chart_response(data, "arrow").body,
+    }
+    if msgpack is not None:
+        encodings["msgpack"] = lambda: chart_response(data, "msgpack").body
+    return encodings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="30,1000,20000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        # Day labels, like a daily time series
+        labels = [(date(1990, 1, 1) + timedelta(days=i)).isoformat() for i in range(size)]
+        values = [(i * 7919) % 1000 for i in range(size)]
+        print(f"== {size} labels")
+        results[size] = {}
+        for name, encode in _encodings(labels, values).items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                body = encode()
+                best = min(best, time.perf_counter() - start)
+            gzipped = len(gzip.compress(body, compresslevel=9))
+            results[size][name] = {"ms": best * 1000, "bytes": len(body), "gzip_bytes": gzipped}
+            print(f"  {name:>20}: {best * 1000:8.2f}ms {len(body):>9} B  gzip {gzipped:>8} B")
+        if msgpack is None:
+            print("  msgpack: not installed, skipped")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark full-text review search pages on a synthetic corpus.
+
+Usage: python Server/bench_search.py [--reviews 1000000] [--db PATH] [--pages 5]
+
+A synthetic reviews DB (with its full-text shards) is generated once, or
+reused when --db already exists (an older single-table index is migrated
+first). For queries from broad (most reviews match) to selective, the script
+times the first page and the following pages of search_reviews, a page that
+starts 3 results before the end of the first window (so it ranks two
+windows, as 1 page in SEARCH_WINDOW / limit does), and reports
+how many reviews match and how long ranking every match by bm25 (ORDER BY
+rank in every shard, as an exact ranking would) takes for comparison. The
+target is a page in under 50 ms.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from L2.organize_dataset import FTS_SHARD_ROWS, fts_shards, init_database
+from L2.synthetic_corpus import write_db
+from Server.reviews import SEARCH_WINDOW, _encode_cursor, _ranked_window, build_match_query, search_reviews
+
+# Frequent to rare words of the synthetic vocabulary, and a two-word query
+QUERIES = ("магазин", "доставка", "курьер", "сотрудник", "вообще", "подделка возврат")
+TARGET_MS = 50
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--db", default=None, help="Reuse or write the corpus DB here")
+    parser.add_argument("--pages", type=int, default=5, help="Pages walked per query")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(args.db or Path(tmp) / "reviews.db")
+        if not db_path.exists():
+            started = time.perf_counter()
+            write_db(db_path, args.reviews)
+            print(f"generated {args.reviews} reviews in {time.perf_counter() - started:.0f}s")
+        init_database(str(db_path)).close()
+        conn = sqlite3.connect(db_path)
+        total = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        numbers = fts_shards(conn)
+        shards = [f"reviews_fts_{n}" for n in numbers]
+        print(f"{total} reviews in {len(shards)} shards of {FTS_SHARD_ROWS}, window {SEARCH_WINDOW}, {args.limit} results per page")
+
+        results = {}
+        for q in QUERIES:
+            match = build_match_query(q)
+            matches = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {shard} WHERE {shard} MATCH ?", (match,)).fetchone()[0] for shard in shards
+            )
+            _, exact_ms = _timed(
+                lambda: [
+                    conn.execute(f"SELECT rowid FROM {shard} WHERE {shard} MATCH ? ORDER BY rank LIMIT ?", (match, args.limit)).fetchall()
+                    for shard in shards
+                ]
+            )
+            page_ms, cursor = [], None
+            for _ in range(args.pages):
+                page, ms = _timed(lambda: search_reviews(conn, q, args.limit, cursor))
+                page_ms.append(ms)
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            boundary_ms = None
+            ranked, _ = _ranked_window(conn, match, (numbers[-1] + 1) * FTS_SHARD_ROWS, numbers)
+            if len(ranked) > 3:
+                cursor = _encode_cursor(max(rowid for _, rowid in ranked), *ranked[-4])
+                _, boundary_ms = _timed(lambda: search_reviews(conn, q, args.limit, cursor))
+            results[q] = {"matches": matches, "exact_rank_ms": exact_ms, "page_ms": page_ms, "boundary_page_ms": boundary_ms}
+            worst = max(page_ms + [boundary_ms or 0])
+            print(
+                f"  {q:>18}: {matches:>8} matches | exact rank {exact_ms:8.1f}ms | "
+                f"pages {', '.join(f'{ms:.1f}' for ms in page_ms)}ms | "
+                f"window boundary {'-' if boundary_ms is None else f'{boundary_ms:.1f}ms'} | "
+                f"{'ok' if worst < TARGET_MS else 'OVER'} ({TARGET_MS}ms target)"
+            )
+        conn.close()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Server state shared by all uvicorn worker processes.
+
+The log tail, the crawl job table and small settings (the last organized DB)
+live in one SQLite file in WAL mode, so every worker sees the same scraper
+jobs and the same log whichever worker started the crawl or printed the line.
+
+- logs: recent server and scraper output, the last log_max_lines lines of
+  the server and of every crawl job. Lines are buffered in memory and
+  written in batches by a background thread every 0.1 s, so a print costs a
+  list append rather than a transaction. tail() reads through its own
+  connection, which in WAL mode never waits for a writer. The same thread
+  hands every batch to the SegmentLog (Server/logstore.py), which keeps the
+  full history in compressed, size-rotated files for search_logs().
+- jobs: one row per crawl. Starting a crawl reserves its row inside a
+  BEGIN IMMEDIATE transaction, which makes the job limit and the concurrency
+  budget hold across workers. The worker that spawned the subprocess reads
+  its output and records how it ended; any worker can stop it by pid.
+- kv: string settings.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from Server.logstore import SegmentLog
+
+ACTIVE_STATUSES = ("starting", "running")
+# A reserved job that never got a pid (its worker died while spawning)
+_STARTING_TIMEOUT = 30
+_FLUSH_INTERVAL = 0.1
+
+_JOB_COLUMNS = ("job_id", "product_url", "pid", "status", "concurrent_requests", "started_at", "stopped", "owner_pid")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ControlStore:
+    def __init__(self, path, log_max_lines: int = 2000, log_dir=None):
+        self.path = str(path)
+        self.log_max_lines = log_max_lines
+        self.log_segments = SegmentLog(log_dir) if log_dir is not None else None
+        self._lock = threading.Lock()
+        self._pending: list[tuple[Optional[str], str, float]] = []
+        self._pending_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._read_lock = threading.Lock()
+        self._read_conn = None
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, line TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_logs_job ON logs (job_id, id);
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                product_url TEXT,
+                pid INTEGER,
+                status TEXT NOT NULL,
+                concurrent_requests INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                stopped INTEGER NOT NULL DEFAULT 0,
+                owner_pid INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+
+    # --- logs ---
+    def append_log(self, line: str, job_id: Optional[str] = None) -> None:
+        with self._pending_lock:
+            self._pending.append((job_id, line, time.time()))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="control-log-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                # Nowhere to log to; keep the lines for the next attempt
+                os.write(2, f"[server] log flush failed: {e}\n".encode())
+
+    def flush(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            if self.log_segments is not None:
+                self.log_segments.flush()
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT INTO logs (job_id, line) VALUES (?, ?)", [(job_id, line) for job_id, line, _ in pending])
+                # Every job (and the server, job_id NULL) keeps its own last
+                # log_max_lines lines, so a chatty crawl cannot evict another's
+                for job_id in {job_id for job_id, _, _ in pending}:
+                    self._conn.execute(
+                        "DELETE FROM logs WHERE job_id IS ? AND id <= "
+                        "(SELECT id FROM logs WHERE job_id IS ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (job_id, job_id, self.log_max_lines),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                with self._pending_lock:
+                    self._pending[:0] = pending
+                raise
+        if self.log_segments is not None:
+            self.log_segments.append((ts, job_id, line) for job_id, line, ts in pending)
+            self.log_segments.flush()
+
+    def tail(self, n: int, job_id: Optional[str] = None) -> list[str]:
+        """Last n log lines, oldest first; only the job's lines when job_id is given."""
+        if n <= 0:
+            return []
+        with self._read_lock:
+            if self._read_conn is None:
+                self._read_conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            if job_id is None:
+                rows = self._read_conn.execute("SELECT line FROM logs ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+            else:
+                rows = self._read_conn.execute(
+                    "SELECT line FROM logs WHERE job_id = ? ORDER BY id DESC LIMIT ?", (job_id, n)
+                ).fetchall()
+        return [line for (line,) in reversed(rows)]
+
+    def search_logs(self, since=None, until=None, pattern=None, job_id: Optional[str] = None, limit: int = 1000, cursor: Optional[str] = None):
+        """Records of the segment log (see SegmentLog.search); ([], False, cursor) without one."""
+        if self.log_segments is None:
+            return [], False, cursor
+        self.flush()
+        # This worker's own recent lines become searchable at once
+        self.log_segments.flush(force=True)
+        return self.log_segments.search(since, until, pattern, job_id, limit, cursor)
+
+    # --- kv ---
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+
+    # --- jobs ---
+    def _reconcile(self, rows: list[dict]) -> list[dict]:
+        """Mark active jobs whose process or spawning worker is gone as lost."""
+        active = []
+        for job in rows:
+            if job["pid"] is not None:
+                alive = _pid_alive(job["pid"])
+            else:
+                alive = _pid_alive(job["owner_pid"]) and time.time() - job["started_at"] < _STARTING_TIMEOUT
+            if alive:
+                active.append(job)
+            else:
+                self._conn.execute("UPDATE jobs SET status = 'lost' WHERE job_id = ?", (job["job_id"],))
+        return active
+
+    def _select(self, where: str = "", params=()) -> list[dict]:
+        cur = self._conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs {where} ORDER BY started_at", params)
+        return [dict(zip(_JOB_COLUMNS, row)) for row in cur.fetchall()]
+
+    def _active(self) -> list[dict]:
+        return self._reconcile(self._select(f"WHERE status IN {ACTIVE_STATUSES}"))
+
+    def jobs(self) -> list[dict]:
+        with self._lock:
+            self._active()
+            return self._select()
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            rows = self._select("WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def running_jobs(self) -> list[dict]:
+        with self._lock:
+            return self._active()
+
+    def reserve_job(self, job_id: str, product_url: Optional[str], concurrent_requests: Optional[int], max_jobs: int, budget: int) -> tuple[str, object]:
+        """Atomically check the limits and insert a 'starting' job.
+
+        Returns ("reserved", job), ("already_running", job) or ("rejected", message).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = self._active()
+                for job in running:
+                    if job["product_url"] == product_url:
+                        return "already_running", job
+                if len(running) >= max_jobs:
+                    return "rejected", f"{max_jobs} crawl jobs already running"
+                remaining = budget - sum(job["concurrent_requests"] for job in running)
+                concurrent_requests = concurrent_requests or max(1, budget // max_jobs)
+                if concurrent_requests > remaining:
+                    return "rejected", f"concurrency budget exhausted: {remaining} of {budget} requests left"
+                job = {
+                    "job_id": job_id,
+                    "product_url": product_url,
+                    "pid": None,
+                    "status": "starting",
+                    "concurrent_requests": concurrent_requests,
+                    "started_at": time.time(),
+                    "stopped": 0,
+                    "owner_pid": os.getpid(),
+                }
+                self._conn.execute(
+                    f"INSERT INTO jobs ({', '.join(_JOB_COLUMNS)}) VALUES ({', '.join('?' for _ in _JOB_COLUMNS)})",
+                    [job[c] for c in _JOB_COLUMNS],
+                )
+                return "reserved", job
+            finally:
+                self._conn.execute("COMMIT")
+
+    def update_job(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ?", (*fields.values(), job_id)
+            )
@@ -0,0 +1,96 @@
+"""Bounding the number of bars of histogram payloads.
+
+The engines return exact distributions: one (value, count) row per distinct
+value of an integer column (token counts, likes, comments). On a large corpus
+that is thousands of bars, which the frontend then renders one by one.
+rebin() merges neighbouring values into at most max_bars contiguous bins:
+
+- linear: equal-width integer ranges;
+- log: ranges whose width grows geometrically (edges equally spaced on
+  log(1 + v)), for long-tailed non-negative columns such as likes/comments,
+  where equal widths put almost every review in the first bar;
+- quantile: ranges cut at equally spaced quantiles, holding about the same
+  number of reviews each (a value spanning several quantiles gets one bar);
+- auto: log for long-tailed non-negative distributions, linear otherwise.
+
+Bins are labelled "lo–hi" (or "v" for a single value) with the actual
+smallest and largest value they contain; empty ranges get no bar.
+"""
+import math
+
+BINNINGS = ("auto", "linear", "log", "quantile")
+# auto picks log bins when the top value is this many times the 99th percentile
+_LONG_TAIL_RATIO = 4
+
+
+def _quantile(values: list, counts: list[int], q: float):
+    target = q * sum(counts)
+    seen = 0
+    for value, count in zip(values, counts):
+        seen += count
+        if seen >= target:
+            return value
+    return values[-1]
+
+
+def choose_binning(values: list, counts: list[int]) -> str:
+    """log for long-tailed non-negative distributions, linear otherwise."""
+    if not values or values[0] < 0:
+        return "linear"
+    p99 = _quantile(values, counts, 0.99)
+    return "log" if values[-1] > _LONG_TAIL_RATIO * max(p99, 1) else "linear"
+
+
+def _edge_bins(values: list, edges: list[float]) -> list[int]:
+    """Bin index of every value for ascending edges (bin i is [edges[i], edges[i + 1]))."""
+    out, b = [], 0
+    for value in values:
+        while b + 2 < len(edges) and value >= edges[b + 1]:
+            b += 1
+        out.append(b)
+    return out
+
+
+def _quantile_bins(counts: list[int], max_bars: int) -> list[int]:
+    """Bin index of every value by the share of reviews below it."""
+    total = sum(counts)
+    out, below = [], 0
+    for count in counts:
+        out.append(min(max_bars - 1, below * max_bars // total))
+        below += count
+    return out
+
+
+def rebin(values: list, counts: list[int], max_bars: int, binning: str = "auto") -> tuple[list[str], list[int]]:
+    """Labels and counts of at most max_bars bins of a value-sorted distribution."""
+    if binning not in BINNINGS:
+        raise ValueError(f"Unknown binning: {binning}")
+    if len(values) <= max_bars:
+        return [str(v) for v in values], list(counts)
+    if binning == "auto":
+        binning = choose_binning(values, counts)
+    lo, hi = values[0], values[-1]
+    if binning == "quantile":
+        assignment = _quantile_bins(counts, max_bars)
+    elif binning == "log" and lo >= 0:
+        top = math.log1p(hi)
+        edges = [math.expm1(top * i / max_bars) for i in range(max_bars + 1)]
+        assignment = _edge_bins(values, edges)
+    else:
+        width = (hi - lo) / max_bars
+        assignment = _edge_bins(values, [lo + width * i for i in range(max_bars + 1)])
+
+    labels, binned = [], []
+    first = last = None
+    current = -1
+    for value, count, b in zip(values, counts, assignment):
+        if b != current:
+            if current >= 0:
+                labels.append(str(first) if first == last else f"{first}–{last}")
+            binned.append(0)
+            first, current = value, b
+        last = value
+        binned[-1] += count
+    labels.append(str(first) if first == last else f"{first}–{last}")
+    return labels, binned
+
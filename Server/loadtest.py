@@ -0,0 +1,404 @@
+"""Load-test the server offline: latency, throughput and peak RSS per endpoint.
+
+Usage: python Server/loadtest.py [--reviews 50000] [--concurrency 4] [--duration 5]
+                                 [--workers 1] [--scenarios histogram,stdout]
+                                 [--json results.json] [--compare previous.json]
+
+Without --url a synthetic reviews DB and intermediate JSON corpus are
+generated (L2/synthetic_corpus.py) and the server is started with uvicorn
+(--workers processes) on a free port. Scenarios:
+- histogram:<kind>: every /charts/histogram kind, plus timeseries:<granularity>
+- stdout:idle, stdout:loaded: /stdout polled sequentially (like the
+  frontend's log view) on an idle server and while --chart-clients threads
+  request charts back to back
+- organize: sequential /organize runs over the generated JSON corpus
+Every scenario first sends one warm-up request (which also builds caches such
+as the TF-IDF index), then keeps --concurrency clients busy for --duration
+seconds and reports p50/p95/p99 latency, throughput and the peak RSS of the
+server process tree (sampled from /proc, so Linux only).
+
+--json stores the results with the commit they were measured on; --compare
+prints the p95 and throughput change against an earlier results file.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+HISTOGRAM_QUERIES = {
+    "stars": {"kind": "stars"},
+    "likes": {"kind": "likes"},
+    "comments": {"kind": "comments"},
+    "year_usage": {"kind": "year_usage"},
+    "token_count": {"kind": "token_count"},
+    "top_values": {"kind": "top_values", "column": "year_usage"},
+    "word_freq": {"kind": "word_freq", "text_field": "title"},
+    "distinctive_terms": {"kind": "distinctive_terms", "stars": 1},
+    "stars_plotly": {"kind": "stars", "fmt": "plotly"},
+}
+TIMESERIES_QUERIES = {"day": {"granularity": "day"}, "week": {"granularity": "week", "metric": "avg_stars"}}
+# Cheap charts used as background load for stdout:loaded
+LOAD_QUERIES = [
+    ("/charts/histogram", HISTOGRAM_QUERIES["stars"]),
+    ("/charts/histogram", HISTOGRAM_QUERIES["token_count"]),
+    ("/charts/timeseries", TIMESERIES_QUERIES["day"]),
+    ("/charts/histogram", HISTOGRAM_QUERIES["top_values"]),
+]
+
+
+class _Client:
+    """Requests against one server, a fresh connection per request."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def request(self, method, path, params=None, body=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=600)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path + ("?" + urlencode(params, doseq=True) if params else ""),
+                         body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class RssSampler:
+    """Peak resident memory of a process and all its descendants."""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree(self, pid):
+        pids = [pid]
+        for task in Path(f"/proc/{pid}/task").glob("*"):
+            try:
+                children = (task / "children").read_text().split()
+            except OSError:
+                continue
+            for child in children:
+                pids += self._tree(int(child))
+        return pids
+
+    def rss(self):
+        total = 0
+        for pid in self._tree(self.pid):
+            try:
+                for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        self.peak = self.rss()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_clients(send, concurrency, duration):
+    """Run send() from `concurrency` threads for `duration` seconds.
+
+    Returns (latencies, errors, wall seconds); every client completes at
+    least one request, so slow endpoints still get measured.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        i = index
+        while True:
+            start = time.perf_counter()
+            try:
+                ok = send(i) == 200
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(i)
+            i += concurrency
+            if time.perf_counter() >= deadline:
+                break
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(latencies, errors, wall, sampler=None):
+    result = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+    }
+    if sampler is not None:
+        result["peak_rss_mb"] = round(sampler.peak / 2**20, 1)
+    return result
+
+
+def report(name, result):
+    rss = f" rss={result['peak_rss_mb']}MB" if "peak_rss_mb" in result else ""
+    print(
+        f"  {name:>28}: n={result['requests']} err={result['errors']} {result['throughput_rps']}/s "
+        f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms{rss}"
+    )
+
+
+def poll_stdout(client, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        client.get("/stdout", {"lines": 30})
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+    return latencies, [], time.perf_counter() - started
+
+
+def chart_load(client, db, stop, counts, errors):
+    i = 0
+    while not stop.is_set():
+        path, params = LOAD_QUERIES[i % len(LOAD_QUERIES)]
+        status = client.get(path, {**params, "db": db})
+        counts.append(1)
+        if status != 200:
+            errors.append(status)
+        i += 1
+
+
+def scenarios(args, url, db, json_dir, workdir):
+    """Yield (name, run) pairs; run() returns (latencies, errors, wall)."""
+    client = _Client(url)
+
+    def timed(path, params, method="GET"):
+        def run():
+            client.request(method, path, params)  # warm-up
+            return run_clients(lambda i: _Client(url).request(method, path, params), args.concurrency, args.duration)
+        return run
+
+    for name, params in HISTOGRAM_QUERIES.items():
+        yield f"histogram:{name}", timed("/charts/histogram", {**params, "db": db})
+    for name, params in TIMESERIES_QUERIES.items():
+        yield f"timeseries:{name}", timed("/charts/timeseries", {**params, "db": db})
+
+    yield "stdout:idle", lambda: poll_stdout(client, args.duration)
+
+    def stdout_loaded():
+        stop = threading.Event()
+        counts, errors = [], []
+        threads = [
+            threading.Thread(target=chart_load, args=(_Client(url), db, stop, counts, errors), daemon=True)
+            for _ in range(args.chart_clients)
+        ]
+        for thread in threads:
+            thread.start()
+        result = poll_stdout(client, args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"  {'':>28}  background charts: {len(counts)} ({len(counts) / args.duration:.1f}/s), errors: {len(errors)}")
+        return result
+
+    yield "stdout:loaded", stdout_loaded
+
+    if json_dir is not None:
+        def organize():
+            latencies, errors = [], []
+            started = time.perf_counter()
+            for run in range(args.organize_runs):
+                body = {"input_dir": str(json_dir), "output_db": str(Path(workdir) / f"organize_{run}.db")}
+                start = time.perf_counter()
+                status = client.request("POST", "/organize", body=body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(status)
+            return latencies, errors, time.perf_counter() - started
+
+        yield "organize", organize
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, workdir):
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "SERVER_STATE_DB": str(Path(workdir) / "server_state.db")}
+    # These override the paths given to /organize
+    env.pop("INTERMEDIATE_DATASET_DIR", None)
+    env.pop("REVIEWS_DB", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "Server.serve:app", "--port", str(port), "--log-level", "warning", "--workers", str(workers)],
+        cwd=str(ROOT),
+        env=env,
+    )
+    client = _Client(f"http://127.0.0.1:{port}")
+    for _ in range(300):
+        try:
+            client.get("/")
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def _commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return head, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, previous_path):
+    previous = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+    print(f"compared with {previous_path} ({(previous.get('commit') or '?')[:10]})")
+    for name, result in results["scenarios"].items():
+        old = previous.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        p95 = (result["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else float("nan")
+        rps = (result["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else float("nan")
+        print(f"  {name:>28}: p95 {old['p95_ms']} -> {result['p95_ms']}ms ({p95:+.0f}%), "
+              f"throughput {old['throughput_rps']} -> {result['throughput_rps']}/s ({rps:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="Test a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="Sample RSS of this process tree with --url")
+    parser.add_argument("--db", default=None, help="Reviews DB for chart requests (generated when omitted)")
+    parser.add_argument("--reviews", type=int, default=50000, help="Size of the generated DB")
+    parser.add_argument("--json-dir", default=None, help="Intermediate JSON corpus for organize (generated when omitted)")
+    parser.add_argument("--organize-reviews", type=int, default=5000, help="Size of the generated JSON corpus")
+    parser.add_argument("--organize-runs", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients per chart scenario")
+    parser.add_argument("--chart-clients", type=int, default=8, help="Background chart clients in stdout:loaded")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--scenarios", default=None, help="Comma separated scenario name prefixes to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare with")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+    db = args.db
+    json_dir = args.json_dir
+    wanted = args.scenarios.split(",") if args.scenarios else None
+    if db is None or (json_dir is None and (wanted is None or "organize" in wanted)):
+        from L2.synthetic_corpus import write_db, write_json_dir
+
+        if db is None:
+            db = str(workdir / "reviews.db")
+            print(f"generating {args.reviews} reviews into {db}")
+            write_db(db, args.reviews, args.seed)
+        if json_dir is None and (wanted is None or "organize" in wanted):
+            json_dir = workdir / "intermediate"
+            print(f"generating {args.organize_reviews} review JSON files into {json_dir}")
+            write_json_dir(json_dir, args.organize_reviews, args.seed)
+
+    proc = None
+    url = args.url
+    server_pid = args.server_pid
+    if url is None:
+        port = _free_port()
+        proc = start_server(port, args.workers, workdir)
+        url = f"http://127.0.0.1:{port}"
+        server_pid = proc.pid
+    sampler = RssSampler(server_pid) if server_pid and Path(f"/proc/{server_pid}").exists() else None
+    if sampler is not None:
+        sampler.start()
+
+    commit, dirty = _commit()
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "scenarios": {},
+    }
+    try:
+        print(f"{args.duration:.0f}s per scenario, {args.concurrency} clients")
+        for name, run in scenarios(args, url, db, json_dir, workdir):
+            if wanted and not any(name.startswith(prefix) for prefix in wanted):
+                continue
+            if sampler is not None:
+                sampler.reset()
+            result = summarize(*run(), sampler=sampler)
+            results["scenarios"][name] = result
+            report(name, result)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+            results["peak_rss_mb"] = max([r.get("peak_rss_mb", 0) for r in results["scenarios"].values()] + [0])
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"results written to {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Size-rotated, compressed log segments behind the control store's log tail.
+
+The logs table of Server/control.py keeps only a short tail. Every line is
+also appended to a SegmentLog directory, which keeps the whole history up
+to max_segments * segment_bytes of compressed text:
+- lines are buffered and written in blocks, each an independent gzip member
+  appended to the current segment file (seg-000001.log.gz). Concatenated
+  gzip members form a valid gzip file, so a segment can still be read with
+  zcat;
+- every block adds a line to the segment's index file (seg-000001.idx): the
+  block's byte offset and length, first and last timestamp and line count.
+  search() skips blocks outside [since, until] by the index alone and
+  decompresses the others one at a time, so memory stays at one block;
+  results come in file order and page with a (segment, block offset, line)
+  cursor;
+- a segment is closed once it holds segment_bytes; the oldest segments
+  beyond max_segments are deleted.
+Blocks are written under an flock on the directory's lock file, so every
+uvicorn worker appends to the same segments. Readers take no lock: a block
+becomes visible once its index line is complete.
+"""
+import atexit
+import fcntl
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+_SEGMENT_GLOB = "seg-*.log.gz"
+
+
+def _compress(data: bytes) -> bytes:
+    # wbits=31: gzip container, one member per block
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _index_path(segment: Path) -> Path:
+    return segment.with_suffix("").with_suffix(".idx")
+
+
+def _encode_cursor(position: tuple[int, int, int]) -> str:
+    return ":".join(map(str, position))
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int, int]:
+    try:
+        segment, offset, line = map(int, cursor.split(":"))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return segment, offset, line
+
+
+def _parse_record(text: str) -> tuple[float, Optional[str], str]:
+    ts, job_id, line = text.split("\t", 2)
+    return float(ts), job_id or None, line
+
+
+class SegmentLog:
+    def __init__(
+        self,
+        directory,
+        segment_bytes: int = 8 * 2**20,
+        max_segments: int = 32,
+        block_bytes: int = 64 * 2**10,
+        block_seconds: float = 1.0,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.block_bytes = block_bytes
+        self.block_seconds = block_seconds
+        self._lock = threading.Lock()
+        self._buffer: list[str] = []
+        self._buffer_bytes = 0
+        self._buffer_since = 0.0
+        # The flush thread is a daemon; write the last partial block on exit
+        atexit.register(self.flush, force=True)
+
+    # --- writing ---
+    def append(self, records) -> None:
+        """Buffer (ts, job_id, line) records; full blocks are written at once."""
+        with self._lock:
+            for ts, job_id, line in records:
+                line = line.replace("\n", " ")
+                text = f"{ts:.6f}\t{job_id or ''}\t{line}\n"
+                if not self._buffer:
+                    self._buffer_since = time.monotonic()
+                self._buffer.append(text)
+                self._buffer_bytes += len(text)
+                if self._buffer_bytes >= self.block_bytes:
+                    self._write_buffer()
+
+    def flush(self, force: bool = False) -> None:
+        """Write the buffered lines once they are block_seconds old (or now)."""
+        with self._lock:
+            if self._buffer and (force or time.monotonic() - self._buffer_since >= self.block_seconds):
+                self._write_buffer()
+
+    def _write_buffer(self) -> None:
+        lines, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        first_ts = _parse_record(lines[0])[0]
+        last_ts = _parse_record(lines[-1])[0]
+        block = _compress("".join(lines).encode())
+        with open(self.directory / "lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = self.segments()
+            path = segments[-1] if segments else self.directory / "seg-000001.log.gz"
+            if path.exists() and path.stat().st_size >= self.segment_bytes:
+                path = self.directory / f"seg-{int(path.name[4:10]) + 1:06d}.log.gz"
+                for old in segments[: max(0, len(segments) + 1 - self.max_segments)]:
+                    _index_path(old).unlink(missing_ok=True)
+                    old.unlink(missing_ok=True)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(block)
+            with open(_index_path(path), "a") as f:
+                f.write(f"{offset}\t{len(block)}\t{first_ts:.6f}\t{last_ts:.6f}\t{len(lines)}\n")
+
+    # --- reading ---
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(_SEGMENT_GLOB))
+
+    def _blocks(self, segment: Path):
+        """(offset, length, first_ts, last_ts) of the segment's complete index lines."""
+        try:
+            text = _index_path(segment).read_text()
+        except FileNotFoundError:
+            return
+        for entry in text.splitlines(keepends=True):
+            if entry.endswith("\n"):
+                offset, length, first_ts, last_ts, _ = entry.split("\t")
+                yield int(offset), int(length), float(first_ts), float(last_ts)
+
+    def _records(self, since: Optional[float], until: Optional[float], pattern: Optional[re.Pattern], start: tuple[int, int, int]):
+        """(position, line) of the blocks that may match, in file order from start.
+
+        A position is (segment number, block offset, line number in the block);
+        the end of a segment's last block is where its next block will go.
+        """
+        # A block without a literal pattern in it is skipped without splitting
+        # it; anchors or lookarounds could match a line but not its block
+        literal = pattern if pattern is not None and re.escape(pattern.pattern) == pattern.pattern else None
+        start_segment, start_offset, start_line = start
+        for segment in self.segments():
+            number = int(segment.name[4:10])
+            if number < start_segment:
+                continue
+            try:
+                f = open(segment, "rb")
+            except FileNotFoundError:
+                # Rotated away by another worker
+                continue
+            with f:
+                for offset, length, first_ts, last_ts in self._blocks(segment):
+                    if number == start_segment and offset < start_offset:
+                        continue
+                    skip = start_line if (number, offset) == (start_segment, start_offset) else 0
+                    if (since is not None and last_ts < since) or (until is not None and first_ts > until):
+                        yield (number, offset + length, 0), None
+                        continue
+                    f.seek(offset)
+                    text = zlib.decompress(f.read(length), 31).decode()
+                    if literal is None or literal.search(text):
+                        # Not splitlines(): scraper output may contain \r
+                        for i, line in enumerate(text[:-1].split("\n")[skip:], start=skip):
+                            yield (number, offset, i), line
+                    yield (number, offset + length, 0), None
+
+    def search(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        pattern: Optional[re.Pattern] = None,
+        job_id: Optional[str] = None,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+    ) -> tuple[list[tuple[float, Optional[str], str]], bool, Optional[str]]:
+        """First `limit` (ts, job_id, line) records with since <= ts <= until whose
+        line matches pattern, whether more records matched, and the cursor to
+        continue from.
+
+        Records come in file order: the order blocks were written, which
+        is time order within a worker, but blocks of different workers
+        overlap by up to block_seconds. Paging with the returned cursor
+        rather than by timestamp neither skips nor repeats records, and a
+        cursor taken at the end of the log picks up the lines written
+        after it. Lines still buffered by a worker are not searched yet.
+
+        Raises ValueError for a malformed cursor.
+        """
+        start = _decode_cursor(cursor) if cursor else (0, 0, 0)
+        found = []
+        position = start
+        for position, text in self._records(since, until, pattern, start):
+            if text is None:
+                continue
+            ts, line_job, line = _parse_record(text)
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                continue
+            if job_id is not None and line_job != job_id:
+                continue
+            if pattern is not None and not pattern.search(line):
+                continue
+            if len(found) == limit:
+                return found, True, _encode_cursor(position)
+            found.append((ts, line_job, line))
+        return found, False, _encode_cursor(position)
@@ -0,0 +1,124 @@
+"""Chart payload encoding for the /charts endpoints.
+
+Chart data ({labels, values, kind, ...}) can be sent as:
+- json: the plain dict (gzip-compressed by the app's GZipMiddleware)
+- arrow: an Arrow IPC stream with labels/values columns (ISO day labels as
+  date32, integer values in the smallest integer type); the scalar fields
+  (kind, field, metric, ...) travel as JSON in the X-Chart-Meta header
+- msgpack: the dict packed with msgpack, when the msgpack package is installed
+The format comes from the fmt query parameter, or from the Accept header when
+fmt is left at json.
+
+Plotly figures are filled into a cached figure template instead of being built
+with go.Figure on every request: building and validating a figure costs
+~10 ms, while the output (layout boilerplate including the plotly theme) is
+the same for every chart but the data and titles.
+"""
+import io
+import json
+
+import plotly.graph_objects as go
+import polars as pl
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # optional transport
+    msgpack = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+BINARY_FORMATS = {ARROW_MEDIA_TYPE: "arrow", MSGPACK_MEDIA_TYPE: "msgpack"}
+
+_templates = {}
+
+
+def _template(trace: str, orientation: str) -> tuple[dict, dict]:
+    """(trace, layout) dicts of an empty figure, built once per trace type."""
+    key = (trace, orientation)
+    if key not in _templates:
+        if trace == "line":
+            data = go.Scatter(x=[], y=[], mode="lines+markers")
+        elif orientation == "h":
+            data = go.Bar(x=[], y=[], orientation="h")
+        else:
+            data = go.Bar(x=[], y=[])
+        fig = go.Figure(data=[data], layout=go.Layout(title="", xaxis_title="", yaxis_title="")).to_plotly_json()
+        _templates[key] = (fig["data"][0], fig["layout"])
+    return _templates[key]
+
+
+def figure_json(trace: str, labels: list, values: list, title: str, x_title: str = "", y_title: str = "", orientation: str = "v") -> dict:
+    """Plotly figure JSON equal to go.Figure(...).to_plotly_json() for a bar
+    (trace="bar") or lines+markers (trace="line") chart of labels/values.
+
+    Shares the cached template dicts, so the result must not be mutated.
+    """
+    data, layout = _template(trace, orientation)
+    x, y = (values, labels) if orientation == "h" else (labels, values)
+    return {
+        "data": [{**data, "x": x, "y": y}],
+        "layout": {
+            **layout,
+            "title": {"text": title},
+            "xaxis": {"title": {"text": x_title}},
+            "yaxis": {"title": {"text": y_title}},
+        },
+    }
+
+
+def negotiate(fmt: str, accept: str | None) -> str:
+    """Effective payload format: fmt, or a binary type the client asks for."""
+    if fmt != "json" or not accept:
+        return fmt
+    for media_type in accept.split(","):
+        chosen = BINARY_FORMATS.get(media_type.split(";")[0].strip())
+        if chosen == "msgpack" and msgpack is None:
+            continue
+        if chosen:
+            return chosen
+    return fmt
+
+
+def _arrow_labels(labels: list) -> pl.Series:
+    series = pl.Series("labels", labels, strict=False)
+    if series.dtype == pl.String and len(series) and series.str.len_bytes().eq(10).all():
+        # Time series labels are ISO days: 4-byte dates instead of strings
+        try:
+            return series.str.to_date("%Y-%m-%d")
+        except pl.exceptions.ComputeError:
+            pass
+    return series
+
+
+def encode_arrow(labels: list, values: list) -> bytes:
+    values = pl.Series("values", values, strict=False)
+    if values.dtype.is_integer():
+        values = values.shrink_dtype()
+    frame = pl.DataFrame([_arrow_labels(labels), values])
+    buf = io.BytesIO()
+    # Oldest compat level: plain (not view) strings that every Arrow reader knows
+    frame.write_ipc_stream(buf, compat_level=pl.CompatLevel.oldest())
+    return buf.getvalue()
+
+
+def chart_response(payload: dict, fmt: str) -> Response:
+    """Encode a chart payload dict in the requested format.
+
+    Raises ValueError for a format that cannot be produced.
+    """
+    if fmt == "arrow":
+        if "labels" not in payload:
+            raise ValueError("fmt=arrow needs labels/values; use fmt=json for figures")
+        meta = {k: v for k, v in payload.items() if k not in ("labels", "values")}
+        return Response(
+            content=encode_arrow(payload["labels"], payload["values"]),
+            media_type=ARROW_MEDIA_TYPE,
+            headers={"X-Chart-Meta": json.dumps(meta)},
+        )
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise ValueError("fmt=msgpack needs the msgpack package")
+        return Response(content=msgpack.packb(payload), media_type=MSGPACK_MEDIA_TYPE)
+    # Skips FastAPI's jsonable_encoder walk over the figure template
+    return JSONResponse(payload)
@@ -0,0 +1,298 @@
+"""Review lookup queries served by the /reviews endpoints.
+
+Listings are filtered and sorted on the covering indexes created by
+init_browse_indexes and paged with a (sort value, id) keyset cursor; the long
+text columns are only read when asked for.
+
+Full-text search runs on the FTS5 index maintained by organize.
+Query terms are stemmed with the NLTK Snowball Russian stemmer and matched as
+prefixes, so "доставкой" finds "доставка", "доставки", ... without having to
+lemmatize the whole corpus at ingest.
+
+The index is sharded by id range (reviews_fts_<n>, see init_search_index),
+because ranking cost grows with the number of matches: FTS5's bm25 reads
+every match of each term once per query, and ORDER BY rank scores all of
+them. A page therefore ranks one window at a time: the SEARCH_WINDOW newest
+matches of one shard, found by a rowid-descending scan that stops after the
+window. Pages go through a window best bm25 first, then through the next
+older window, shard by shard from the newest. A query with fewer matches
+in a shard than SEARCH_WINDOW is ranked exactly within that shard; bm25
+statistics are per shard, so scores compare only roughly across shards.
+Pages are addressed by an opaque (window, rank, rowid) cursor rather than
+OFFSET, so a page costs at most a couple of windows however many reviews
+match or however deep the client scrolls.
+"""
+from __future__ import annotations
+
+import bisect
+import re
+import sqlite3
+from typing import Optional
+
+from L2.organize_dataset import BROWSE_COLUMNS, BROWSE_SORT_COLUMNS, FTS_SHARD_ROWS, fts_shards
+from L2.tokens import TOKEN_PATTERN
+
+SEARCH_MAX_LIMIT = 100
+# Matches ranked per window; bounds the work of a page for broad queries
+SEARCH_WINDOW = 2000
+BROWSE_MAX_LIMIT = 200
+BROWSE_TEXT_COLUMNS = ("review_plus", "review_minus", "review_descr")
+# Stems shorter than this are matched exactly to keep prefix scans selective
+_MIN_PREFIX_LEN = 3
+
+_stemmer = None
+_stemmer_loaded = False
+
+
+def _stem(token: str) -> str:
+    global _stemmer, _stemmer_loaded
+    if not _stemmer_loaded:
+        try:
+            from nltk.stem.snowball import RussianStemmer
+            _stemmer = RussianStemmer()
+        except Exception as e:
+            print(f"[server] russian stemmer unavailable, matching terms as typed: {e}")
+            _stemmer = None
+        _stemmer_loaded = True
+    if _stemmer is None or not re.search(r"[а-яё]", token):
+        return token
+    return _stemmer.stem(token)
+
+
+def _parse_terms(q: str) -> list[tuple[str, bool]]:
+    """(term, is_prefix) pairs of a free text query."""
+    terms = []
+    for token in re.findall(TOKEN_PATTERN, q.lower(), flags=re.UNICODE):
+        token = token.strip("-")
+        if not token:
+            continue
+        stem = _stem(token)
+        if len(stem) >= _MIN_PREFIX_LEN and stem != token:
+            terms.append((stem, True))
+        else:
+            terms.append((token, False))
+    return terms
+
+
+def build_match_query(q: str) -> str:
+    """Turn free text into an FTS5 MATCH expression (all terms must match)."""
+    # Quoted strings cannot inject FTS5 syntax
+    return " ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in _parse_terms(q))
+
+
+def _fold(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def make_snippet(texts: list[Optional[str]], terms: list[tuple[str, bool]], width: int = 16) -> str:
+    """Window of about `width` words around the first matching term, with
+    matches wrapped in <b></b>.
+
+    Built in Python from the page's rows: FTS5's snippet() re-tokenizes every
+    candidate document and would cost milliseconds per row.
+    """
+    folded = [(_fold(term), prefix) for term, prefix in terms]
+
+    def matches(word: str) -> bool:
+        w = _fold(word)
+        return any(w.startswith(t) if prefix else w == t for t, prefix in folded)
+
+    fallback = None
+    for text in texts:
+        if not text:
+            continue
+        words = text.split()
+        fallback = fallback or words
+        # Only the first hit places the window
+        first = next((i for i, word in enumerate(words) if any(matches(t) for t in re.findall(TOKEN_PATTERN, word))), None)
+        if first is None:
+            continue
+        start = max(0, first - width // 4)
+        window = words[start:start + width]
+        out = []
+        for word in window:
+            parts = re.split(f"({TOKEN_PATTERN})", word)
+            out.append("".join(f"<b>{p}</b>" if i % 2 and matches(p) else p for i, p in enumerate(parts)))
+        return ("…" if start > 0 else "") + " ".join(out) + ("…" if start + width < len(words) else "")
+    if fallback:
+        return " ".join(fallback[:width]) + ("…" if len(fallback) > width else "")
+    return ""
+
+
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    return bool(fts_shards(conn))
+
+
+def _encode_cursor(top: int, rank: float, rowid: int) -> str:
+    return f"{top}:{rank!r}:{rowid}"
+
+
+def _decode_cursor(cursor: str) -> tuple[int, float, int]:
+    top, rank, rowid = cursor.split(":")
+    return int(top), float(rank), int(rowid)
+
+
+def _ranked_window(conn: sqlite3.Connection, match: str, top: int, shards: list[int]) -> tuple[list[tuple[float, int]], Optional[int]]:
+    """(rank, rowid) of the SEARCH_WINDOW newest matches with rowid <= top in
+    top's shard, best first, and the top of the next (older) window, None
+    after the last."""
+    shard = (top - 1) // FTS_SHARD_ROWS
+    rows = []
+    if shard in shards:
+        rows = conn.execute(
+            f"SELECT rank, rowid FROM reviews_fts_{shard} WHERE reviews_fts_{shard} MATCH ? AND rowid <= ? "
+            "ORDER BY rowid DESC LIMIT ?",
+            (match, top, SEARCH_WINDOW + 1),
+        ).fetchall()
+    if len(rows) > SEARCH_WINDOW:
+        next_top = rows[SEARCH_WINDOW][1]
+        del rows[SEARCH_WINDOW:]
+    else:
+        older = [s for s in shards if s < shard]
+        next_top = (older[-1] + 1) * FTS_SHARD_ROWS if older else None
+    rows.sort()
+    return rows, next_top
+
+
+def search_reviews(conn: sqlite3.Connection, q: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+    """Return one page of reviews matching q, best bm25 first within each
+    window of newer matches (see the module docstring).
+
+    Raises ValueError for an empty query or a malformed cursor.
+    """
+    terms = _parse_terms(q)
+    match = build_match_query(q)
+    if not match:
+        raise ValueError("Empty search query")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    shards = fts_shards(conn)
+    if cursor:
+        try:
+            top, last_rank, last_rowid = _decode_cursor(cursor)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        after = (last_rank, last_rowid)
+    else:
+        top = (shards[-1] + 1) * FTS_SHARD_ROWS if shards else None
+        after = None
+
+    # (window top, rank, rowid) of the page, then whether more matches follow
+    page = []
+    more = False
+    while top is not None:
+        ranked, next_top = _ranked_window(conn, match, top, shards)
+        if not cursor and not page and ranked:
+            # Pin the first window, so reviews added meanwhile don't shift it
+            top = max(rowid for _, rowid in ranked)
+        start = bisect.bisect_right(ranked, after) if after else 0
+        taken = ranked[start:start + limit - len(page)]
+        page += [(top, rank, rowid) for rank, rowid in taken]
+        if start + len(taken) < len(ranked):
+            more = True
+            break
+        if next_top is None:
+            break
+        if len(page) == limit:
+            more = True
+            break
+        top, after = next_top, None
+
+    # Rank first, then fetch row data for the page only
+    ids = [rowid for _, _, rowid in page]
+    rows = conn.execute(
+        f"""
+        SELECT id, link, title, stars, date_posted, recommendation, review_descr, review_plus, review_minus
+        FROM reviews WHERE id IN ({', '.join('?' for _ in ids)})
+        """,
+        ids,
+    ).fetchall()
+    by_id = {row[0]: row for row in rows}
+    results = []
+    for _, rank, rowid in page:
+        if rowid not in by_id:
+            continue
+        rid, link, title, stars, date_posted, recommendation, descr, plus, minus = by_id[rowid]
+        results.append(
+            {
+                "id": rid,
+                "link": link,
+                "title": title,
+                "stars": stars,
+                "date_posted": date_posted,
+                "recommendation": bool(recommendation),
+                "score": -rank,
+                "snippet": make_snippet([descr, plus, minus, title], terms),
+            }
+        )
+    next_cursor = _encode_cursor(*page[-1]) if more else None
+    return {"query": match, "results": results, "next_cursor": next_cursor}
+
+
+def browse_reviews(
+    conn: sqlite3.Connection,
+    stars: Optional[list[int]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    recommendation: Optional[bool] = None,
+    min_likes: Optional[int] = None,
+    sort: str = "date_posted",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_text: bool = False,
+) -> dict:
+    """Return one page of reviews matching the filters.
+
+    Raises ValueError for an unsupported sort/order or a malformed cursor.
+    """
+    if sort not in BROWSE_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported order: {order}")
+    limit = max(1, min(limit, BROWSE_MAX_LIMIT))
+
+    clauses, params = [], []
+    if stars:
+        clauses.append(f"stars IN ({', '.join('?' for _ in stars)})")
+        params += list(stars)
+    if date_from:
+        clauses.append("date_posted >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("date_posted <= ?")
+        params.append(date_to)
+    if recommendation is not None:
+        clauses.append("recommendation = ?")
+        params.append(int(recommendation))
+    if min_likes is not None:
+        clauses.append("likes >= ?")
+        params.append(min_likes)
+    if cursor:
+        try:
+            value, last_id = cursor.rsplit(":", 1)
+            last_id = int(last_id)
+            value = value if sort == "date_posted" else int(value)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        # Row values compare lexicographically and can seek the (sort, ...) index
+        clauses.append(f"({sort}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+        params += [value, last_id]
+
+    columns = list(BROWSE_COLUMNS) + (list(BROWSE_TEXT_COLUMNS) if include_text else [])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    direction = order.upper()
+    cur = conn.execute(
+        f"""
+        SELECT {', '.join(columns)} FROM reviews INDEXED BY idx_reviews_browse_{sort}
+        {where}
+        ORDER BY {sort} {direction}, id {direction}
+        LIMIT ?
+        """,
+        (*params, limit + 1),
+    )
+    rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+    for row in rows:
+        row["recommendation"] = bool(row["recommendation"])
+    page = rows[:limit]
+    next_cursor = f"{page[-1][sort]}:{page[-1]['id']}" if len(rows) > limit else None
+    return {"results": page, "next_cursor": next_cursor}
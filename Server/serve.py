@@ -1,35 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import math
 import os
 import signal
-import subprocess
 import sys
 import threading
 import time
-from collections import deque
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import sqlite3
 import re
 from collections import Counter
-import plotly.graph_objects as go
 import plotly.io as pio
 
-# --- Logging buffer capturing ---
-# We maintain a global ring buffer with recent stdout/stderr lines from both the
-# server and any background scraper subprocess we start.
+from L2.lemmas import lemmatize
+from L2.sketches import open_sketches
+from L2.tfidf import open_index as open_tfidf_index, select_ids as select_review_ids
+from L2.tokens import tokenize
+from Server.downsample import BINNINGS, rebin
+from Server.payloads import chart_response, figure_json, negotiate
+from Server.control import ACTIVE_STATUSES, ControlStore
+from Server.analytics import GRANULARITIES, NUMERIC_COLUMNS, TOP_COLUMNS, open_engine
+from Server.reviews import browse_reviews, has_search_index, search_reviews
+
+# --- Shared state ---
+# Logs, crawl jobs and the last organized DB live in a SQLite control file
+# (see Server/control.py) so that every uvicorn worker sees the same state.
+# SERVER_STATE_DB points all workers at the same file.
 LOG_BUFFER_MAX_LINES = 2000
-_log_buffer = deque(maxlen=LOG_BUFFER_MAX_LINES)
-_log_lock = threading.Lock()
+STATE_DB = Path(os.environ.get("SERVER_STATE_DB") or Path(__file__).resolve().parents[1] / "data" / "server_state.db")
+STATE_DB.parent.mkdir(parents=True, exist_ok=True)
+# Compressed, rotated log history searched by GET /logs (Server/logstore.py)
+LOG_DIR = Path(os.environ.get("SERVER_LOG_DIR") or STATE_DB.with_suffix(".logs"))
+LOG_SEARCH_MAX_LINES = 10000
+_state = ControlStore(STATE_DB, LOG_BUFFER_MAX_LINES, LOG_DIR)
 
 
-def _append_log(line: str) -> None:
-    with _log_lock:
-        _log_buffer.append(line.rstrip("\n"))
+def _append_log(line: str, job_id: Optional[str] = None) -> None:
+    _state.append_log(line.rstrip("\n"), job_id)
 
 
 # Mirror the server's own stdout prints into the buffer
@@ -74,27 +93,59 @@ if not isinstance(sys.stderr, _StdoutInterceptor):
 
 
 # --- Scraper process management ---
-_scraper_proc: Optional[subprocess.Popen] = None
-_scraper_reader_thread: Optional[threading.Thread] = None
-_scraper_lock = threading.Lock()
+# Several crawl subprocesses (one per product URL) may run at once. They share
+# a global budget of scrapy concurrent requests and all write into the same
+# intermediate dataset directory; each keeps its own log and status. The job
+# rows are shared by all workers; the worker that spawned a crawl keeps its
+# process handle here, reads its output and records its exit.
+MAX_CRAWL_JOBS = int(os.environ.get("MAX_CRAWL_JOBS", "4"))
+CRAWL_CONCURRENCY_BUDGET = int(os.environ.get("CRAWL_CONCURRENCY_BUDGET", "8"))
 
-# Last organized DB path cached for reuse (charts)
-_last_db_path: Optional[Path] = None
+# Watcher tasks of the crawls spawned by this worker (asyncio keeps only weak references)
+_watchers: dict[str, asyncio.Task] = {}
 
 
-def _reader_target(pipe, proc_desc: str):
+def _describe(job: dict) -> dict:
+    return {k: job[k] for k in ("job_id", "product_url", "pid", "status", "concurrent_requests", "started_at")}
+
+
+async def _read_output(stream: asyncio.StreamReader, proc_desc: str, job_id: Optional[str] = None):
     try:
-        for raw in iter(pipe.readline, ""):
-            if not raw:
-                break
-            _append_log(f"[{proc_desc}] {raw.rstrip()}" )
+        async for raw in stream:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            _append_log(f"[{proc_desc}] {line}", job_id)
     except Exception as e:
         _append_log(f"[server] log reader error: {e}")
-    finally:
-        try:
-            pipe.close()
-        except Exception:
-            pass
+
+
+async def _watch_job(job_id: str, proc: asyncio.subprocess.Process):
+    """Stream a crawl's output into the shared log and record how it ended."""
+    if proc.stdout is not None:
+        await _read_output(proc.stdout, f"scraper:{job_id}", job_id)
+    code = await proc.wait()
+    _watchers.pop(job_id, None)
+    job = await _run_blocking(_query_executor, _state.job, job_id)
+    if job is not None and job["stopped"]:
+        status = "stopped"
+    else:
+        status = "finished" if code == 0 else f"failed ({code})"
+    await _run_blocking(_query_executor, _state.update_job, job_id, status=status)
+
+
+# --- Blocking work ---
+# Handlers are async and never block the event loop, so /stdout polling stays
+# responsive while charts are computed. DB queries, control store calls
+# included (they can wait on another worker's write lock), run on a small thread pool;
+# NLP (natasha, TF-IDF) and organize runs, which take seconds to minutes, get
+# their own pool so they cannot occupy every query worker.
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "4"))
+HEAVY_WORKERS = int(os.environ.get("HEAVY_WORKERS", "1"))
+_query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+_heavy_executor = ThreadPoolExecutor(max_workers=HEAVY_WORKERS, thread_name_prefix="heavy")
+
+
+async def _run_blocking(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
 
 
 # --- FastAPI app ---
@@ -106,128 +157,232 @@ allow_origins=["http://localhost:3000"], # Specify allowed origins
 allow_credentials=True,
 allow_methods=["*"], # Allow all HTTP methods, including OPTIONS
 allow_headers=["*"], # Allow all headers
+expose_headers=["X-Chart-Meta"], # Scalar fields of Arrow chart payloads
 )
+# Compresses JSON chart payloads and figures; small responses are sent as is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 class StartScrapingRequest(BaseModel):
     intermediate_dir: str = Field(..., description="Directory path for intermediate dataset (JSON files will be written here)")
+    product_url: Optional[str] = Field(None, description="otzovik product review listing to crawl (defaults to the spider's base_url)")
+    concurrent_requests: Optional[int] = Field(None, ge=1, description="Share of the global concurrency budget for this crawl")
 
 
 class StartScrapingResponse(BaseModel):
     status: str
     pid: Optional[int] = None
+    job_id: Optional[str] = None
     message: Optional[str] = None
 
 
+class StopScrapingRequest(BaseModel):
+    job_id: Optional[str] = Field(None, description="Crawl job to stop; all running jobs are stopped when omitted")
+
+
 class StopScrapingResponse(BaseModel):
     status: str
+    stopped: list[str] = []
     message: Optional[str] = None
 
 
 class OrganizeRequest(BaseModel):
     input_dir: str = Field(..., description="Path to intermediate dataset directory (with JSON files)")
     output_db: str = Field(..., description="Path to output SQLite database file to create")
+    parquet_dir: Optional[str] = Field(None, description="Also write a partitioned Parquet export into this directory")
+    write_sqlite: bool = Field(True, description="Set to false to produce only the Parquet export")
+    incremental: bool = Field(False, description="Keep an existing DB and only add reviews not in it yet")
 
 
 class OrganizeResponse(BaseModel):
     status: str
     output_db: Optional[str] = None
+    parquet_dir: Optional[str] = None
     message: Optional[str] = None
 
 
 @app.get("/stdout")
-def get_stdout(lines: int = 30):
+async def get_stdout(lines: int = 30, job_id: Optional[str] = None):
     """Return the last N lines from the combined stdout/stderr buffer.
 
     Query params:
     - lines: number of lines to return (default 30, max 2000)
+    - job_id: return only the log of this crawl job (each job keeps its last 2000 lines)
     """
     n = max(0, min(lines, LOG_BUFFER_MAX_LINES))
-    with _log_lock:
-        data = list(_log_buffer)[-n:]
-    return {"stdout": data}
+    if job_id is not None:
+        job = await _run_blocking(_query_executor, _state.job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return {"stdout": await _run_blocking(_query_executor, _state.tail, n, job_id), "job_id": job_id, "status": job["status"]}
+    return {"stdout": await _run_blocking(_query_executor, _state.tail, n)}
+
+
+@app.get("/logs")
+async def get_logs(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    grep: Optional[str] = None,
+    job_id: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+):
+    """Search the whole log history in the order lines were written.
+
+    Every worker writes its lines in blocks of up to a second, so lines of
+    different workers can be out of timestamp order by that much.
 
+    Query params:
+    - since, until: unix timestamps bounding the lines (inclusive)
+    - grep: regular expression the line must match
+    - job_id: only the lines of this crawl job
+    - limit: maximum number of lines (default 1000, max 10000); `truncated`
+      tells whether more lines matched
+    - cursor: `next_cursor` of the previous page (same other params), to
+      continue after it; from the last page it returns the lines written since
+    """
+    try:
+        pattern = re.compile(grep) if grep else None
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid grep pattern: {e}")
+    limit = max(1, min(limit, LOG_SEARCH_MAX_LINES))
+    try:
+        records, truncated, next_cursor = await _run_blocking(
+            _query_executor, _state.search_logs, since, until, pattern, job_id, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "lines": [{"ts": ts, "job_id": line_job, "line": line} for ts, line_job, line in records],
+        "truncated": truncated,
+        "next_cursor": next_cursor,
+    }
 
-@app.post("/start-scraping", response_model=StartScrapingResponse)
-def start_scraping(payload: StartScrapingRequest):
-    global _scraper_proc, _scraper_reader_thread
 
+@app.get("/jobs")
+async def get_jobs():
+    """List all crawl jobs started by this server with their status."""
+    jobs = await _run_blocking(_query_executor, _state.jobs)
+    used = sum(job["concurrent_requests"] for job in jobs if job["status"] in ACTIVE_STATUSES)
+    return {"jobs": [_describe(job) for job in jobs], "concurrency_budget": CRAWL_CONCURRENCY_BUDGET, "concurrency_used": used}
+
+
+@app.post("/start-scraping", response_model=StartScrapingResponse)
+async def start_scraping(payload: StartScrapingRequest):
     intermediate_dir = Path(payload.intermediate_dir).expanduser().resolve()
     intermediate_dir.mkdir(parents=True, exist_ok=True)
 
-    with _scraper_lock:
-        if _scraper_proc and _scraper_proc.poll() is None:
-            return StartScrapingResponse(status="already_running", pid=_scraper_proc.pid)
-
-        # Build environment with target dataset directory for the spider
-        env = os.environ.copy()
-        if not env.__contains__("INTERMEDIATE_DATASET_DIR") or env["INTERMEDIATE_DATASET_DIR"] is None:
-            env["INTERMEDIATE_DATASET_DIR"] = str(intermediate_dir)
-            _append_log(f"[server] using INTERMEDIATE_DATASET_DIR={intermediate_dir} for scraper")
-
-        # Launch the downloader as a subprocess, capturing stdout+stderr
-        cmd = [sys.executable, str(Path(__file__).resolve().parents[1] / "L1" / "download_reviews.py")]
-        _append_log(f"[server] starting scraper: {' '.join(cmd)} with INTERMEDIATE_DATASET_DIR={intermediate_dir}")
-        proc = subprocess.Popen(
-            cmd,
+    job_id = uuid.uuid4().hex[:8]
+    outcome, result = await _run_blocking(
+        _query_executor,
+        _state.reserve_job,
+        job_id,
+        payload.product_url,
+        payload.concurrent_requests,
+        MAX_CRAWL_JOBS,
+        CRAWL_CONCURRENCY_BUDGET,
+    )
+    if outcome == "already_running":
+        return StartScrapingResponse(status="already_running", pid=result["pid"], job_id=result["job_id"])
+    if outcome == "rejected":
+        return StartScrapingResponse(status="rejected", message=result)
+    concurrent_requests = result["concurrent_requests"]
+
+    # Build environment with target dataset directory for the spider
+    env = os.environ.copy()
+    if not env.__contains__("INTERMEDIATE_DATASET_DIR") or env["INTERMEDIATE_DATASET_DIR"] is None:
+        env["INTERMEDIATE_DATASET_DIR"] = str(intermediate_dir)
+        _append_log(f"[server] using INTERMEDIATE_DATASET_DIR={intermediate_dir} for scraper")
+
+    # Launch the downloader as a subprocess, capturing stdout+stderr
+    cmd = [sys.executable, str(Path(__file__).resolve().parents[1] / "L1" / "download_reviews.py")]
+    if payload.product_url:
+        cmd.append(payload.product_url)
+    cmd += ["--concurrent-requests", str(concurrent_requests)]
+    _append_log(f"[server] starting scraper job {job_id}: {' '.join(cmd)} with INTERMEDIATE_DATASET_DIR={env['INTERMEDIATE_DATASET_DIR']}")
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
             cwd=str(Path(__file__).resolve().parents[1]),  # project root
             env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
         )
-        _scraper_proc = proc
-
-        # Start reader thread
-        if proc.stdout is not None:
-            t = threading.Thread(target=_reader_target, args=(proc.stdout, "scraper"), daemon=True)
-            t.start()
-            _scraper_reader_thread = t
-        else:
-            _scraper_reader_thread = None
+    except Exception as e:
+        await _run_blocking(_query_executor, _state.update_job, job_id, status="failed (spawn)")
+        raise HTTPException(status_code=500, detail=f"Failed to start scraper: {e}")
+    await _run_blocking(_query_executor, _state.update_job, job_id, pid=proc.pid, status="running")
+    _watchers[job_id] = asyncio.create_task(_watch_job(job_id, proc))
 
-        return StartScrapingResponse(status="started", pid=proc.pid)
+    return StartScrapingResponse(status="started", pid=proc.pid, job_id=job_id)
 
 
 @app.post("/stop-scraping", response_model=StopScrapingResponse)
-def stop_scraping():
-    global _scraper_proc
-
-    with _scraper_lock:
-        if _scraper_proc is None or _scraper_proc.poll() is not None:
-            return StopScrapingResponse(status="not_running", message="No active scraper process")
-
-        proc = _scraper_proc
-        _append_log(f"[server] stopping scraper pid={proc.pid}")
+async def stop_scraping(payload: Optional[StopScrapingRequest] = None):
+    job_id = payload.job_id if payload is not None else None
+
+    running = await _run_blocking(_query_executor, _state.running_jobs)
+    if job_id is not None:
+        if await _run_blocking(_query_executor, _state.job, job_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        targets = [job for job in running if job["job_id"] == job_id]
+    else:
+        targets = running
+    # Jobs still being spawned have no pid to signal yet
+    targets = [job for job in targets if job["pid"] is not None]
+    if not targets:
+        return StopScrapingResponse(status="not_running", message="No active scraper process")
+
+    for job in targets:
+        _append_log(f"[server] stopping scraper job {job['job_id']} pid={job['pid']}")
+        await _run_blocking(_query_executor, _state.update_job, job["job_id"], stopped=1)
         try:
-            proc.terminate()
+            os.kill(job["pid"], signal.SIGTERM)
+        except ProcessLookupError:
+            pass
         except Exception as e:
             _append_log(f"[server] terminate error: {e}")
-        
-        # Wait up to 10 seconds, then kill
-        try:
-            proc.wait(timeout=10)
-        except subprocess.TimeoutExpired:
-            _append_log(f"[server] scraper did not exit, sending SIGKILL")
-            try:
-                proc.kill()
-            except Exception as e:
-                _append_log(f"[server] kill error: {e}")
-            try:
-                proc.wait(timeout=5)
-            except Exception:
-                pass
 
-        status = "stopped"
-        if proc.poll() is None:
+    # Wait up to 10 seconds in total, then kill
+    await asyncio.gather(*(_wait_or_kill(job, 10) for job in targets))
+
+    status = "stopped"
+    for job in targets:
+        if await _job_running(job["job_id"]):
             status = "failed_to_stop"
-        _scraper_proc = None
-        return StopScrapingResponse(status=status)
+    return StopScrapingResponse(status=status, stopped=[job["job_id"] for job in targets])
+
+
+async def _job_running(job_id: str) -> bool:
+    job = await _run_blocking(_query_executor, _state.job, job_id)
+    return job is not None and job["status"] in ACTIVE_STATUSES
+
+
+async def _wait_for_exit(job_id: str, timeout: float) -> bool:
+    # The owning worker (maybe another process) records the exit in the job row
+    deadline = time.monotonic() + timeout
+    while await _job_running(job_id):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.1)
+    return True
+
+
+async def _wait_or_kill(job: dict, timeout: float):
+    if await _wait_for_exit(job["job_id"], timeout):
+        return
+    _append_log(f"[server] scraper job {job['job_id']} did not exit, sending SIGKILL")
+    try:
+        os.kill(job["pid"], signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    except Exception as e:
+        _append_log(f"[server] kill error: {e}")
+    await _wait_for_exit(job["job_id"], 5)
 
 
 @app.post("/organize", response_model=OrganizeResponse)
-def organize(payload: OrganizeRequest):
+async def organize(payload: OrganizeRequest):
     # Defer import to avoid loading scraper deps for this endpoint
     try:
         from L2.organize_dataset import organize as organize_fn
@@ -249,28 +404,45 @@ def organize(payload: OrganizeRequest):
     if not input_dir.exists() or not input_dir.is_dir():
         raise HTTPException(status_code=400, detail=f"input_dir does not exist or is not a directory: {input_dir}")
 
+    parquet_dir = Path(payload.parquet_dir).expanduser().resolve() if payload.parquet_dir else None
+    if not payload.write_sqlite and parquet_dir is None:
+        raise HTTPException(status_code=400, detail="parquet_dir is required when write_sqlite is false")
+
     # Ensure parent dir for DB exists
     output_db.parent.mkdir(parents=True, exist_ok=True)
 
-    # Run organize synchronously; it creates/replaces the DB
-    _append_log(f"[server] organizing dataset from {input_dir} into {output_db}")
+    # Run organize off the event loop; the request waits until the DB is created/replaced
+    targets = [str(p) for p in (output_db if payload.write_sqlite else None, parquet_dir) if p is not None]
+    _append_log(f"[server] organizing dataset from {input_dir} into {', '.join(targets)}")
     try:
-        organize_fn(str(input_dir), str(output_db))
+        await _run_blocking(
+            _heavy_executor,
+            organize_fn,
+            str(input_dir),
+            str(output_db),
+            parquet_dir=parquet_dir,
+            write_sqlite=payload.write_sqlite,
+            incremental=payload.incremental,
+        )
     except Exception as e:
         _append_log(f"[server] organize failed: {e}")
         raise HTTPException(status_code=500, detail=f"organize failed: {e}")
 
-    global _last_db_path
-    _last_db_path = output_db
-    return OrganizeResponse(status="ok", output_db=str(output_db))
+    if not payload.write_sqlite:
+        return OrganizeResponse(status="ok", parquet_dir=str(parquet_dir))
+
+    # Remembered for chart requests without a db parameter, by every worker
+    await _run_blocking(_query_executor, _state.set, "last_db_path", str(output_db))
+    return OrganizeResponse(status="ok", output_db=str(output_db), parquet_dir=str(parquet_dir) if parquet_dir else None)
 
 
 def _resolve_db_path(db_param: Optional[str]) -> Path:
     env = os.environ.copy()
     if db_param:
         return Path(db_param).expanduser().resolve()
-    if _last_db_path is not None:
-        return _last_db_path
+    last_db_path = _state.get("last_db_path")
+    if last_db_path is not None:
+        return Path(last_db_path)
     if env.get("REVIEWS_DB"):
         return Path(env["REVIEWS_DB"]).expanduser().resolve()
     # Fallback default next to project root
@@ -284,171 +456,165 @@ def _open_conn(db_path: Path) -> sqlite3.Connection:
 
 
 def _tokenize(text: str) -> list[str]:
-    if not text:
-        return []
-    tokens = re.findall(r"[\w\-]+", text.lower(), flags=re.UNICODE)
-    # simple filter: drop short tokens
-    return [t for t in tokens if len(t) > 2 and not t.isdigit()]
+    return tokenize(text)
 
 
-_RU_STOP = {
-    # minimal RU stopword set; not exhaustive
-    "и","в","во","не","что","он","на","я","с","со","как","а","то","все","она","так","его","но","да","ты","к","у","же","вы","за","бы","по","только","ее","мне","было","вот","от","меня","еще","нет","о","из","ему","теперь","когда","даже","ну","вдруг","ли","если","уже","или","ни","быть","был","него","до","вас","нибудь","опять","уж","вам","ведь","там","потом","себя","ничего","ей","может","они","тут","где","есть","надо","ней","для","мы","тебя","их","чем","была","сам","чтоб","без","будто","чего","раз","тоже","себе","под","будет","ж","тогда","кто","этот","того","потому","этого","какой","совсем","ним","здесь","этом","один","почти","мой","тем","чтобы","нее","кажется","сейчас","были","куда","зачем","всех","никогда","можно","при","наконец","два","об","другой","хоть","после","над","больше","тот","через","эти","нас","про","всего","них","какая","много","разве","три","эту","моя","впрочем","хорошо","свою","этой","перед","иногда","лучше","чуть","том","нельзя","такой","им","более","всегда","конечно","всю","между"
-}
+def _preprocess_text_natasha(text: str) -> list[str]:
+    return lemmatize(text)
+
 
-# Lazy NLP components
-_nlp_loaded = False
-_segmenter = None
-_morph_vocab = None
-_morph_tagger = None
-_ru_stopwords = None
+def _build_bar_figure(labels: list[str], values: list[float], title: str = "Histogram", orientation: str = "v") -> dict:
+    if orientation == "h":
+        return figure_json("bar", labels, values, title, x_title="Count", orientation="h")
+    return figure_json("bar", labels, values, title, y_title="Count")
 
 
-def _ensure_nlp():
-    global _nlp_loaded, _segmenter, _morph_vocab, _morph_tagger, _ru_stopwords
-    if _nlp_loaded:
-        return
+def _build_line_figure(labels: list[str], values: list[float], title: str = "Time series", y_title: str = "Count") -> dict:
+    return figure_json("line", labels, values, title, y_title=y_title)
+
+
+def _encode_chart(payload: dict, fmt: str, request: Request) -> Response:
     try:
-        import natasha as nlp
-        _segmenter = nlp.Segmenter()
-        _morph_vocab = nlp.MorphVocab()
-        emb = nlp.NewsEmbedding()
-        _morph_tagger = nlp.NewsMorphTagger(emb)
-    except Exception as e:
-        _append_log(f"[server] natasha load failed: {e}")
-        _segmenter = _morph_vocab = _morph_tagger = None
-    # Stopwords via NLTK with fallback
+        return chart_response(payload, negotiate(fmt, request.headers.get("accept")))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _open_engine(db: Optional[str], parquet: Optional[str], engine: Optional[str], dedupe: bool = False):
+    parquet_dir = Path(parquet).expanduser().resolve() if parquet else None
+    db_path = None if parquet_dir is not None else _resolve_db_path(db)
     try:
-        import nltk
-        from nltk.corpus import stopwords
-        try:
-            _ru_stopwords = set(stopwords.words('russian'))
-        except LookupError:
-            nltk.download('stopwords', quiet=True)
-            _ru_stopwords = set(stopwords.words('russian'))
+        return open_engine(db_path=db_path, parquet_dir=parquet_dir, engine=engine, dedupe=dedupe)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        _append_log(f"[server] nltk stopwords failed: {e}")
-        _ru_stopwords = set(_RU_STOP)
-    _nlp_loaded = True
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-def _preprocess_text_natasha(text: str) -> list[str]:
-    """Lemmatize Russian text using natasha, filter stopwords/punct/numbers.
-    Falls back to simple regex tokenization if natasha unavailable.
-    """
-    if not text:
-        return []
-    _ensure_nlp()
-    import string
-    tokens = re.findall(r"[\w\-]+", text.lower(), flags=re.UNICODE)
-    if _segmenter is not None and _morph_tagger is not None and _morph_vocab is not None:
-        try:
-            import natasha as nlp
-            doc = nlp.Doc(" ".join(tokens))
-            doc.segment(_segmenter)
-            doc.tag_morph(_morph_tagger)
-            for t in list(getattr(doc, 'tokens', []) or []):
-                t.lemmatize(_morph_vocab)
-            lemmas = [t.lemma for t in list(getattr(doc, 'tokens', []) or [])]
-        except Exception as e:
-            _append_log(f"[server] natasha processing failed, fallback: {e}")
-            lemmas = tokens
-    else:
-        lemmas = tokens
-    # Filters
-    punct = set(string.punctuation).union({"«","»","—","–","...","``","''","`","'","„","“","”"})
-    sw = _ru_stopwords or set(_RU_STOP)
-    result = []
-    for lemma in lemmas:
-        if not lemma or lemma in sw:
-            continue
-        if lemma.isdigit() or len(lemma) <= 2:
-            continue
-        if lemma in punct:
-            continue
-        result.append(lemma)
-    return result
-
-
-def _build_bar_figure(labels: list[str], values: list[float], title: str = "Histogram", orientation: str = "v"):
-    if orientation == "h":
-        bar = go.Bar(x=values, y=labels, orientation='h')
-        layout = go.Layout(title=title, xaxis_title="Count", yaxis_title="")
-    else:
-        bar = go.Bar(x=labels, y=values)
-        layout = go.Layout(title=title, xaxis_title="", yaxis_title="Count")
-    fig = go.Figure(data=[bar], layout=layout)
-    return fig
+# Histogram kinds that lemmatize reviews
+_NLP_KINDS = ("word_freq", "distinctive_terms")
+
+
+# Bars of any histogram payload, whatever max_bars the client asks for
+CHART_MAX_BARS = 500
 
 
 @app.get("/charts/histogram")
-def get_histogram(kind: str, db: Optional[str] = None, text_field: str = "review_descr", bins: int = 20, top_n: int = 30, fmt: str = "json"): 
+async def get_histogram(request: Request, kind: str, db: Optional[str] = None, text_field: str = "review_descr", bins: int = 20, top_n: int = 30, fmt: str = "json", column: str = "year_usage", parquet: Optional[str] = None, engine: Optional[str] = None, dedupe: bool = False, stars: Optional[list[int]] = Query(None), start: Optional[str] = None, end: Optional[str] = None, max_bars: Optional[int] = None, binning: str = "auto", approx: bool = False): 
     """
     Return histogram data for the specified kind.
-    kind: one of [token_count, stars, likes, comments, year_usage, word_freq]
+    kind: one of [token_count, stars, likes, comments, year_usage, word_freq, top_values, distinctive_terms]
+    max_bars: bar budget of the client's chart (e.g. its width over the
+        narrowest readable bar); caps bins and top_n, and token_count values
+        are merged into at most this many bins (default and max 500)
+    binning: auto, linear, log or quantile bins for numeric kinds and
+        token_count (see Server/downsample.py); auto uses log bins for
+        long-tailed distributions such as likes/comments
+    approx: answer numeric kinds, token_count and word_freq from the corpus
+        sketches kept next to the DB (L2/sketches.py) instead of the reviews;
+        the payload then carries an `error` bound
+    column: column whose most common values top_values returns
+    parquet: read a Parquet export instead of the DB (duckdb engine only)
+    engine: analytics engine, duckdb or sqlite (default ANALYTICS_ENGINE / auto)
+    dedupe: count each near-duplicate cluster of reviews once
+    stars, start, end: reviews whose distinctive_terms are returned (star ratings, inclusive ISO date range)
+    fmt: json, plotly, arrow or msgpack (see Server/payloads.py)
     Returns: { labels: [..], values: [..], kind: str, field?: str }
     """
+    if binning not in BINNINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown binning: {binning}")
+    max_bars = max(1, min(max_bars or CHART_MAX_BARS, CHART_MAX_BARS))
+    bins, top_n = min(bins, max_bars), min(top_n, max_bars)
+    executor = _heavy_executor if kind in _NLP_KINDS else _query_executor
+    if approx:
+        if kind not in _APPROX_KINDS:
+            raise HTTPException(status_code=400, detail=f"approx is not available for {kind}; use one of {', '.join(_APPROX_KINDS)}")
+        if parquet or dedupe:
+            raise HTTPException(status_code=400, detail="approx reads the sketches of a DB; it cannot be combined with parquet or dedupe")
+        payload = await _run_blocking(executor, _approx_histogram_payload, kind, db, text_field, bins, top_n, fmt, max_bars, binning)
+    else:
+        payload = await _run_blocking(executor, _histogram_payload, kind, db, text_field, bins, top_n, fmt, column, parquet, engine, dedupe, stars, start, end, max_bars, binning)
+    return _encode_chart(payload, fmt, request)
+
+
+_APPROX_KINDS = (*NUMERIC_COLUMNS, "token_count", "word_freq")
+
+
+def _approx_histogram_payload(kind: str, db: Optional[str], text_field: str, bins: int, top_n: int, fmt: str, max_bars: int, binning: str) -> dict:
     db_path = _resolve_db_path(db)
+    conn = _open_conn(db_path)
     try:
-        conn = _open_conn(db_path)
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
+        # Summarizes reviews added since the last organize; a no-op when up to date
+        sketches = open_sketches(db_path, conn)
+    finally:
+        conn.close()
+    if text_field not in ("review_descr", "title"):
+        text_field = "review_descr"
+    if kind == "word_freq":
+        terms = sketches.terms[text_field]
+        items = terms.top(max(1, min(200, top_n)))
+        labels = [k for k, _ in items]
+        values = [v for _, v in items]
+        # Counts are lower bounds: the true count is at most `count` higher
+        error = {"count": terms.error, "kind": "undercount", "total": terms.total}
+        title, orientation = f"Word Frequency ({text_field}, approx.)", "h"
+    else:
+        column = kind if kind in NUMERIC_COLUMNS else f"{text_field}_tokens"
+        sketch = sketches.numeric[column]
+        labels, values = rebin(*sketch.distribution(), bins if kind in NUMERIC_COLUMNS else max_bars, binning)
+        # Every bar's count is within +-count of the true one
+        error = {"count": math.ceil(sketch.eps * sketch.n), "kind": "plus_minus", "confidence": 0.99, "total": sketch.n}
+        title, orientation = f"{column.replace('_', ' ').title()} (approx.)", "v"
+    payload = {"kind": kind, "approx": True, "error": error}
+    if kind in ("token_count", "word_freq"):
+        payload["field"] = text_field
+    if fmt == "plotly":
+        return {"figure": _build_bar_figure(labels, values, title=title, orientation=orientation), **payload}
+    return {"labels": labels, "values": values, **payload}
+
+
+def _numeric_bins(eng, column: str, bins: int, binning: str) -> tuple[list[str], list[int]]:
+    if binning != "linear":
+        # auto needs the value counts to choose, so it rebins them whatever it picks
+        values, counts = eng.value_counts(column)
+        return rebin(values, counts, max(bins, 1), binning)
+    # equal-width bins computed in SQL
+    return eng.numeric_histogram(column, bins)
+
+
+def _histogram_payload(kind: str, db: Optional[str], text_field: str, bins: int, top_n: int, fmt: str, column: str, parquet: Optional[str], engine: Optional[str], dedupe: bool, stars: Optional[list[int]], start: Optional[str], end: Optional[str], max_bars: int = CHART_MAX_BARS, binning: str = "auto") -> dict:
+    if kind == "distinctive_terms":
+        return _distinctive_terms(db, top_n, fmt, stars, start, end)
+    eng = _open_engine(db, parquet, engine, dedupe)
     try:
-        cur = conn.cursor()
-        if kind in ("stars", "likes", "comments", "year_usage"):
-            # numeric histogram with simple binning
-            cur.execute(f"SELECT {kind} FROM reviews WHERE {kind} IS NOT NULL")
-            vals = [row[0] for row in cur.fetchall() if isinstance(row[0], (int, float))]
-            if not vals:
-                return {"labels": [], "values": [], "kind": kind}
-            mn, mx = min(vals), max(vals)
-            if bins < 1:
-                bins = 10
-            if mn == mx:
-                labels = [str(mn)]
-                return {"labels": labels, "values": [len(vals)], "kind": kind}
-            width = (mx - mn) / bins
-            # Avoid zero width
-            width = width or 1
-            edges = [mn + i * width for i in range(bins)] + [mx]
-            counts = [0] * bins
-            for v in vals:
-                # find bin index
-                idx = int((v - mn) / width)
-                if idx >= bins:
-                    idx = bins - 1
-                counts[idx] += 1
-            labels = [f"{round(edges[i],2)}–{round(edges[i+1],2)}" for i in range(bins)]
-            if fmt == "plotly":
+        if kind in NUMERIC_COLUMNS:
+            labels, counts = _numeric_bins(eng, kind, bins, binning)
+            if fmt == "plotly" and len(labels) > 1:
                 fig = _build_bar_figure(labels, counts, title=kind.replace('_',' ').title())
-                return {"figure": fig.to_plotly_json(), "kind": kind}
+                return {"figure": fig, "kind": kind}
             return {"labels": labels, "values": counts, "kind": kind}
         elif kind == "token_count": 
             # per-row token count of selected text field
             if text_field not in ("review_descr", "title"):
                 text_field = "review_descr"
-            cur.execute(f"SELECT {text_field} FROM reviews WHERE {text_field} IS NOT NULL")
-            counts = Counter()
-            for (txt,) in cur.fetchall():
-                n = len(_tokenize(txt))
-                counts[n] += 1
-            # Sort by token count ascending
-            items = sorted(counts.items(), key=lambda x: x[0])
-            labels = [str(k) for k, _ in items]
-            values = [v for _, v in items]
+            labels, values = rebin(*eng.token_count_distribution(text_field), max_bars, binning)
             if fmt == "plotly":
                 fig = _build_bar_figure(labels, values, title=f"Token Count ({text_field})")
-                return {"figure": fig.to_plotly_json(), "kind": kind, "field": text_field}
+                return {"figure": fig, "kind": kind, "field": text_field}
             return {"labels": labels, "values": values, "kind": kind, "field": text_field}
+        elif kind == "top_values":
+            if column not in TOP_COLUMNS:
+                raise HTTPException(status_code=400, detail=f"Unsupported column for top_values: {column}")
+            labels, values = eng.top_values(column, max(1, min(200, top_n)))
+            if fmt == "plotly":
+                fig = _build_bar_figure(labels, values, title=f"Top {column.replace('_',' ')}", orientation="h")
+                return {"figure": fig, "kind": kind, "field": column}
+            return {"labels": labels, "values": values, "kind": kind, "field": column}
         elif kind == "word_freq":
             if text_field not in ("review_descr", "title"):
                 text_field = "review_descr"
-            cur.execute(f"SELECT {text_field} FROM reviews WHERE {text_field} IS NOT NULL")
             freq = Counter()
-            for (txt,) in cur.fetchall():
+            for txt in eng.iter_texts(text_field):
                 for lemma in _preprocess_text_natasha(txt):
                     freq[lemma] += 1
             items = freq.most_common(max(1, min(200, top_n)))
@@ -456,23 +622,166 @@ def get_histogram(kind: str, db: Optional[str] = None, text_field: str = "review
             values = [v for _, v in items]
             if fmt == "plotly":
                 fig = _build_bar_figure(labels, values, title=f"Word Frequency ({text_field})", orientation="h")
-                return {"figure": fig.to_plotly_json(), "kind": kind, "field": text_field}
+                return {"figure": fig, "kind": kind, "field": text_field}
             return {"labels": labels, "values": values, "kind": kind, "field": text_field}
         else:
             raise HTTPException(status_code=400, detail=f"Unknown histogram kind: {kind}")
     finally:
+        eng.close()
+
+
+def _distinctive_terms(db: Optional[str], top_n: int, fmt: str, stars: Optional[list[int]], start: Optional[str], end: Optional[str]):
+    for value in (start, end):
+        if value is not None:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    db_path = _resolve_db_path(db)
+    conn = _open_conn(db_path)
+    try:
+        # organize indexes the reviews it adds, so this is a no-op unless the
+        # DB was written by another tool
+        index = open_tfidf_index(db_path, conn)
+        terms = index.distinctive_terms(select_review_ids(conn, stars, start, end), max(1, min(200, top_n)))
+    finally:
+        conn.close()
+    labels = [term for term, _ in terms]
+    values = [round(weight, 4) for _, weight in terms]
+    if fmt == "plotly":
+        fig = _build_bar_figure(labels, values, title="Distinctive Terms (TF-IDF)", orientation="h")
+        return {"figure": fig, "kind": "distinctive_terms"}
+    return {"labels": labels, "values": values, "kind": "distinctive_terms"}
+
+
+_TIMESERIES_METRICS = {"count": 1, "avg_stars": 2, "recommend_rate": 3}
+
+
+@app.get("/charts/timeseries")
+async def get_timeseries(request: Request, granularity: str = "day", metric: str = "count", start: Optional[str] = None, end: Optional[str] = None, db: Optional[str] = None, fmt: str = "json", parquet: Optional[str] = None, engine: Optional[str] = None, dedupe: bool = False):
+    """
+    Reviews over time by date_posted.
+    granularity: one of [day, week, month]; labels are the first day of each period
+    metric: one of [count, avg_stars, recommend_rate]
+    start, end: inclusive ISO date range (YYYY-MM-DD)
+    dedupe: count each near-duplicate cluster of reviews once
+    fmt: json, plotly, arrow or msgpack (see Server/payloads.py)
+    Returns: { labels: [..], values: [..], kind: "timeseries", metric, granularity }
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown granularity: {granularity}")
+    if metric not in _TIMESERIES_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}")
+    for value in (start, end):
+        if value is not None:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+
+    rows = await _run_blocking(_query_executor, _timeseries_rows, db, parquet, engine, dedupe, granularity, start, end)
+    idx = _TIMESERIES_METRICS[metric]
+    labels = [row[0] for row in rows]
+    values = [row[idx] for row in rows]
+    if metric != "count":
+        values = [round(v, 4) if v is not None else None for v in values]
+    if fmt == "plotly":
+        fig = _build_line_figure(labels, values, title=f"{metric.replace('_',' ').title()} per {granularity}", y_title=metric.replace('_',' '))
+        return _encode_chart({"figure": fig, "kind": "timeseries", "metric": metric, "granularity": granularity}, fmt, request)
+    return _encode_chart({"labels": labels, "values": values, "kind": "timeseries", "metric": metric, "granularity": granularity}, fmt, request)
+
+
+def _timeseries_rows(db: Optional[str], parquet: Optional[str], engine: Optional[str], dedupe: bool, granularity: str, start: Optional[str], end: Optional[str]):
+    eng = _open_engine(db, parquet, engine, dedupe)
+    try:
+        return eng.timeseries(granularity, start, end)
+    finally:
+        eng.close()
+
+
+@app.get("/reviews")
+async def list_reviews(
+    stars: Optional[list[int]] = Query(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    recommendation: Optional[bool] = None,
+    min_likes: Optional[int] = None,
+    sort: str = "date_posted",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_text: bool = False,
+    db: Optional[str] = None,
+):
+    """
+    Browse reviews with filters, one page at a time.
+    stars: repeatable, e.g. ?stars=4&stars=5
+    date_from, date_to: inclusive ISO date range of date_posted
+    sort: one of [date_posted, likes, comments, stars]; order: asc or desc
+    cursor: next_cursor of the previous page
+    include_text: also return review_plus, review_minus and review_descr
+    Returns: { results: [...], next_cursor }
+    """
+    for value in (date_from, date_to):
+        if value is not None:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    return await _run_blocking(
+        _query_executor, _browse, db, stars=stars, date_from=date_from, date_to=date_to, recommendation=recommendation,
+        min_likes=min_likes, sort=sort, order=order, limit=limit, cursor=cursor, include_text=include_text,
+    )
+
+
+def _browse(db: Optional[str], **filters) -> dict:
+    conn = _open_conn(_resolve_db_path(db))
+    try:
         try:
-            conn.close()
-        except Exception:
-            pass
+            return browse_reviews(conn, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except sqlite3.OperationalError as e:
+            # DBs organized before the listing indexes existed
+            raise HTTPException(status_code=400, detail=f"{e}; run /organize again")
+    finally:
+        conn.close()
+
+
+@app.get("/reviews/search")
+async def search(q: str, limit: int = 20, cursor: Optional[str] = None, db: Optional[str] = None):
+    """
+    Full-text search over review titles and texts, best matches first among
+    each window of newer reviews (see Server/reviews.py).
+    q: search terms, all of which must match (Russian word forms are stemmed)
+    limit: page size (max 100)
+    cursor: next_cursor of the previous page
+    Returns: { results: [{id, link, title, stars, date_posted, recommendation, score, snippet}], next_cursor }
+    """
+    return await _run_blocking(_query_executor, _search, q, limit, cursor, db)
+
+
+def _search(q: str, limit: int, cursor: Optional[str], db: Optional[str]) -> dict:
+    conn = _open_conn(_resolve_db_path(db))
+    try:
+        if not has_search_index(conn):
+            raise HTTPException(status_code=400, detail="DB has no full-text index; run /organize again")
+        try:
+            return search_reviews(conn, q, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
 
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok", "message": "Scraper server is running"}
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, port=11001, host="0.0.0.0", reload=False, log_level="warning")
+    # Workers need the app as an import string; state is shared through STATE_DB
+    workers = int(os.environ.get("SERVER_WORKERS", "1"))
+    uvicorn.run("Server.serve:app" if workers > 1 else app, port=11001, host="0.0.0.0", reload=False, log_level="warning", workers=workers)
@@ -0,0 +1,172 @@
+"""Benchmark review_spider's parsing over the frozen pages in spds/fixtures/.
+
+Usage:
+    python -m spds.bench_parser [--repeat 10] [--save-baseline]
+    python -m spds.bench_parser --baseline spds/fixtures/baseline.json --threshold 0.2
+
+Every parse gets a freshly built HtmlResponse, as scrapy hands the callbacks
+one per download, so selector construction is part of the measured time.
+Reports pages/s of parse_review and parse_page, the time of every field
+extractor in REVIEW_FIELDS, and the tracemalloc peak per page (measured in
+a separate pass so tracing does not slow the timed runs). With --baseline
+the run exits 1 if a throughput falls more than --threshold below it.
+Regenerate the fixtures with `python -m spds.make_fixtures`.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from spds.make_fixtures import FIXTURES_DIR
+from spds.spiders.rev import REVIEW_FIELDS, extract_table_props, review_spider
+
+DEFAULT_BASELINE = FIXTURES_DIR / "baseline.json"
+
+
+def load_fixtures() -> list[dict]:
+    manifest = json.loads((FIXTURES_DIR / "manifest.json").read_text(encoding="utf-8"))
+    for entry in manifest:
+        with gzip.open(FIXTURES_DIR / entry["file"]) as f:
+            entry["body"] = f.read()
+    return manifest
+
+
+def _response(entry: dict) -> HtmlResponse:
+    return HtmlResponse(url=entry["url"], body=entry["body"], encoding="utf-8")
+
+
+def check(spider, pages: list[dict]) -> int:
+    """Compare parse_review output with the expected fields of synthetic pages."""
+    mismatches = 0
+    for entry in pages:
+        if "expected" not in entry:
+            continue
+        (review,) = spider.parse_review(_response(entry))
+        for field, value in entry["expected"].items():
+            if review.get(field) != value:
+                print(f"  {entry['file']}: {field} = {review.get(field)!r:.60}, expected {value!r:.60}")
+                mismatches += 1
+    return mismatches
+
+
+def pages_per_second(callback, pages: list[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for entry in pages:
+            for _ in callback(_response(entry)):
+                pass
+        best = min(best, time.perf_counter() - start)
+    return len(pages) / best
+
+
+def field_times(pages: list[dict], repeat: int) -> dict[str, float]:
+    """Best total microseconds per page of every field extractor."""
+    fields = {"table_props": extract_table_props, **REVIEW_FIELDS}
+    best = {field: float("inf") for field in fields}
+    for _ in range(repeat):
+        totals = dict.fromkeys(fields, 0.0)
+        for entry in pages:
+            response = _response(entry)
+            start = time.perf_counter()
+            table_props = extract_table_props(response)
+            totals["table_props"] += time.perf_counter() - start
+            for field, extractor in REVIEW_FIELDS.items():
+                start = time.perf_counter()
+                extractor(response, table_props)
+                totals[field] += time.perf_counter() - start
+        for field, total in totals.items():
+            best[field] = min(best[field], total)
+    return {field: total / len(pages) * 1e6 for field, total in best.items()}
+
+
+def peak_allocations(callback, pages: list[dict]) -> float:
+    """Mean tracemalloc peak in KiB of parsing one page, response included."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for entry in pages:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            for _ in callback(_response(entry)):
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024
+
+
+def run(repeat: int) -> dict:
+    spider = review_spider()
+    fixtures = load_fixtures()
+    reviews = [e for e in fixtures if e["kind"] == "review"]
+    listings = [e for e in fixtures if e["kind"] == "listing"]
+
+    mismatches = check(spider, reviews)
+    if mismatches:
+        print(f"{mismatches} fields differ from the fixtures' expected values")
+
+    results = {"pages": {"review": len(reviews), "listing": len(listings)}, "mismatches": mismatches, "throughput": {}, "peak_kib": {}}
+    for name, callback, pages in (("parse_review", spider.parse_review, reviews), ("parse_page", spider.parse_page, listings)):
+        if not pages:
+            continue
+        results["throughput"][name] = pages_per_second(callback, pages, repeat)
+        results["peak_kib"][name] = peak_allocations(callback, pages)
+    if reviews:
+        results["field_us"] = field_times(reviews, repeat)
+    return results
+
+
+def report(results: dict, baseline: dict | None):
+    print(f"pages: {results['pages']['review']} review, {results['pages']['listing']} listing")
+    for name, rate in results["throughput"].items():
+        line = f"  {name:>12}: {rate:8.1f} pages/s  peak {results['peak_kib'][name]:8.1f} KiB/page"
+        if baseline and name in baseline.get("throughput", {}):
+            line += f"  ({rate / baseline['throughput'][name] - 1:+.1%} vs baseline)"
+        print(line)
+    if "field_us" in results:
+        print("per-field extraction (us/page):")
+        for field, us in sorted(results["field_us"].items(), key=lambda kv: -kv[1]):
+            print(f"  {field:>14}: {us:8.1f}")
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    failed = []
+    for name, base in baseline.get("throughput", {}).items():
+        rate = results["throughput"].get(name)
+        if rate is not None and rate < base * (1 - threshold):
+            failed.append(f"{name}: {rate:.1f} pages/s is {1 - rate / base:.1%} below the baseline {base:.1f}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--baseline", default=None, help="Compare with this results file")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), default=None, help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative throughput drop")
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    report(results, baseline)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    failed = regressions(results, baseline, args.threshold) if baseline else []
+    for line in failed:
+        print(f"REGRESSION {line}")
+    if failed or results["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
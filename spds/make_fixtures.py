@@ -0,0 +1,167 @@
+"""Build the frozen otzovik page corpus used by spds/bench_parser.py.
+
+Usage:
+    python -m spds.make_fixtures [--reviews 24] [--listings 4]
+    python -m spds.make_fixtures --from-httpcache httpcache/review_spider
+
+Synthetic pages follow the markup review_spider's selectors expect, with
+review texts from L2/synthetic_corpus.py and page chrome (navigation,
+sidebar, scripts, comments) padding them to the size of real pages.
+--from-httpcache captures real pages from scrapy's FilesystemCacheStorage
+instead. Pages are stored gzipped in spds/fixtures/ with a manifest.json
+listing url, kind ("review" or "listing") and, for synthetic review pages,
+the expected parse result.
+"""
+import argparse
+import gzip
+import html
+import json
+import random
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+PRODUCT_URL = "https://otzovik.com/reviews/online_fashion_shop_wildberries_ru/"
+REVIEWS_PER_LISTING = 20
+
+
+def _chrome(rng: random.Random) -> tuple[str, str]:
+    """Header and footer markup around the page content."""
+    nav = "".join(f'<li><a href="/catalog/{i}/">Раздел {i}</a></li>' for i in range(rng.randint(250, 350)))
+    header = f'<div class="header"><ul class="menu">{nav}</ul><form class="search"><input name="q"></form></div>'
+    scripts = "".join(
+        f"<script>window.dataLayer=window.dataLayer||[];dataLayer.push({{'event':'view','slot':{i}}});</script>"
+        for i in range(rng.randint(60, 90))
+    )
+    footer = f'<div class="footer"><p>© otzovik</p>{scripts}</div>'
+    return header, footer
+
+
+def _sidebar(rng: random.Random) -> str:
+    items = "".join(
+        f'<div class="side-item"><a href="/review_{rng.randint(1, 10**7)}.html">Похожий отзыв {i}</a>'
+        f'<span class="rating">{rng.randint(1, 5)}</span></div>'
+        for i in range(rng.randint(40, 60))
+    )
+    return f'<div class="sidebar">{items}</div>'
+
+
+def _comments(rng: random.Random, text) -> str:
+    return "".join(
+        f'<div class="comment"><span class="author">user{rng.randint(1, 9999)}</span><p>{html.escape(text(rng, rng.randint(5, 30)))}</p></div>'
+        for _ in range(rng.randint(0, 8))
+    )
+
+
+def review_page(review: dict, rng: random.Random, text) -> str:
+    """HTML of a review page that review_spider.parse_review parses to `review`."""
+    e = html.escape
+    header, footer = _chrome(rng)
+    descr = "<br>".join(e(part) for part in review["review_descr"].split("\n"))
+    props = [("Год пользования услугами", review["year_usage"]), ("Стоимость", review["price"]), ("Рекомендую друзьям", review["recommendation"])]
+    table = "".join(f"<tr><td>{e(k)}</td><td>{e(v)}</td></tr>" for k, v in props if v)
+    owning = f'<span class="owning-time">{e(review["time_usage"])}</span>' if review["time_usage"] else ""
+    # The stars selector is a positional path from body > div:nth-of-type(2);
+    # keep this nesting intact
+    stars = (
+        '<div><div class="review-author"></div>'
+        f'<div><div><div class="rating-score"><span>{e(review["stars"])}</span></div></div></div></div>'
+    )
+    content = (
+        f'<div class="item-right"><h1><span class="summary">{e(review["title"])}</span></h1>'
+        f'<span class="review-postdate dtreviewed"><span>{e(review["date_posted"])}</span></span>{owning}'
+        f'<div class="review-plus"><b>Достоинства:</b>{e(review["review_plus"])}</div>'
+        f'<div class="review-minus"><b>Недостатки:</b>{e(review["review_minus"])}</div>'
+        f'<div class="review-body description" itemprop="description">{descr}</div>'
+        f"<table>{table}</table>"
+        f'<span class="review-btn review-yes tooltip-top"><span>{e(review["likes"])}</span></span>'
+        f'<a class="review-btn review-comments tooltip-top" href="#comments"><span>{e(review["comments"])}</span></a>'
+        f'<div class="comments">{_comments(rng, text)}</div></div>'
+    )
+    page = (
+        "<div><div><div><div>"
+        '<div class="breadcrumbs"></div><div class="product"></div><div class="tabs"></div>'
+        f"<div><div>{stars}{content}</div></div>"
+        f"{_sidebar(rng)}"
+        "</div></div></div></div>"
+    )
+    return f"<!DOCTYPE html><html><head><title>{e(review['title'])}</title></head><body>{header}<div>{page}</div>{footer}</body></html>"
+
+
+def listing_page(review_paths: list[str], last_page: int, rng: random.Random) -> str:
+    header, footer = _chrome(rng)
+    items = "".join(
+        f'<div class="item" itemprop="review"><a class="review-title" href="{path}">Отзыв</a>'
+        f'<div class="review-teaser">...</div></div>'
+        for path in review_paths
+    )
+    pager = "".join(f'<a class="pager-item" href="{PRODUCT_URL[len("https://otzovik.com"):]}{i}/">{i}</a>' for i in range(1, 6))
+    pager += f'<a class="pager-item last" href="{PRODUCT_URL[len("https://otzovik.com"):]}{last_page}/">{last_page}</a>'
+    return f"<!DOCTYPE html><html><head></head><body>{header}<div>{items}<div class='pager'>{pager}</div>{_sidebar(rng)}</div>{footer}</body></html>"
+
+
+def _write(name: str, body: bytes):
+    with gzip.open(FIXTURES_DIR / name, "wb", compresslevel=9) as f:
+        f.write(body)
+
+
+def build_synthetic(n_reviews: int, n_listings: int, seed: int = 0) -> list[dict]:
+    from L2.synthetic_corpus import _text, generate_review
+
+    rng = random.Random(seed)
+    manifest = []
+    paths = []
+    for i in range(n_reviews):
+        review = generate_review(rng)
+        # The spider turns <br> into newlines; the generator has no line breaks
+        review["review_descr"] = review["review_descr"].replace(". ", ".\n", 2)
+        review_id = f"review_{9000000 + i}"
+        paths.append(f"/{review_id}.html")
+        name = f"{review_id}.html.gz"
+        _write(name, review_page(review, rng, _text).encode("utf-8"))
+        manifest.append({"file": name, "url": f"https://otzovik.com/{review_id}.html", "kind": "review", "expected": {**review, "review_id": review_id}})
+    for page in range(1, n_listings + 1):
+        name = f"listing_{page}.html.gz"
+        page_paths = [paths[(page * 7 + k) % len(paths)] for k in range(REVIEWS_PER_LISTING)]
+        _write(name, listing_page(page_paths, 57, rng).encode("utf-8"))
+        manifest.append({"file": name, "url": f"{PRODUCT_URL}{page}/", "kind": "listing"})
+    return manifest
+
+
+def build_from_httpcache(cache_dir: Path) -> list[dict]:
+    """Capture cached responses (FilesystemCacheStorage: <fp>/meta, <fp>/response_body)."""
+    import ast
+
+    manifest = []
+    for meta_path in sorted(Path(cache_dir).glob("*/*/meta")):
+        meta = ast.literal_eval(meta_path.read_text(encoding="utf-8"))
+        url = meta["url"]
+        if meta.get("status") != 200:
+            continue
+        kind = "review" if "/review_" in url else "listing"
+        name = f"{kind}_{meta_path.parent.name[:12]}.html.gz"
+        _write(name, (meta_path.parent / "response_body").read_bytes())
+        manifest.append({"file": name, "url": url, "kind": kind})
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=24)
+    parser.add_argument("--listings", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-httpcache", default=None, help="Capture pages from this scrapy httpcache spider dir")
+    args = parser.parse_args()
+
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    for old in FIXTURES_DIR.glob("*.html.gz"):
+        old.unlink()
+    if args.from_httpcache:
+        manifest = build_from_httpcache(Path(args.from_httpcache))
+    else:
+        manifest = build_synthetic(args.reviews, args.listings, args.seed)
+    (FIXTURES_DIR / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"wrote {len(manifest)} pages into {FIXTURES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
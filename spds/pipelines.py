@@ -7,7 +7,40 @@
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+import json
+import os
+import tempfile
+
 
 class SpdsPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class IntermediateJsonPipeline:
+    """Write every scraped review to <INTERMEDIATE_DATASET_DIR>/<review_id>.json.
+
+    Several crawl processes may share the same directory, so files are written
+    to a temporary name and atomically renamed, and reviews already present on
+    disk (from this or any other crawl) are skipped.
+    """
+
+    def open_spider(self, spider):
+        self.data_dir = os.environ.get("INTERMEDIATE_DATASET_DIR", "intermediate_dataset")
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.downloaded = {x.split(".")[0] for x in os.listdir(self.data_dir)}
+
+    def process_item(self, item, spider):
+        review = dict(ItemAdapter(item))
+        review_id = review.pop("review_id")
+        target = os.path.join(self.data_dir, f"{review_id}.json")
+        if review_id in self.downloaded or os.path.exists(target):
+            self.downloaded.add(review_id)
+            return item
+        spider.logger.debug("Saving review %s", review_id)
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=f".{review_id}.", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(review, ensure_ascii=False, indent=2))
+        os.replace(tmp_path, target)
+        self.downloaded.add(review_id)
+        return item
@@ -96,9 +96,9 @@ USERAGENT_PROVIDERS = [
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    "spds.pipelines.SpdsPipeline": 300,
-# }
+ITEM_PIPELINES = {
+   "spds.pipelines.IntermediateJsonPipeline": 300,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -0,0 +1,69 @@
+"""count_tokens() must agree with tokenize(), including on non-ASCII text."""
+from collections import Counter
+
+import polars as pl
+import pytest
+
+from L2.synthetic_corpus import generate_reviews
+from L2.tokens import count_tokens, tokenize
+
+EDGE_CASES = [
+    "",
+    "123 45 ab",
+    "Привет, мир! ab_c-d тест2 ЁЛКА ёлка",
+    "—-- 2024-й год",
+    "x\ny\tzzz",
+    "١٢٣ ٤٥ ⅫⅫⅫ x_y ﬁne",
+    "abc²³⁴ x²²² ²³⁴",  # superscripts are numbers but not decimal digits
+    "cafe\u0301 e\u0301te",  # decomposed é
+    "\u0438\u0306од",  # decomposed й
+    "a\u0332b\u0332c\u0332",  # combining marks with no composed form
+    "İSTANBUL Straße ΣΊΣΥΦΟΣ",
+]
+
+
+def _expected(texts):
+    return [None if text is None else len(tokenize(text)) for text in texts]
+
+
+def test_counts_match_tokenize_on_reviews():
+    texts = []
+    for review in generate_reviews(500):
+        texts += [review["title"], review["review_descr"]]
+    assert count_tokens(texts) == _expected(texts)
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_counts_match_tokenize_on_edge_cases(text):
+    assert count_tokens([text]) == [len(tokenize(text))]
+
+
+def test_none_stays_none():
+    assert count_tokens([None, "слово"]) == [None, 1]
+
+
+@pytest.mark.parametrize(
+    "text, tokens",
+    [
+        ("abc²³⁴ x²²²", ["abc²³⁴", "x²²²"]),
+        ("²³⁴ 2024 ١٢٣", ["²³⁴"]),
+        ("cafe\u0301", ["caf\u00e9"]),
+        ("\u0438\u0306од", ["йод"]),
+        ("a\u0332b\u0332c\u0332", []),
+    ],
+)
+def test_tokenize_unicode(text, tokens):
+    assert tokenize(text) == tokens
+
+
+def test_duckdb_scan_matches_tokenize(tmp_path):
+    pytest.importorskip("duckdb")
+    from Server.analytics import open_engine
+
+    pl.DataFrame({"review_descr": EDGE_CASES}).write_parquet(tmp_path / "reviews.parquet")
+    engine = open_engine(parquet_dir=tmp_path, engine="duckdb")
+    try:
+        values, counts = engine.token_count_distribution("review_descr")
+    finally:
+        engine.close()
+    assert dict(zip(values, counts)) == Counter(_expected(EDGE_CASES))